@@ -0,0 +1,77 @@
+"""Request latency and resident memory of /api/data: legacy jsonify vs pre-encoded bytes
+
+Each mode runs in a fresh interpreter so RSS numbers are not polluted by the other.
+
+    python benchmarks/bench_api_data.py -n 62000
+"""
+import gc
+import sys
+import json
+import argparse
+import subprocess
+
+from common import city_paths, rss_mb, peak_rss_mb, time_calls, summarize
+
+
+def run_mode(mode, n_segments, repeat):
+    import urban_walkability_analytics_app as uwa
+    from flask import jsonify
+
+    snapshot = uwa.load_and_optimize_data(*city_paths(n_segments), cache_dir=None)
+    client = uwa.app.test_client()
+    headers = {'Accept-Encoding': 'gzip, br'}
+
+    if mode == 'legacy':
+        # What the endpoint used to hold: a parsed dict, re-serialized per request
+        legacy_cache = json.loads(snapshot.geojson.variants['identity'])
+        uwa._snapshot = snapshot = None
+        uwa.app.add_url_rule('/bench/legacy', 'bench_legacy', lambda: jsonify(legacy_cache))
+        url = '/bench/legacy'
+    else:
+        url = '/api/data'
+    gc.collect()
+    rss_loaded = rss_mb()
+
+    response = client.get(url, headers=headers)
+    times = time_calls(lambda: client.get(url, headers=headers).close(), repeat)
+
+    result = {
+        'mode': mode,
+        'segments': n_segments,
+        'bytes_sent': len(response.data),
+        'content_encoding': response.headers.get('Content-Encoding', 'identity'),
+        'rss_after_load_mb': round(rss_loaded, 1),
+        'rss_after_requests_mb': round(rss_mb(), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    result.update(summarize(times))
+
+    if mode == 'encoded':
+        etag = response.headers['ETag']
+        revalidate = time_calls(
+            lambda: client.get(url, headers={**headers, 'If-None-Match': etag}).close(), repeat)
+        result['revalidate_304_p50_ms'] = summarize(revalidate)['p50_ms']
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    parser.add_argument('--mode', choices=['legacy', 'encoded'])
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.segments, args.repeat)))
+        return
+
+    city_paths(args.segments)
+    for mode in ('legacy', 'encoded'):
+        out = subprocess.run([sys.executable, __file__, '--mode', mode,
+                              '-n', str(args.segments), '-r', str(args.repeat)],
+                             check=True, capture_output=True, text=True).stdout
+        print(out.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""/api/data.bin vs the slim GeoJSON: server encode time, transfer size and client decode time
+
+Client decoding runs the page's own decodeSegments() under Node.js when it is
+installed, against JSON.parse() of the GeoJSON, each followed by building the
+per-line [lat, lng] arrays Leaflet draws from. Without Node the two payloads
+are decoded with json and numpy instead.
+
+    python benchmarks/bench_binary.py -n 62000
+"""
+import os
+import json
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import warnings
+import subprocess
+
+import numpy as np
+
+from common import city_paths, summarize, time_calls
+from bench_payload_size import sizes
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+NODE_SCRIPT = """
+const fs = require('fs');
+%(decoder)s
+const [geojsonPath, binaryPath, repeat] = process.argv.slice(2);
+const text = fs.readFileSync(geojsonPath, 'utf8');
+const raw = fs.readFileSync(binaryPath);
+const buffer = raw.buffer.slice(raw.byteOffset, raw.byteOffset + raw.length);
+
+function fromGeoJson() {
+    const lines = [];
+    for (const feature of JSON.parse(text).features) {
+        if (feature.geometry) {
+            lines.push(feature.geometry.coordinates.map(([lon, lat]) => [lat, lon]));
+        }
+    }
+    return lines;
+}
+
+function fromBinary() {
+    const data = decodeSegments(buffer);
+    const lines = [];
+    for (let line = 0; line < data.lineSegments.length; line++) {
+        const latlngs = [];
+        for (let v = data.lineOffsets[line]; v < data.lineOffsets[line + 1]; v++) {
+            latlngs.push([data.coords[2 * v + 1], data.coords[2 * v]]);
+        }
+        lines.push(latlngs);
+    }
+    return lines;
+}
+
+function time(fn) {
+    const times = [];
+    for (let i = 0; i < Number(repeat); i++) {
+        const start = process.hrtime.bigint();
+        fn();
+        times.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    return times;
+}
+console.log(JSON.stringify({ geojson: time(fromGeoJson), binary: time(fromBinary) }));
+"""
+
+
+def page_decoder(template):
+    """decodeSegments() and the constants it uses, cut out of the page template"""
+    start = template.index('        const BINARY_ARRAYS')
+    end = template.index('\n        }\n', template.index('function decodeSegments(', start))
+    return template[start:end + len('\n        }\n')]
+
+
+def decode_binary(body):
+    """numpy counterpart of decodeSegments(): per-line coordinates in degrees"""
+    _, header_length = struct.unpack_from('<II', body, 4)
+    header = json.loads(body[12:12 + header_length])
+    base = -(-(12 + header_length) // 8) * 8
+    section = lambda spec: np.frombuffer(body, dtype=spec[1], count=spec[2], offset=base + spec[0])
+    offsets = section(header['sections']['line_offsets'])
+    deltas = section(header['sections']['coords']).reshape(-1, 2).astype(np.int64)
+    # One running sum over all lines, minus what the lines before each one added
+    total = np.vstack([np.zeros((1, 2), dtype=np.int64), np.cumsum(deltas, axis=0)])
+    before = np.repeat(total[offsets[:-1]], np.diff(offsets), axis=0)
+    coords = (total[1:] - before) * header['scale']
+    return np.split(coords, offsets[1:-1])
+
+
+def decode_geojson(body):
+    return [np.asarray(f['geometry']['coordinates']) for f in json.loads(body)['features']
+            if f['geometry']]
+
+
+def client_decode(geojson, binary, repeat):
+    node = shutil.which('node')
+    if node is None:
+        return 'python', {
+            'geojson': summarize(time_calls(lambda: decode_geojson(geojson), repeat)),
+            'binary': summarize(time_calls(lambda: decode_binary(binary), repeat)),
+        }
+
+    import urban_walkability_analytics_app as uwa
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {name: os.path.join(tmp, name) for name in ('bench.js', 'data.geojson', 'data.bin')}
+        with open(paths['bench.js'], 'w') as f:
+            f.write(NODE_SCRIPT % {'decoder': page_decoder(uwa.HTML_TEMPLATE)})
+        for name, body in (('data.geojson', geojson), ('data.bin', binary)):
+            with open(paths[name], 'wb') as f:
+                f.write(body)
+        out = subprocess.run([node, paths['bench.js'], paths['data.geojson'], paths['data.bin'],
+                              str(repeat)], check=True, capture_output=True, text=True).stdout
+    return 'node', {name: summarize(times) for name, times in json.loads(out).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    parser.add_argument('-r', '--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    import urban_walkability_analytics_app as uwa
+    import geopandas as gpd
+    import pandas as pd
+
+    shapefile_path, csv_path = city_paths(args.segments)
+    gdf = gpd.read_file(shapefile_path)
+    gdf = gdf.merge(pd.read_csv(csv_path)[['ID_TRC', 'slope_normalized']], on='ID_TRC', how='left')
+    gdf = gdf.to_crs('EPSG:4326')
+    gdf['geometry'] = gdf.geometry.simplify(tolerance=uwa.SIMPLIFY_TOLERANCE, preserve_topology=True)
+    geoms = gdf.geometry.to_numpy()
+    store = uwa.SegmentStore.from_frame(gdf)
+
+    start = time.perf_counter()
+    geojson, _ = uwa.slim_geojson(geoms, store.ids)
+    geojson_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    binary = uwa.encode_segments_binary(geoms, store)
+    binary_ms = (time.perf_counter() - start) * 1000
+
+    # Geometry alone, for a like-for-like size comparison with the GeoJSON
+    geometry_only = uwa.SegmentStore(store.ids, {}, {})
+    decoder, decode = client_decode(geojson, binary, args.repeat)
+
+    # The binary decoder must give back the GeoJSON coordinates
+    sample = np.random.default_rng(0).integers(0, len(store), 100)
+    lines, features = decode_binary(binary), decode_geojson(geojson)
+    assert all(np.allclose(lines[i], features[i], atol=uwa.COORDINATE_PRECISION) for i in sample)
+
+    print(json.dumps({
+        'segments': len(store),
+        'encode_ms': {'geojson': round(geojson_ms, 1), 'binary': round(binary_ms, 1)},
+        'bytes': {
+            'geojson': sizes(geojson),
+            'binary': sizes(binary),
+            'binary_geometry_only': sizes(uwa.encode_segments_binary(geoms, geometry_only)),
+        },
+        'decoder': decoder,
+        'decode': decode,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
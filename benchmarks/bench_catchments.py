@@ -0,0 +1,56 @@
+"""Batch catchment throughput across worker counts
+
+Workers map the street graph from shared memory, so adding one does not copy
+the network again.
+
+    python benchmarks/bench_catchments.py -n 62000 --pois 2000 --workers 1 2 4 8
+"""
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import shapely
+
+from common import CITY_DIR, city_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    parser.add_argument('--pois', type=int, default=2000)
+    parser.add_argument('--minutes', type=float, default=15)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    import urban_walkability_analytics_app as uwa
+
+    snapshot = uwa.load_and_optimize_data(*city_paths(args.segments),
+                                          cache_dir=os.path.join(CITY_DIR, f"cache_{args.segments}"))
+    x0, y0, x1, y1 = shapely.total_bounds(snapshot.index.geoms)
+    (minlon, minlat), (maxlon, maxlat) = snapshot.index.to_lonlat([[x0, y0], [x1, y1]])
+
+    rng = np.random.default_rng(0)
+    points = np.column_stack([rng.uniform(minlat, maxlat, args.pois),
+                              rng.uniform(minlon, maxlon, args.pois)])
+
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        uwa.compute_catchments(points, minutes=args.minutes, workers=workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(json.dumps({
+            'segments': len(snapshot.store),
+            'pois': args.pois,
+            'workers': workers,
+            'cpus': os.cpu_count(),
+            'seconds': round(elapsed, 3),
+            'catchments_per_s': round(args.pois / elapsed, 1),
+            'speedup': round(baseline / elapsed, 2),
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Walk graph build time and single-origin walkshed latency
+
+    python benchmarks/bench_isochrone.py -n 62000 1000000 --minutes 15
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from common import summarize, time_calls
+
+
+def run(n_segments, repeat, minutes):
+    import urban_walkability_analytics_app as uwa
+    from synthetic_city import make_network, make_slope_table
+
+    gdf = make_network(n_segments)
+    slope = make_slope_table(gdf)['slope_normalized'].to_numpy()
+    gdf = gdf.to_crs('EPSG:4326')
+    minx, miny, maxx, maxy = gdf.total_bounds
+    center = [(miny + maxy) / 2, (minx + maxx) / 2]
+    index = uwa.SpatialIndex(gdf.geometry.to_numpy(), center)
+
+    start = time.perf_counter()
+    graph = uwa.WalkGraph.from_geometry(index.geoms, gdf['Length'].to_numpy(), slope)
+    build_ms = (time.perf_counter() - start) * 1000
+    engine = uwa.IsochroneEngine(graph, index)
+
+    rng = np.random.default_rng(1)
+    cells = [engine.origin_cell(lon, lat) for lon, lat in
+             zip(rng.uniform(minx, maxx, repeat), rng.uniform(miny, maxy, repeat))]
+    it = iter(range(10 ** 9))
+    reached = []
+
+    def walkshed():
+        result = engine.walkshed(cells[next(it) % repeat], minutes)
+        reached.append(len(result['segments']))
+
+    def walkshed_sloped():
+        engine.walkshed(cells[next(it) % repeat], minutes, slope_penalty=1.0)
+
+    def cached():
+        engine.payload(cells[0], minutes, 0.0)
+
+    return {
+        'segments': len(gdf),
+        'nodes': graph.node_count,
+        'graph_build_ms': round(build_ms, 1),
+        'walkshed': summarize(time_calls(walkshed, repeat)),
+        'walkshed_slope_penalty': summarize(time_calls(walkshed_sloped, repeat)),
+        'walkshed_cached': summarize(time_calls(cached, repeat)),
+        'segments_reached_p50': int(np.median(reached)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 1000000])
+    parser.add_argument('-r', '--repeat', type=int, default=50)
+    parser.add_argument('--minutes', type=float, default=15)
+    args = parser.parse_args()
+
+    for n in args.segments:
+        print(json.dumps(run(n, args.repeat, args.minutes)))
+
+
+if __name__ == '__main__':
+    main()
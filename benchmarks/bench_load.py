@@ -0,0 +1,103 @@
+"""Input loading, stage by stage: the original read/merge/centroid steps vs read_inputs()
+
+The GCWI shapefile carries many columns the app never serves; --extra-columns
+widens the synthetic shapefile with unused ones so column pruning has
+something to skip.
+
+    python benchmarks/bench_load.py -n 62000 1000000 --extra-columns 40
+"""
+import os
+import json
+import time
+import argparse
+import warnings
+
+import numpy as np
+
+from common import CITY_DIR, city_paths
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+
+def wide_city_paths(n_segments, extra_columns):
+    """city_paths(), with a copy of the shapefile carrying extra unused columns"""
+    import geopandas as gpd
+
+    shapefile_path, csv_path = city_paths(n_segments)
+    if not extra_columns:
+        return shapefile_path, csv_path
+    out_dir = os.path.join(CITY_DIR, f"city_{n_segments}_wide{extra_columns}")
+    wide_path = os.path.join(out_dir, 'synthetic_streets.shp')
+    if not os.path.exists(wide_path):
+        os.makedirs(out_dir, exist_ok=True)
+        gdf = gpd.read_file(shapefile_path)
+        rng = np.random.default_rng(0)
+        for i in range(extra_columns):
+            gdf[f"EXTRA_{i}"] = rng.random(len(gdf)).round(6) if i % 2 else \
+                rng.choice(['north', 'south', 'east', 'west'], size=len(gdf))
+        gdf.to_file(wide_path)
+    return wide_path, csv_path
+
+
+def legacy_load(shapefile_path, csv_path):
+    """The load steps as they were: every column, a merge, two centroid passes"""
+    import geopandas as gpd
+    import pandas as pd
+
+    stages = {}
+    start = time.perf_counter()
+    gdf = gpd.read_file(shapefile_path)
+    stages['read shapefile'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    slope_df = pd.read_csv(csv_path)
+    stages['read slope csv'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    gdf = gdf.merge(slope_df[['ID_TRC', 'slope_normalized']], on='ID_TRC', how='left')
+    stages['join slope'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if gdf.crs != 'EPSG:4326':
+        gdf = gdf.to_crs('EPSG:4326')
+    stages['reproject'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    center = [float(gdf.geometry.centroid.y.mean()), float(gdf.geometry.centroid.x.mean())]
+    stages['center'] = time.perf_counter() - start
+    return gdf, center, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000])
+    parser.add_argument('--extra-columns', type=int, default=40)
+    args = parser.parse_args()
+
+    import urban_walkability_analytics_app as uwa
+
+    for n in args.segments:
+        paths = wide_city_paths(n, args.extra_columns)
+        legacy_gdf, legacy_center, legacy = legacy_load(*paths)
+
+        timer = uwa.StageTimer()
+        gdf, center = uwa.read_inputs(*paths, timer=timer)
+        assert np.allclose(gdf['slope_normalized'], legacy_gdf['slope_normalized'], equal_nan=True)
+
+        print(json.dumps({
+            'segments': n,
+            'shapefile_columns': len(legacy_gdf.columns) - 1,
+            'columns_read': len(gdf.columns) - 1,
+            'readers': {name: uwa._optional_module(name) is not None for name in ('pyogrio', 'pyarrow')},
+            'legacy_s': {name: round(s, 3) for name, s in legacy.items()},
+            'legacy_total_s': round(sum(legacy.values()), 3),
+            'pruned_s': {name: round(s, 3) for name, s in timer.stages},
+            'pruned_total_s': round(sum(s for _, s in timer.stages), 3),
+            'center_shift_m': round(float(np.hypot(
+                (center[0] - legacy_center[0]) * uwa.METERS_PER_DEGREE,
+                (center[1] - legacy_center[1]) * uwa.METERS_PER_DEGREE * np.cos(np.radians(center[0])))), 1),
+        }))
+
+
+if __name__ == '__main__':
+    main()
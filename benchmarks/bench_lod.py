@@ -0,0 +1,40 @@
+"""Per-zoom levels of detail vs the single fixed-tolerance GeoJSON payload
+
+For every level prints its tolerance, the features and vertices it keeps and
+the encoded sizes, next to the payload simplified once at SIMPLIFY_TOLERANCE.
+
+    python benchmarks/bench_lod.py -n 62000
+"""
+import os
+import json
+import argparse
+
+from common import CITY_DIR, city_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    args = parser.parse_args()
+
+    import urban_walkability_analytics_app as uwa
+
+    snapshot = uwa.load_and_optimize_data(*city_paths(args.segments),
+                                          cache_dir=os.path.join(CITY_DIR, f"cache_{args.segments}"))
+    fixed = json.loads(bytes(snapshot.geojson.variants['identity']))['features']
+    baseline = {coding: len(body) for coding, body in snapshot.geojson.variants.items()}
+    print(json.dumps({
+        'segments': len(snapshot.store),
+        'fixed_tolerance_deg': uwa.SIMPLIFY_TOLERANCE,
+        'fixed_vertices': sum(len(f['geometry']['coordinates']) for f in fixed if f['geometry']),
+        'fixed_bytes': baseline,
+    }))
+    for level in snapshot.levels:
+        report = level.report()
+        report['bytes_vs_fixed'] = {coding: round(size / baseline[coding], 2)
+                                    for coding, size in report['bytes'].items() if coding in baseline}
+        print(json.dumps(report))
+
+
+if __name__ == '__main__':
+    main()
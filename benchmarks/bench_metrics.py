@@ -0,0 +1,49 @@
+"""Per-request cost of the /metrics instrumentation, switched off and on
+
+    python benchmarks/bench_metrics.py -n 62000 -r 2000
+"""
+import os
+import json
+import argparse
+
+import numpy as np
+
+from common import CITY_DIR, city_paths, summarize, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    parser.add_argument('-r', '--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    import urban_walkability_analytics_app as uwa
+
+    snapshot = uwa.load_and_optimize_data(*city_paths(args.segments),
+                                          cache_dir=os.path.join(CITY_DIR, f"cache_{args.segments}"))
+    client = uwa.app.test_client()
+    ids = np.random.default_rng(0).choice(snapshot.store.ids, args.repeat).tolist()
+    tile = next(iter(snapshot.tiles))
+    paths = {
+        'segment': lambda i: f'/api/segment/{ids[i]}',
+        'tile': lambda i: '/tiles/{}/{}/{}.mvt'.format(*tile),
+    }
+
+    # Warm up the interpreter and the Flask request machinery first
+    for i in range(args.repeat):
+        client.get(paths['segment'](i)).close()
+
+    result = {'segments': len(snapshot.store)}
+    for enabled in (False, True):
+        uwa.enable_metrics(enabled)
+        for name, path in paths.items():
+            calls = iter(range(args.repeat))
+            times = time_calls(lambda: client.get(path(next(calls))).close(), args.repeat)
+            result[f"{name}_{'on' if enabled else 'off'}"] = summarize(times)
+    result['render_metrics'] = summarize(time_calls(uwa.render_metrics, 100))
+    result['exposition_bytes'] = len(uwa.render_metrics())
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
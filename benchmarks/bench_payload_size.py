@@ -0,0 +1,55 @@
+"""Byte counts of the full-attribute GeoJSON vs the slim geometry + index payload
+
+    python benchmarks/bench_payload_size.py -n 62000
+"""
+import json
+import gzip
+import argparse
+import warnings
+
+from common import city_paths
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+
+def sizes(body):
+    import urban_walkability_analytics_app as uwa
+
+    result = {'identity': len(body), 'gzip': len(gzip.compress(body, uwa.GZIP_LEVEL, mtime=0))}
+    if uwa.brotli is not None:
+        result['br'] = len(uwa.brotli.compress(body, quality=uwa.BROTLI_QUALITY))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    args = parser.parse_args()
+
+    import urban_walkability_analytics_app as uwa
+    import geopandas as gpd
+    import pandas as pd
+
+    shapefile_path, csv_path = city_paths(args.segments)
+    gdf = gpd.read_file(shapefile_path)
+    gdf = gdf.merge(pd.read_csv(csv_path)[['ID_TRC', 'slope_normalized']], on='ID_TRC', how='left')
+    gdf = gdf.to_crs('EPSG:4326')
+    gdf['geometry'] = gdf.geometry.simplify(tolerance=uwa.SIMPLIFY_TOLERANCE, preserve_topology=True)
+
+    store = uwa.SegmentStore.from_frame(gdf)
+    full = sizes(gdf.to_json().encode('utf-8'))
+    body, _ = uwa.slim_geojson(gdf.geometry.to_numpy(), store.ids)
+    slim = sizes(body)
+    one_segment = len(json.dumps(store.record(0)).encode('utf-8'))
+
+    print(json.dumps({
+        'segments': len(gdf),
+        'full_geojson_bytes': full,
+        'slim_geojson_bytes': slim,
+        'reduction_factor': {k: round(full[k] / slim[k], 2) for k in full},
+        'segment_lookup_bytes': one_segment,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
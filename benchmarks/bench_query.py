@@ -0,0 +1,75 @@
+"""Attribute filters: QueryEngine indexes vs boolean masks over a DataFrame
+
+    python benchmarks/bench_query.py -n 62000 1000000
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from common import summarize, time_calls
+
+# Predicate sets as /api/query receives them, from one filter to a combination
+QUERIES = {
+    'type': {'TYP_VOIE': 'Rue,Avenue'},
+    'range': {'SH_Score': ':0.2'},
+    'percentile': {'slope_normalized': 'p80:'},
+    'combined': {'TYP_VOIE': 'Rue', 'SH_Score': ':0.2', 'slope_normalized': 'p80:'},
+}
+
+
+def pandas_mask(df, spec):
+    mask = np.ones(len(df), dtype=bool)
+    for name, text in spec.items():
+        if name == 'TYP_VOIE':
+            mask &= df[name].isin(text.split(',')).to_numpy()
+            continue
+        column = df[name]
+        lo, hi = text.split(':')
+        bound = lambda b: column.quantile(float(b[1:]) / 100) if b.startswith('p') else float(b)
+        if lo:
+            mask &= (column >= bound(lo)).to_numpy()
+        if hi:
+            mask &= (column <= bound(hi)).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def run(n_segments, repeat):
+    import urban_walkability_analytics_app as uwa
+    from synthetic_city import make_network, make_slope_table
+
+    df = make_network(n_segments)
+    df['slope_normalized'] = make_slope_table(df)['slope_normalized'].to_numpy()
+    store = uwa.SegmentStore.from_frame(df)
+
+    start = time.perf_counter()
+    engine = uwa.QueryEngine(store)
+    result = {'segments': n_segments, 'index_build_ms': round((time.perf_counter() - start) * 1000, 1)}
+
+    for name, spec in QUERIES.items():
+        predicates = engine.parse(spec)
+        matches = np.flatnonzero(np.unpackbits(engine.match(predicates), count=len(store),
+                                               bitorder='little'))
+        result[name] = {
+            'matches': len(matches),
+            'index': summarize(time_calls(lambda: engine.match(engine.parse(spec)), repeat)),
+            # The whole uncached response: match, encode and compress
+            'index_payload': summarize(time_calls(lambda: engine._payload(predicates, 'bitset'), repeat)),
+            'dataframe': summarize(time_calls(lambda: pandas_mask(df, spec), repeat)),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 1000000])
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    for n in args.segments:
+        print(json.dumps(run(n, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""In-browser render benchmark: WebGL vs one Leaflet polyline per segment
+
+Serves a synthetic city and prints a benchmark page per data source. Each
+page loads the network, then runs the same camera path (four pans, two zoom
+levels in, two pans, back out) and 200 seeded hover probes. It then shows
+load time, frame-time percentiles during the camera path, and hover latency.
+The latency is measured both in the mousemove handler and up to the next
+frame. The results are also in window.renderBenchmark and the console.
+Compare runs made in the same browser window size.
+
+    python benchmarks/bench_render.py -n 500000 --sources webgl binary --open
+"""
+import os
+import sys
+import argparse
+import subprocess
+import webbrowser
+
+from common import CITY_DIR, city_paths
+from bench_serve import APP, wait_until_ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--segments', type=int, default=500000)
+    parser.add_argument('--sources', nargs='+', default=['webgl', 'binary'])
+    parser.add_argument('--port', type=int, default=5058)
+    parser.add_argument('--open', action='store_true', help="open each page in the default browser")
+    args = parser.parse_args()
+
+    paths = city_paths(args.segments)
+    proc = subprocess.Popen(
+        [sys.executable, APP, '--shapefile', paths[0], '--slope-csv', paths[1],
+         '--cache-dir', os.path.join(CITY_DIR, f'cache_{args.segments}'),
+         '--port', str(args.port), '--no-browser', '--no-watch'],
+        stdout=subprocess.DEVNULL)
+    try:
+        # A cold build of a large network takes a while; later runs load the cache
+        wait_until_ready(args.port, proc, timeout=3600)
+        for source in args.sources:
+            url = f"http://127.0.0.1:{args.port}/?source={source}&benchmark=1"
+            print(url)
+            if args.open:
+                webbrowser.open_new_tab(url)
+        print("Serving until interrupted")
+        proc.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""What-if scenarios: incremental recomputation vs rebuilding from the edited columns
+
+A scenario raises G-Score and SH_Score on k random segments. For each k it
+times applying the saved diff, then each answer both ways:
+
+  score   the composite scores: the edited rows patched over the base
+          engine's cached scores vs a ScoreEngine over the edited columns
+  stats   /api/stats?by=type for the whole network: the base prefix sums
+          plus the edited segments' deltas vs a StatsEngine rebuilt from the
+          edited columns
+  impact  the scenario summary (network-wide means before and after)
+
+    python benchmarks/bench_scenario.py -n 62000 1000000 -k 200 20000
+"""
+import json
+import time
+import argparse
+import warnings
+
+import numpy as np
+
+from common import summarize, time_calls
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+
+def run(n_segments, edited, repeat):
+    import urban_walkability_analytics_app as uwa
+    from synthetic_city import make_network, make_slope_table
+
+    gdf = make_network(n_segments)
+    gdf['slope_normalized'] = make_slope_table(gdf)['slope_normalized'].to_numpy()
+    gdf = gdf.to_crs('EPSG:4326')
+    minx, miny, maxx, maxy = gdf.total_bounds
+    center = [(miny + maxy) / 2, (minx + maxx) / 2]
+    store = uwa.SegmentStore.from_frame(gdf)
+    index = uwa.SpatialIndex(gdf.geometry.to_numpy(), center)
+    snapshot = uwa.Snapshot.empty('bench')._replace(
+        center=center, store=store, index=index, scores=uwa.ScoreEngine(store),
+        stats=uwa.StatsEngine(store, index))
+    weights = snapshot.scores.parse_weights('')
+    snapshot.scores.payload(weights)
+
+    results = []
+    rng = np.random.default_rng(1)
+    for k in edited:
+        rows = np.sort(rng.choice(n_segments, min(k, n_segments), replace=False))
+        values = {str(int(store.ids[i])): {'G-Score': 0.9, 'SH_Score': 0.8} for i in rows.tolist()}
+        diff = {'name': 'bench', 'base_version': 'bench', 'created': time.time(), 'edits': [],
+                'values': values}
+
+        start = time.perf_counter()
+        scenario = uwa.Scenario(snapshot, 'bench', diff)
+        apply_ms = (time.perf_counter() - start) * 1000
+
+        columns = {name: scenario.column(name) if name in scenario.edited_metrics else column
+                   for name, column in store.columns.items()}
+        edited_store = uwa.SegmentStore(store.ids, columns, store.categories)
+        cells = scenario.stats.cells()
+
+        # Same answers both ways
+        full = uwa.ScoreEngine(edited_store).scores(weights)
+        assert np.allclose(scenario.scores.scores(weights), full, atol=1e-6)
+        rebuilt = uwa.StatsEngine(edited_store, index)
+        assert np.allclose(scenario.stats.block(cells)[:, :2 + 3], rebuilt.block(cells)[:, :2 + 3])
+
+        results.append({
+            'segments': n_segments,
+            'edited': len(rows),
+            'apply_ms': round(apply_ms, 1),
+            'score': {
+                'rebuild': summarize(time_calls(lambda: uwa.ScoreEngine(edited_store).scores(weights), repeat)),
+                'incremental': summarize(time_calls(lambda: scenario.scores.scores(weights), repeat)),
+            },
+            'stats': {
+                'rebuild': summarize(time_calls(
+                    lambda: uwa.StatsEngine(edited_store, index)._payload(cells, 'type'), max(1, repeat // 5))),
+                'incremental': summarize(time_calls(lambda: scenario.stats._payload(cells, 'type'), repeat)),
+            },
+            'impact': summarize(time_calls(lambda: scenario._summary(weights), repeat)),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 1000000])
+    parser.add_argument('-k', '--edited', type=int, nargs='+', default=[200, 2000, 20000])
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    for n in args.segments:
+        for result in run(n, args.edited, args.repeat):
+            print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
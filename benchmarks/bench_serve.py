@@ -0,0 +1,183 @@
+"""Load test of the multi-process server: latency, throughput and memory per worker count
+
+Starts the app with --workers N on a synthetic city, drives it with a pool of
+keep-alive HTTP clients issuing a mix of API and tile requests, and reports
+p50/p99 latency together with the RSS and PSS of all server processes. PSS
+splits shared pages between the processes that map them, so it shows how
+much of the dataset the workers really share.
+
+    python benchmarks/bench_serve.py -n 62000 --workers 1 2 4 --clients 8 --duration 10
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import subprocess
+import http.client
+from multiprocessing import Pool
+
+from common import CITY_DIR, ROOT, city_paths, percentile
+
+APP = os.path.join(ROOT, 'urban_walkability_analytics_app.py')
+
+
+def server_pids(root_pid):
+    """The server process and every process forked from it"""
+    parents = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    parents[int(name)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                pass
+    pids, frontier = [root_pid], [root_pid]
+    while frontier:
+        frontier = [pid for pid, ppid in parents.items() if ppid in frontier]
+        pids += frontier
+    return pids
+
+
+def memory_mb(pids):
+    """Summed RSS and PSS of the given processes in MiB"""
+    rss = pss = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                for line in f:
+                    key, value = line.split(':', 1)
+                    if key in ('Rss', 'Pss'):
+                        kb = int(value.split()[0])
+                        rss += kb if key == 'Rss' else 0
+                        pss += kb if key == 'Pss' else 0
+        except OSError:
+            pass
+    return round(rss / 1024, 1), round(pss / 1024, 1)
+
+
+def request_mix(bounds, n_segments, seed):
+    """An endless stream of GET paths, weighted roughly like a map session"""
+    rng = random.Random(seed)
+    minlon, minlat, maxlon, maxlat = bounds
+
+    def tile(z, lon, lat):
+        n = 2 ** z
+        x = int((lon + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+        return f'/tiles/{z}/{x}/{y}.mvt'
+
+    while True:
+        lon, lat = rng.uniform(minlon, maxlon), rng.uniform(minlat, maxlat)
+        roll = rng.random()
+        if roll < 0.5:
+            yield tile(rng.choice([13, 14, 15]), lon, lat)
+        elif roll < 0.75:
+            yield f'/api/segment/{1000000 + rng.randrange(n_segments)}'
+        elif roll < 0.85:
+            yield f'/api/nearest?lat={lat}&lon={lon}&k=5'
+        elif roll < 0.95:
+            yield f'/api/isochrone?lat={lat}&lon={lon}&minutes=15'
+        else:
+            yield '/api/score?weights=' + ','.join(str(rng.choice([0, 1, 2])) for _ in range(6)) + ',1'
+
+
+def client(args):
+    """One keep-alive client; returns its per-request latencies in ms and error count"""
+    port, bounds, n_segments, duration, seed = args
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Accept-Encoding': 'gzip, br'}
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    for path in request_mix(bounds, n_segments, seed):
+        start = time.perf_counter()
+        if start > deadline:
+            break
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return latencies, errors
+
+
+def wait_until_ready(port, proc, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/version')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+def run(workers, args, paths, bounds):
+    proc = subprocess.Popen(
+        [sys.executable, APP, '--shapefile', paths[0], '--slope-csv', paths[1],
+         '--cache-dir', os.path.join(CITY_DIR, f'cache_{args.segments}'),
+         '--workers', str(workers), '--port', str(args.port), '--no-browser', '--no-watch'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(args.port, proc)
+        pids = server_pids(proc.pid)
+        idle_rss, idle_pss = memory_mb(pids)
+
+        jobs = [(args.port, bounds, args.segments, args.duration, seed) for seed in range(args.clients)]
+        with Pool(args.clients) as pool:
+            results = pool.map(client, jobs)
+        latencies = [t for times, _ in results for t in times]
+        rss, pss = memory_mb(server_pids(proc.pid))
+        return {
+            'workers': workers,
+            'clients': args.clients,
+            'requests': len(latencies),
+            'errors': sum(e for _, e in results),
+            'requests_per_s': round(len(latencies) / args.duration, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'processes': len(pids),
+            'idle_rss_mb': idle_rss,
+            'idle_pss_mb': idle_pss,
+            'rss_mb': rss,
+            'pss_mb': pss,
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5057)
+    args = parser.parse_args()
+
+    import geopandas as gpd
+
+    paths = city_paths(args.segments)
+    bounds = gpd.read_file(paths[0]).to_crs('EPSG:4326').total_bounds.tolist()
+    for workers in args.workers:
+        print(json.dumps(run(workers, args, paths, bounds)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""/api/similar: nearest metric profiles, network-wide and within a radius
+
+The baseline is the direct scan: the distance from the query profile to every
+standardized profile in float64, then a full sort.
+
+    python benchmarks/bench_similar.py -n 62000 1000000 -k 10
+"""
+import json
+import time
+import argparse
+import warnings
+
+import numpy as np
+
+from common import summarize, time_calls
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+RADII = [500.0, 2000.0]
+
+
+def run(n_segments, repeat, k):
+    import urban_walkability_analytics_app as uwa
+    from synthetic_city import make_network, make_slope_table
+
+    gdf = make_network(n_segments)
+    gdf['slope_normalized'] = make_slope_table(gdf)['slope_normalized'].to_numpy()
+    gdf = gdf.to_crs('EPSG:4326')
+    minx, miny, maxx, maxy = gdf.total_bounds
+    center = [(miny + maxy) / 2, (minx + maxx) / 2]
+    store = uwa.SegmentStore.from_frame(gdf)
+    index = uwa.SpatialIndex(gdf.geometry.to_numpy(), center)
+
+    start = time.perf_counter()
+    engine = uwa.SimilarityEngine(store, index)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    segments = np.random.default_rng(1).integers(0, n_segments, repeat).tolist()
+    profiles = engine.profiles.astype(np.float64)
+    it = iter(range(10 ** 9))
+
+    def direct(segment):
+        distances = np.sqrt(((profiles - profiles[segment]) ** 2).sum(axis=1))
+        distances[segment] = np.inf
+        return np.argsort(distances, kind='stable')[:k]
+
+    # Same answers as the direct scan, up to ties
+    for segment in segments[:5]:
+        assert set(engine.similar(segment, k)[0].tolist()) == set(direct(segment).tolist())
+
+    result = {
+        'segments': n_segments,
+        'k': k,
+        'build_ms': round(build_ms, 1),
+        'profiles_mb': round((engine.profiles.nbytes + engine.norms.nbytes) / 2**20, 1),
+        'direct_scan': summarize(time_calls(lambda: direct(segments[next(it) % repeat]), repeat)),
+        'similar': summarize(time_calls(lambda: engine.similar(segments[next(it) % repeat], k), repeat)),
+        # The whole uncached response: neighbours, ground distances, points and JSON
+        'payload': summarize(time_calls(lambda: engine._payload(segments[next(it) % repeat], k, None),
+                                        repeat)),
+    }
+    for radius in RADII:
+        result[f"radius_{radius:g}m"] = summarize(time_calls(
+            lambda: engine.similar(segments[next(it) % repeat], k, radius), repeat))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 1000000])
+    parser.add_argument('-r', '--repeat', type=int, default=50)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    for n in args.segments:
+        print(json.dumps(run(n, args.repeat, args.k)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Viewport and nearest-segment queries: STRtree index vs a linear scan
+
+    python benchmarks/bench_spatial_index.py -n 62000 1000000
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+import shapely
+
+from common import summarize, time_calls
+
+
+def run(n_segments, repeat, k):
+    import urban_walkability_analytics_app as uwa
+    from synthetic_city import make_network
+
+    gdf = make_network(n_segments).to_crs('EPSG:4326')
+    geoms = gdf.geometry.to_numpy()
+    minx, miny, maxx, maxy = gdf.total_bounds
+    center = [(miny + maxy) / 2, (minx + maxx) / 2]
+
+    start = time.perf_counter()
+    index = uwa.SpatialIndex(geoms, center)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = np.random.default_rng(1)
+    # A street-level viewport, roughly 800 m x 500 m
+    half_w, half_h = 0.005, 0.0022
+    points = np.column_stack([rng.uniform(minx, maxx, repeat), rng.uniform(miny, maxy, repeat)])
+    it = iter(range(10 ** 9))
+
+    def bbox_index():
+        lon, lat = points[next(it) % repeat]
+        index.query_bbox(lon - half_w, lat - half_h, lon + half_w, lat + half_h)
+
+    def bbox_scan():
+        lon, lat = points[next(it) % repeat]
+        np.flatnonzero(shapely.intersects(geoms, shapely.box(lon - half_w, lat - half_h,
+                                                             lon + half_w, lat + half_h)))
+
+    def nearest_index():
+        lon, lat = points[next(it) % repeat]
+        index.nearest(lon, lat, k)
+
+    def nearest_scan():
+        lon, lat = points[next(it) % repeat]
+        distances = shapely.distance(index.geoms, shapely.points(index.to_local([lon, lat])))
+        np.argpartition(distances, k)[:k]
+
+    return {
+        'segments': len(gdf),
+        'index_build_ms': round(build_ms, 1),
+        'bbox_index': summarize(time_calls(bbox_index, repeat)),
+        'bbox_linear_scan': summarize(time_calls(bbox_scan, repeat)),
+        f'nearest_k{k}_index': summarize(time_calls(nearest_index, repeat)),
+        f'nearest_k{k}_linear_scan': summarize(time_calls(nearest_scan, repeat)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 1000000])
+    parser.add_argument('-r', '--repeat', type=int, default=50)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    for n in args.segments:
+        print(json.dumps(run(n, args.repeat, args.k)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Cold start of a serving process: the cache directory path vs the build/serve artifact
+
+Three measurements per network size:
+
+  import   importing the app module in a fresh interpreter: wall time, the
+           number of modules loaded and which heavy libraries came with it
+           (median of --repeat runs)
+  ready    time from spawning the server until /api/version answers 200,
+           and its resident memory then, for the original command with a
+           warm cache directory and for `serve --artifact`
+  build    the one-off processing: a first start with an empty cache vs
+           `build --output`
+
+    python benchmarks/bench_startup.py -n 62000 250000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import http.client
+
+from common import CITY_DIR, ROOT, city_paths
+from bench_serve import APP, memory_mb, server_pids
+
+HEAVY_MODULES = ('geopandas', 'pandas', 'pyogrio', 'pyarrow', 'shapely', 'numpy')
+
+IMPORT_PROBE = f"""
+import sys, time, json
+start = time.perf_counter()
+import urban_walkability_analytics_app
+print(json.dumps([time.perf_counter() - start, len(sys.modules),
+                  [name for name in {HEAVY_MODULES!r} if name in sys.modules]]))
+"""
+
+
+def import_time(repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, check=True,
+                             capture_output=True, text=True).stdout
+        runs.append(json.loads(out.splitlines()[-1]))
+    seconds, modules, heavy = sorted(runs)[len(runs) // 2]
+    return {'seconds': round(seconds, 3), 'modules': modules, 'heavy': heavy}
+
+
+def time_to_ready(command, port, timeout=3600):
+    """Seconds from spawning the server until it serves data, and its memory then
+
+    Polls every 10ms rather than through wait_until_ready, whose half-second
+    interval is longer than an artifact start.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, APP] + command + ['--port', str(port), '--no-browser',
+                                                               '--no-watch'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with {proc.returncode}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+                conn.request('GET', '/api/version')
+                if conn.getresponse().status == 200:
+                    seconds = time.perf_counter() - start
+                    rss, pss = memory_mb(server_pids(proc.pid))
+                    return {'seconds': round(seconds, 3), 'rss_mb': rss, 'pss_mb': pss}
+            except OSError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("server did not start")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def timed(command):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, APP] + command, check=True, stdout=subprocess.DEVNULL)
+    return round(time.perf_counter() - start, 3)
+
+
+def run(n_segments, args):
+    shapefile_path, csv_path = city_paths(n_segments)
+    inputs = ['--shapefile', shapefile_path, '--slope-csv', csv_path]
+    artifact = os.path.join(CITY_DIR, f"city_{n_segments}.uwa")
+    result = {'segments': n_segments}
+
+    with tempfile.TemporaryDirectory(dir=CITY_DIR) as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        result['build_s'] = {
+            'first_start': time_to_ready(inputs + ['--cache-dir', cache_dir], args.port)['seconds'],
+            'build_command': timed(['build'] + inputs + ['--output', artifact]),
+        }
+        result['ready'] = {
+            'cache_dir': time_to_ready(inputs + ['--cache-dir', cache_dir], args.port),
+            'artifact': time_to_ready(['serve', '--artifact', artifact], args.port),
+        }
+        result['artifact_mb'] = round(os.path.getsize(artifact) / 2**20, 1)
+        result['cache_dir_mb'] = round(sum(os.path.getsize(os.path.join(root, name))
+                                           for root, _, names in os.walk(cache_dir)
+                                           for name in names) / 2**20, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=5059)
+    args = parser.parse_args()
+
+    os.makedirs(CITY_DIR, exist_ok=True)
+    print(json.dumps({'import': import_time(args.repeat)}))
+    for n in args.segments:
+        print(json.dumps(run(n, args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""/api/stats aggregates: grid prefix sums vs grouping the segments inside a bbox
+
+The baseline is what answering without precomputation takes: fetch the
+segments in the bbox from the spatial index, then length-weighted means and
+quantiles per street type with pandas.
+
+    python benchmarks/bench_stats.py -n 62000 1000000
+"""
+import json
+import time
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from common import summarize, time_calls
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+# Bbox sides as a fraction of the network's extent
+BBOX_FRACTIONS = [0.1, 0.3, 1.0]
+
+
+def pandas_stats(df, indices, metrics):
+    """Length-weighted mean and quantiles of each metric per street type"""
+    subset = df.iloc[indices]
+    result = {}
+    for label, group in subset.groupby('TYP_VOIE'):
+        weights = group['Length'].to_numpy()
+        result[label] = {}
+        for name in metrics:
+            values = group[name].to_numpy()
+            order = np.argsort(values)
+            cumulative = np.cumsum(weights[order])
+            result[label][name] = (np.average(values, weights=weights),
+                                   values[order][np.searchsorted(cumulative, cumulative[-1] * np.array([0.1, 0.25, 0.5, 0.75, 0.9]))])
+    return result
+
+
+def run(n_segments, repeat):
+    import urban_walkability_analytics_app as uwa
+    from synthetic_city import make_network, make_slope_table
+
+    gdf = make_network(n_segments)
+    gdf['slope_normalized'] = make_slope_table(gdf)['slope_normalized'].to_numpy()
+    gdf = gdf.to_crs('EPSG:4326')
+    minx, miny, maxx, maxy = gdf.total_bounds
+    center = [(miny + maxy) / 2, (minx + maxx) / 2]
+    store = uwa.SegmentStore.from_frame(gdf)
+    index = uwa.SpatialIndex(gdf.geometry.to_numpy(), center)
+    df = pd.DataFrame(gdf.drop(columns='geometry'))
+
+    start = time.perf_counter()
+    stats = uwa.StatsEngine(store, index)
+    result = {
+        'segments': n_segments,
+        'build_ms': round((time.perf_counter() - start) * 1000, 1),
+        'grid': [int(stats.nx), int(stats.ny)],
+        'cell_meters': round(stats.cell, 1),
+        'prefix_sums_mb': round(stats.nbytes / 2**20, 1),
+    }
+
+    for fraction in BBOX_FRACTIONS:
+        half = np.array([maxx - minx, maxy - miny]) * fraction / 2
+        bbox = (center[1] - half[0], center[0] - half[1], center[1] + half[0], center[0] + half[1])
+        cells = stats.cells(bbox)
+        indices = index.query_bbox(*bbox)
+        result[f"bbox_{fraction}"] = {
+            'segments_inside': len(indices),
+            'prefix_sums': summarize(time_calls(lambda: stats.block(stats.cells(bbox)), repeat)),
+            # The whole uncached response: summaries, JSON and compression
+            'payload_by_type': summarize(time_calls(lambda: stats._payload(cells, 'type'), repeat)),
+            'pandas_by_type': summarize(time_calls(
+                lambda: pandas_stats(df, index.query_bbox(*bbox), uwa.SCORE_METRICS), repeat)),
+        }
+    result['payload_by_cell'] = summarize(time_calls(
+        lambda: stats._payload(stats.cells(), 'cell', histograms=False), max(1, repeat // 5)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 1000000])
+    parser.add_argument('-r', '--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    for n in args.segments:
+        print(json.dumps(run(n, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Memory of encoding and serving /api/data as the network grows
+
+Three measurements per size, each the peak of the Python heap as traced by
+tracemalloc above what was allocated before (memory-mapped cache files are
+page cache and not traced):
+
+  encode  the full-resolution GeoJSON payload with its gzip and brotli
+          variants, built in memory vs streamed chunk by chunk into a cache
+          directory; "retained" is what stays allocated afterwards
+  serve   one /api/data response consumed chunk by chunk as a WSGI server
+          would: the pre-encoded FeatureCollection and the
+          application/geo+json-seq stream, plain and gzipped
+  legacy  what /api/data did originally: gdf.to_json(), json.loads() and
+          jsonify(); only up to --legacy-max segments
+
+    python benchmarks/bench_stream.py -n 62000 250000 1000000
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import warnings
+import tracemalloc
+
+import shapely
+
+from common import CITY_DIR, city_paths
+
+warnings.filterwarnings('ignore', message='.*geographic CRS.*')
+
+
+def traced(fn):
+    """(result, peak MiB above the start, MiB still allocated after, seconds) of fn()"""
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, round((peak - base) / 2**20, 1), round((current - base) / 2**20, 1), round(seconds, 3)
+
+
+def consume(client, url, headers):
+    """Read a response the way a WSGI server does, one chunk at a time; returns its size"""
+    response = client.get(url, headers=headers, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size
+
+
+def run(n_segments, legacy_max):
+    import urban_walkability_analytics_app as uwa
+
+    paths = city_paths(n_segments)
+    result = {'segments': n_segments}
+
+    # Encoding the payload at load time
+    gdf, _ = uwa.read_inputs(*paths)
+    store = uwa.SegmentStore.from_frame(gdf)
+    geometries = shapely.to_geojson(shapely.set_precision(
+        gdf.geometry.simplify(uwa.SIMPLIFY_TOLERANCE, preserve_topology=True).to_numpy(),
+        uwa.COORDINATE_PRECISION, mode='pointwise'))
+    (payload, _), peak, retained, seconds = traced(
+        lambda: uwa.encode_feature_collection(geometries, store.ids))
+    result['payload_mb'] = round(len(payload) / 2**20, 1)
+    result['encode_in_memory'] = {'peak_mb': peak, 'retained_mb': retained, 'seconds': seconds}
+    del payload
+    with tempfile.TemporaryDirectory() as tmp:
+        (payload, _), peak, retained, seconds = traced(
+            lambda: uwa.encode_feature_collection(geometries, store.ids, entry_dir=tmp))
+        result['encode_streamed'] = {'peak_mb': peak, 'retained_mb': retained, 'seconds': seconds}
+        del payload
+    del geometries
+
+    # Serving it, from the memory-mapped cache
+    uwa.load_and_optimize_data(*paths, cache_dir=os.path.join(CITY_DIR, f"cache_{n_segments}"))
+    client = uwa.app.test_client()
+    requests = {
+        'feature_collection': ('/api/data', 'identity'),
+        'feature_collection_br': ('/api/data', 'br'),
+        'seq': ('/api/data?format=seq', 'identity'),
+        'seq_gzip': ('/api/data?format=seq', 'gzip'),
+    }
+    for name, (url, coding) in requests.items():
+        headers = {'Accept-Encoding': coding}
+        size, peak, _, seconds = traced(lambda: consume(client, url, headers))
+        result[f"serve_{name}"] = {'bytes': size, 'peak_mb': peak, 'seconds': seconds}
+
+    if n_segments <= legacy_max:
+        def legacy():
+            with uwa.app.test_request_context():
+                return len(uwa.jsonify(json.loads(gdf.to_json())).get_data())
+        size, peak, _, seconds = traced(legacy)
+        result['serve_legacy'] = {'bytes': size, 'peak_mb': peak, 'seconds': seconds}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=[62000, 250000])
+    parser.add_argument('--legacy-max', type=int, default=250000,
+                        help="largest network to measure the original to_json/jsonify path on")
+    args = parser.parse_args()
+
+    for n in args.segments:
+        print(json.dumps(run(n, args.legacy_max)))
+
+
+if __name__ == '__main__':
+    main()
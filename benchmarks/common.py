@@ -0,0 +1,59 @@
+"""Shared helpers for the benchmark scripts"""
+import os
+import sys
+import time
+import tempfile
+import resource
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CITY_DIR = os.environ.get('UWA_BENCH_DIR', os.path.join(tempfile.gettempdir(), 'uwa_bench'))
+
+
+def city_paths(n_segments, seed=0):
+    """Shapefile and slope CSV for a synthetic city, generated on first use"""
+    from synthetic_city import write_city
+
+    out_dir = os.path.join(CITY_DIR, f"city_{n_segments}_{seed}")
+    shapefile_path = os.path.join(out_dir, 'synthetic_streets.shp')
+    csv_path = os.path.join(out_dir, 'street_segment_slope.csv')
+    if not (os.path.exists(shapefile_path) and os.path.exists(csv_path)):
+        write_city(out_dir, n_segments, seed=seed)
+    return shapefile_path, csv_path
+
+
+def rss_mb():
+    """Current resident set size of this process in MiB"""
+    with open('/proc/self/statm') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def time_calls(fn, repeat):
+    """Call fn repeatedly and return per-call wall times in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summarize(times):
+    return {
+        'p50_ms': round(percentile(times, 50), 3),
+        'p99_ms': round(percentile(times, 99), 3),
+        'mean_ms': round(sum(times) / len(times), 3),
+    }
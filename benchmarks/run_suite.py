@@ -0,0 +1,157 @@
+"""Scaling suite: load time, /api/data latency and memory at 10k, 100k and 1M segments
+
+Each size is measured in two fresh interpreters, so memory figures are not
+polluted by an earlier run: a cold load that builds and caches the data, then
+a warm load from that cache. Results are written as JSON together with the
+git commit they were measured on; --compare prints the ratio of every
+figure between two result files and flags the ones that got worse.
+
+    python benchmarks/run_suite.py                      # writes benchmarks/results/<commit>.json
+    python benchmarks/run_suite.py -n 10000 100000 -o before.json
+    python benchmarks/run_suite.py --compare before.json after.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+
+from common import CITY_DIR, ROOT, city_paths, peak_rss_mb, rss_mb, summarize, time_calls
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SIZES = [10000, 100000, 1000000]
+# Lower is better for every figure compared; a ratio above this is reported as a regression
+REGRESSION_RATIO = 1.10
+
+
+def measure(n_segments, phase, repeat):
+    """One phase for one size, in this process"""
+    import urban_walkability_analytics_app as uwa
+
+    paths = city_paths(n_segments)
+    cache_dir = os.path.join(CITY_DIR, f"suite_cache_{n_segments}")
+    if phase == 'cold':
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    start = time.perf_counter()
+    snapshot = uwa.load_and_optimize_data(*paths, cache_dir=cache_dir)
+    load_s = time.perf_counter() - start
+    if snapshot.store is None:
+        raise RuntimeError(f"loading {paths[0]} failed")
+
+    result = {
+        'load_s': round(load_s, 3),
+        'stages_s': {name: round(s, 3) for name, s in uwa._last_load.stages},
+        'rss_after_load_mb': round(rss_mb(), 1),
+    }
+
+    client = uwa.app.test_client()
+    requests = {
+        'api_data': ('/api/data', 'identity'),
+        'api_data_br': ('/api/data', 'br'),
+        'api_data_z12_br': ('/api/data?zoom=12', 'br'),
+        'api_data_bin_br': ('/api/data.bin', 'br'),
+    }
+    for name, (url, coding) in requests.items():
+        headers = {'Accept-Encoding': coding}
+        response = client.get(url, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url}: HTTP {response.status_code}")
+        result[f"{name}_bytes"] = len(response.data)
+        result[name] = summarize(time_calls(lambda: client.get(url, headers=headers).close(), repeat))
+
+    result['rss_after_requests_mb'] = round(rss_mb(), 1)
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return result
+
+
+def run_size(n_segments, repeat):
+    city_paths(n_segments)
+    result = {'segments': n_segments}
+    for phase in ('cold', 'warm'):
+        out = subprocess.run([sys.executable, __file__, '--child', phase, '-n', str(n_segments),
+                              '-r', str(repeat)], check=True, capture_output=True, text=True).stdout
+        result[phase] = json.loads(out.strip().splitlines()[-1])
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def flatten(value, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only"""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            out.update(flatten(item, f"{prefix}{key}."))
+        return out
+    return {prefix[:-1]: value} if isinstance(value, (int, float)) else {}
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{base['commit']} -> {new['commit']}")
+    base_runs = {run['segments']: flatten(run) for run in base['runs']}
+    regressions = 0
+    for run in new['runs']:
+        before = base_runs.get(run['segments'])
+        if before is None:
+            continue
+        for key, value in flatten(run).items():
+            old = before.get(key)
+            if key == 'segments' or not old or not value:
+                continue
+            ratio = value / old
+            flag = '  <-- regression' if ratio > REGRESSION_RATIO else ''
+            regressions += bool(flag)
+            print(f"{run['segments']:>9} {key:<40} {old:>12} {value:>12} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--segments', type=int, nargs='+', default=SIZES)
+    parser.add_argument('-r', '--repeat', type=int, default=10)
+    parser.add_argument('-o', '--output', help="result file (default: results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'))
+    parser.add_argument('--child', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+    if args.child:
+        print(json.dumps(measure(args.segments[0], args.child, args.repeat)))
+        return
+
+    results = {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'runs': [],
+    }
+    for n in args.segments:
+        run = run_size(n, args.repeat)
+        print(json.dumps(run))
+        results['runs'].append(run)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
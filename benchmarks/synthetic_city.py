@@ -0,0 +1,89 @@
+"""Synthetic street network generator for benchmarks
+
+Builds a jittered grid of street segments in EPSG:32188 (NAD83 / MTM zone 8)
+with the same schema as the GCWI shapefile, plus a matching slope CSV.
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Roughly downtown Montreal in MTM zone 8
+ORIGIN_X = 295000.0
+ORIGIN_Y = 5035000.0
+BLOCK_SIZE = 80.0
+VERTICES_PER_SEGMENT = 6
+
+STREET_TYPES = ['Rue', 'Avenue', 'Boulevard', 'Chemin', 'Ruelle', 'Place']
+SCORE_COLUMNS = ['LUM_Score', 'SFI_score', 'G-Score', 'SH_Score', 'CO_Score', 'Pop_Score']
+
+
+def make_network(n_segments, seed=0):
+    """Return a GeoDataFrame of roughly n_segments grid-aligned streets"""
+    rng = np.random.default_rng(seed)
+    side = max(2, int(np.ceil(np.sqrt(n_segments / 2.0))))
+
+    # Every node connects east and north, so segments share endpoints
+    ii, jj = np.meshgrid(np.arange(side), np.arange(side), indexing='ij')
+    ii, jj = ii.ravel(), jj.ravel()
+    starts = np.concatenate([np.column_stack([ii, jj]), np.column_stack([ii, jj])])
+    ends = np.concatenate([np.column_stack([ii + 1, jj]), np.column_stack([ii, jj + 1])])
+    starts, ends = starts[:n_segments], ends[:n_segments]
+    n = len(starts)
+
+    # Interpolate interior vertices and jitter them off the straight line
+    t = np.linspace(0.0, 1.0, VERTICES_PER_SEGMENT)
+    p0 = starts * BLOCK_SIZE + [ORIGIN_X, ORIGIN_Y]
+    p1 = ends * BLOCK_SIZE + [ORIGIN_X, ORIGIN_Y]
+    coords = p0[:, None, :] + (p1 - p0)[:, None, :] * t[None, :, None]
+    coords[:, 1:-1, :] += rng.normal(0.0, 1.5, size=(n, VERTICES_PER_SEGMENT - 2, 2))
+
+    geoms = shapely.linestrings(coords)
+    data = {
+        'ID_TRC': np.arange(1000000, 1000000 + n, dtype=np.int64),
+        'Length': shapely.length(geoms),
+        'TYP_VOIE': rng.choice(STREET_TYPES, size=n, p=[0.5, 0.2, 0.1, 0.1, 0.05, 0.05]),
+    }
+    for column in SCORE_COLUMNS:
+        data[column] = rng.random(n).round(6)
+    return gpd.GeoDataFrame(data, geometry=geoms, crs='EPSG:32188')
+
+
+def make_slope_table(gdf, seed=0):
+    """Return a slope table keyed by ID_TRC, shaped like street_segment_slope.csv"""
+    rng = np.random.default_rng(seed + 1)
+    n = len(gdf)
+    slope_pct = np.abs(rng.normal(0.0, 3.0, size=n))
+    return pd.DataFrame({
+        'ID_TRC': gdf['ID_TRC'].to_numpy(),
+        'elev_start': rng.uniform(20.0, 200.0, size=n).round(2),
+        'elev_end': rng.uniform(20.0, 200.0, size=n).round(2),
+        'slope_pct': slope_pct.round(4),
+        'slope_normalized': (1.0 - np.clip(slope_pct / 15.0, 0.0, 1.0)).round(6),
+    })
+
+
+def write_city(out_dir, n_segments, seed=0):
+    """Write the shapefile and slope CSV, returning their paths"""
+    os.makedirs(out_dir, exist_ok=True)
+    shapefile_path = os.path.join(out_dir, 'synthetic_streets.shp')
+    csv_path = os.path.join(out_dir, 'street_segment_slope.csv')
+
+    gdf = make_network(n_segments, seed=seed)
+    gdf.to_file(shapefile_path)
+    make_slope_table(gdf, seed=seed).to_csv(csv_path, index=False)
+    return shapefile_path, csv_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('out_dir')
+    parser.add_argument('-n', '--segments', type=int, default=62000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_city(args.out_dir, args.segments, seed=args.seed)
+    print(f"Wrote {args.segments} segments to {paths[0]} and {paths[1]}")
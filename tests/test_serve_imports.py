@@ -0,0 +1,103 @@
+"""Import-time regression test for the serving process
+
+Runs the serve path in a fresh interpreter under `python -X importtime`:
+it imports Flask, then the app, maps a built artifact (of a small synthetic
+city) and answers the routes that only send pre-encoded bytes. Flask is
+imported first and on its own, so what is measured is what the app adds to
+it, and the time limit is relative to Flask's own import time in the same
+run rather than a wall-clock figure tuned to one machine.
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'urban_walkability_analytics_app.py')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Only the build path and the computing routes may import these
+FORBIDDEN = ('geopandas', 'pandas', 'pyogrio', 'pyarrow', 'shapely', 'numpy')
+STATIC_ROUTES = ['/healthz', '/readyz', '/api/version', '/', '/api/data', '/api/data?zoom=12',
+                 '/api/data.bin', '/tiles/12/1211/1463.mvt']
+# Modules the serve path may import beyond Flask's, and its import time as a multiple of Flask's
+MAX_APP_MODULES = 80
+MAX_FLASK_TIME_FACTOR = 1.0
+RUNS = 3
+FLASK_MARKER = 'flask starts'
+APP_MARKER = 'serve path starts'
+
+SERVE_PROBE = """
+import sys
+sys.stderr.write({flask_marker!r} + '\\n')
+import flask
+sys.stderr.write({app_marker!r} + '\\n')
+import urban_walkability_analytics_app as uwa
+uwa.load_artifact_data({artifact!r})
+client = uwa.app.test_client()
+for url in {routes!r}:
+    status = client.get(url).status_code
+    assert status in (200, 204), (url, status)
+"""
+
+
+def imports(lines):
+    """(seconds, modules) of an importtime log section"""
+    seconds, modules = 0.0, []
+    for line in lines:
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append(name.strip())
+        # Nested imports are indented; top-level ones carry the total of the ones under them
+        if not name[1:].startswith(' '):
+            seconds += int(cumulative) / 1e6
+    return seconds, modules
+
+
+def serve_imports(artifact):
+    """((seconds, modules) of Flask, (seconds, modules) of the serve path after it), from one run"""
+    probe = SERVE_PROBE.format(flask_marker=FLASK_MARKER, app_marker=APP_MARKER, artifact=artifact,
+                               routes=STATIC_ROUTES)
+    log = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stderr.splitlines()
+    flask_start, app_start = log.index(FLASK_MARKER), log.index(APP_MARKER)
+    return imports(log[flask_start + 1:app_start]), imports(log[app_start + 1:])
+
+
+@pytest.fixture(scope='module')
+def artifact(tmp_path_factory):
+    pytest.importorskip('geopandas')
+    from common import city_paths
+
+    shapefile_path, csv_path = city_paths(2000)
+    path = str(tmp_path_factory.mktemp('artifact') / 'city_2000.uwa')
+    subprocess.run([sys.executable, APP, 'build', '--shapefile', shapefile_path, '--slope-csv', csv_path,
+                    '--output', path], check=True, stdout=subprocess.DEVNULL)
+    return path
+
+
+@pytest.fixture(scope='module')
+def runs(artifact):
+    return [serve_imports(artifact) for _ in range(RUNS)]
+
+
+def test_no_data_libraries(runs):
+    _, (_, modules) = runs[-1]
+    forbidden = sorted({name.split('.')[0] for name in modules} & set(FORBIDDEN))
+    assert not forbidden, f"the serve path imported {', '.join(forbidden)}"
+
+
+def test_module_count(runs):
+    _, (_, modules) = runs[-1]
+    assert len(modules) <= MAX_APP_MODULES, \
+        f"the serve path imported {len(modules)} modules beyond Flask's, more than {MAX_APP_MODULES}"
+
+
+def test_import_time_relative_to_flask(runs):
+    # Median of the per-run ratios, so one slow run does not fail it
+    ratios = sorted(app_seconds / flask_seconds for (flask_seconds, _), (app_seconds, _) in runs)
+    ratio = ratios[len(ratios) // 2]
+    assert ratio <= MAX_FLASK_TIME_FACTOR, \
+        f"the serve path took {ratio:.2f}x Flask's import time, more than {MAX_FLASK_TIME_FACTOR}x"
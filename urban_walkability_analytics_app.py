@@ -1,640 +1,5522 @@
-from flask import Flask, render_template_string, jsonify
-import geopandas as gpd
-import pandas as pd
+from flask import Flask, render_template_string, jsonify, request, Response, g, has_request_context
 import json
 import webbrowser
 import threading
+import time
 import os
-import numpy as np
+import gc
+import signal
+import socket
+import logging
+import gzip
+import io
+import zlib
+import hashlib
+import importlib
+import mmap
+import shutil
+import tempfile
+import struct
+import sys
+import argparse
+import heapq
+import re
+import bisect
+import tracemalloc
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from functools import lru_cache, partial
+from email.utils import formatdate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: processes sharing a cache directory may each build an entry
+
+
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access
+
+    numpy and shapely are bound this way: a server mapping a built artifact
+    answers its static routes without ever importing them, and only the
+    first request that computes something pays for the import.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+np = _LazyModule('numpy')
+shapely = _LazyModule('shapely')
 
 app = Flask(__name__)
 
-# Global variables to store data
-geojson_response_cache = None
-center_coords = [0, 0]
+SHAPEFILE_PATH = "./data/GCWI_SCORE_streetswithsidewalk_Cleaned.shp"
+SLOPE_CSV_PATH = "./data/street_segment_slope.csv"
+SHAPEFILE_SIDECARS = ['.shp', '.dbf', '.shx', '.prj', '.cpg']
+SIMPLIFY_TOLERANCE = 0.00005
+# Grid size (degrees) the map payload's coordinates are rounded to, about 0.1 m
+COORDINATE_PRECISION = 1e-6
+
+# Levels of detail for /api/data?zoom=; each level serves zooms up to the next one
+LOD_ZOOMS = [10, 12, 14, 16]
+# Simplify each level to within this many screen pixels at its zoom
+LOD_PIXEL_TOLERANCE = 0.5
+# Below the finest level, segments shorter than this many pixels draw as a dot and are dropped
+LOD_MIN_SEGMENT_PIXELS = 0.5
+LOD_CHUNK_SIZE = 8192
+
+# Binary geometry transport (/api/data.bin)
+BINARY_MAGIC = b'UWAB'
+BINARY_VERSION = 1
+BINARY_MIMETYPE = 'application/octet-stream'
+
+# Per-segment attributes shown in the sidebar, served from /api/segment
+SEGMENT_FIELDS = ['ID_TRC', 'Length', 'TYP_VOIE', 'LUM_Score', 'SFI_score', 'G-Score',
+                  'SH_Score', 'CO_Score', 'Pop_Score', 'slope_normalized']
+MAX_BATCH_SEGMENTS = 5000
+
+# Spatial queries
+METERS_PER_DEGREE = 111320.0
+MAX_VIEWPORT_SEGMENTS = 20000
+MAX_NEAREST = 100
+
+# Metrics combined into the composite walkability score, in sidebar chart order
+SCORE_METRICS = ['LUM_Score', 'SFI_score', 'G-Score', 'SH_Score', 'CO_Score', 'Pop_Score',
+                 'slope_normalized']
+SCORE_CACHE_SIZE = 64
+
+# Similar streets (/api/similar): nearest neighbours over the SCORE_METRICS profile
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 100
+MAX_SIMILAR_RADIUS = 50000.0
+SIMILAR_CACHE_SIZE = 256
+
+# What-if scenarios (/api/scenarios): metric edits saved as diffs against the served data
+SCENARIO_DIR = "./scenarios"
+SCENARIO_ID_PATTERN = re.compile(r'[0-9a-f]{16}')
+SCENARIO_OPERATIONS = ('set', 'add', 'scale')
+MAX_SCENARIO_NAME = 200
+MAX_SCENARIO_SEGMENTS = 100000
+MAX_SCENARIO_POINTS = 1000
+# Scenarios applied to a snapshot, kept per dataset
+SCENARIO_CACHE_SIZE = 8
+
+# Attribute filters (/api/query)
+QUERY_CACHE_SIZE = 256
+QUERY_FORMATS = ('bitset', 'indices', 'ids')
+
+# Network statistics (/api/stats), aggregated per square grid cell and street type
+STATS_CELL_METERS = 500.0
+# Cells are widened until cells x street types stays under this, bounding the prefix sums' memory
+STATS_MAX_SKETCHES = 32768
+STATS_BINS = 16
+STATS_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+STATS_GROUPINGS = ('type', 'cell')
+STATS_CACHE_SIZE = 128
+
+# Walking network; 1.33 m/s is about 4.8 km/h
+WALK_SPEED_MPS = 1.33
+DEFAULT_WALK_MINUTES = 15
+MAX_WALK_MINUTES = 60
+# Extra cost per metre on the steepest streets: cost = length * (1 + penalty * (1 - slope_normalized))
+WALK_SLOPE_PENALTY = 0.0
+MAX_SLOPE_PENALTY = 10.0
+# Segment endpoints closer than this are joined into one intersection node
+NODE_SNAP_METERS = 0.5
+# Points further than this from every street are off the network
+MAX_SNAP_METERS = 500.0
+# Walksheds are computed from the centre of a grid cell and cached per cell
+ISOCHRONE_CELL_METERS = 50.0
+ISOCHRONE_CACHE_SIZE = 256
+
+# Catchment output columns, named as in data/LWM_GCWI_Catchment_Data_Oct_03.csv
+LWM_SCORE_COLUMNS = {
+    'LUM_Score': 'Land Use Mix (LWM Score)',
+    'SFI_score': 'Space for Rest (LWM Score)',
+    'G-Score': 'Greenery (LWM Score)',
+    'SH_Score': 'Shade (LWM Score)',
+    'CO_Score': 'Connectivity (LWM Score)',
+    'Pop_Score': 'Population Density (LWM Score)',
+    'slope_normalized': 'Slope (LWM Score)',
+}
+
+# Preprocessed-data cache; bump CACHE_VERSION whenever the entry layout changes
+CACHE_DIR = "./cache"
+# Subdirectory for the dataset served without --datasets; registry datasets use <cache>/<dataset>
+SINGLE_DATASET_CACHE = 'default'
+CACHE_VERSION = 9
+# Names of cache entry directories: the digests of _cache_key()
+CACHE_KEY_PATTERN = re.compile(r'[0-9a-f]{24}')
+
+# Build artifacts (the build and serve commands): a cache entry packed into one file
+ARTIFACT_PATH = "./walkability.uwa"
+ARTIFACT_MAGIC = b'UWAD'
+ARTIFACT_VERSION = 1
+# Files start on this boundary, which keeps the .npy arrays inside them aligned
+ARTIFACT_ALIGNMENT = 64
+
+# Compression settings for the pre-encoded payloads
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+RESPONSE_CHUNK_SIZE = 256 * 1024
+# GeoJSON is encoded this many features at a time, so the whole body is never built in memory
+GEOJSON_CHUNK_FEATURES = 8192
+
+# Streamed GeoJSON text sequences (RFC 8142) from /api/data?format=seq
+GEOJSON_SEQ_MIMETYPE = 'application/geo+json-seq'
+STREAM_CHUNK_FEATURES = 4096
+# Compressed per request, so a fast level; each chunk is flushed for the client to draw
+STREAM_GZIP_LEVEL = 1
+
+# Vector tile pyramid
+WEB_MERCATOR_HALF = 20037508.342789244
+TILE_MIN_ZOOM = 10
+TILE_MAX_ZOOM = 16
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_LAYER = 'segments'
+TILE_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+TILE_WORKERS = os.cpu_count() or 1
+
+# Seconds between checks of the input files for changes
+WATCH_INTERVAL = 2.0
+# Retry-After, in seconds, of the 503 answered to data requests while the data loads
+LOAD_RETRY_AFTER = 2
+
+# Dataset registry (--datasets): every dataset but the default is loaded on its first request
+DATASET_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+DATASET_MEMORY_MB = 4096
+# Seconds a request waits for its dataset to load before answering 503 with Retry-After
+DATASET_LOAD_WAIT = 10.0
+# Approximate heap size of a shapely geometry, and of each of its coordinates
+GEOMETRY_BYTES = 240
+COORDINATE_BYTES = 24
+
+# Multi-process serving
+SERVER_BACKLOG = 1024
+# Seconds a replaced worker keeps running so requests it already accepted can finish
+WORKER_SHUTDOWN_GRACE = 2.0
+
+# Instrumentation (/metrics), off unless started with --metrics
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Snapshot(namedtuple('Snapshot', ['version', 'loaded_at', 'center', 'geojson',
+                                       'feature_offsets', 'levels', 'binary', 'tiles', 'store',
+                                       'index', 'scores', 'queries', 'stats', 'isochrones',
+                                       'similar'])):
+    """Everything served for one version of the input data
+
+    A snapshot is never modified. Reloading builds a new one and swaps it in
+    with a single assignment, so a request that picked up the old snapshot
+    finishes with it, without any locking.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls, version=None):
+        payload = EncodedPayload(b'{"type": "FeatureCollection", "features": []}')
+        return cls(version, time.time(), [0, 0], payload, None, [], None, {}, None, None, None,
+                   None, None, None, None)
+
+    def detail_level(self, zoom):
+        """The coarsest level of detail that is still exact enough at a map zoom"""
+        chosen = self.levels[0] if self.levels else None
+        for level in self.levels:
+            if level.zoom <= zoom:
+                chosen = level
+        return chosen
+
+    def nbytes(self):
+        """Approximate memory the snapshot holds on to: its arrays, its payloads
+        (memory-mapped ones included) and its geometries"""
+        return _referenced_bytes(self, set())
+
+    def prepare(self):
+        """Load every Deferred part and build the spatial index now, e.g. before
+        forking workers that should share them"""
+        for part in list(self) + [level.offsets for level in self.levels]:
+            if isinstance(part, Deferred):
+                part.resolve()
+        if self.index is not None:
+            self.index.build()
+        return self
+
+
+class Deferred:
+    """A part of a snapshot that is only loaded when a request first uses it
+
+    Attribute access, len() and indexing go to the object factory() returns,
+    which is called once. The attributes given as keywords, and len() when
+    length is given, are answered without loading it.
+    """
+
+    __slots__ = ('_factory', '_value', '_known', '_lock')
+
+    def __init__(self, factory, length=None, **known):
+        self._factory = factory
+        self._value = None
+        self._known = dict(known, __len__=length)
+        self._lock = threading.Lock()
+
+    def peek(self):
+        """The object if it has been loaded already, otherwise None"""
+        return self._value if self._factory is None else None
+
+    def resolve(self):
+        if self._factory is not None:
+            with self._lock:
+                if self._factory is not None:
+                    self._value = self._factory()
+                    self._factory = None
+        return self._value
+
+    def __getattr__(self, name):
+        if name in Deferred.__slots__:
+            raise AttributeError(name)  # not initialized yet, e.g. while copying
+        if name in self._known:
+            return self._known[name]
+        return getattr(self.resolve(), name)
+
+    def __len__(self):
+        length = self._known['__len__']
+        return len(self.resolve()) if length is None else length
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+
+def _referenced_bytes(obj, seen):
+    """Bytes of the arrays, buffers and geometries reachable from obj, each counted once"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    # No array can exist before numpy is imported; checking for one would import it
+    if 'numpy' in sys.modules and isinstance(obj, np.ndarray):
+        size = obj.nbytes
+        if obj.dtype == object:
+            try:
+                coords = shapely.get_num_coordinates(obj)
+                size += int((coords > 0).sum()) * GEOMETRY_BYTES + int(coords.sum()) * COORDINATE_BYTES
+            except TypeError:
+                pass  # not an array of geometries
+        return size
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, memoryview):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        members = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        members = obj
+    elif hasattr(obj, '__slots__'):
+        members = [getattr(obj, name, None) for name in obj.__slots__]
+    else:
+        members = getattr(obj, '__dict__', {}).values()
+    return sum(_referenced_bytes(member, seen) for member in members)
+
+
+# The dataset being served; replaced as a whole by load_and_optimize_data()
+_snapshot = None
+# StageTimer of the load in progress, and why the last load failed
+_loading = None
+_load_error = None
+# DatasetRegistry of the datasets served under /api/<dataset>/, if one was configured
+_registry = None
+
+
+def current_snapshot():
+    """The snapshot the current request is for: that of its /api/<dataset>/ route,
+    otherwise the default dataset's"""
+    if has_request_context() and 'snapshot' in g:
+        return g.snapshot
+    return _snapshot if _snapshot is not None else Snapshot.empty()
+
+
+class EncodedPayload:
+    """Immutable response body, encoded once with its compressed variants"""
+
+    __slots__ = ('mimetype', 'variants', 'etags', 'last_modified')
+
+    def __init__(self, body, mimetype='application/json', last_modified=None, compress=True):
+        variants = {'identity': body}
+        if compress:
+            variants['gzip'] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+        self.mimetype = mimetype
+        self.variants = variants
+        self.etags = self.tags(hashlib.sha256(body), variants)
+        self.last_modified = last_modified
+
+    @staticmethod
+    def tags(sha256, codings):
+        # Each content-coding is a distinct representation, so it gets its own strong tag
+        digest = sha256.hexdigest()[:32]
+        return {coding: digest if coding == 'identity' else f"{digest}-{coding}" for coding in codings}
+
+    @classmethod
+    def from_variants(cls, variants, etags, mimetype, last_modified):
+        """Rebuild a payload from already-encoded variants, e.g. mapped from the cache"""
+        payload = cls.__new__(cls)
+        payload.mimetype = mimetype
+        payload.variants = variants
+        payload.etags = etags
+        payload.last_modified = last_modified
+        return payload
+
+    def __len__(self):
+        return len(self.variants['identity'])
+
+
+class PayloadWriter:
+    """Builds an EncodedPayload from a body that arrives in chunks
+
+    Given a cache directory, every variant is compressed as the chunks come
+    and written straight to the file the cache manifest expects, then
+    memory-mapped, so the body is never held in memory. Without one the
+    chunks are joined and compressed in memory as usual.
+    """
+
+    def __init__(self, entry_dir, name, mimetype='application/json', last_modified=None):
+        self.mimetype = mimetype
+        self.last_modified = last_modified
+        self.sha256 = hashlib.sha256()
+        self.parts = [] if entry_dir is None else None
+        self.paths, self.files, self.compressors = {}, {}, {}
+        if entry_dir is None:
+            return
+        self.compressors['gzip'] = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        if brotli is not None:
+            self.compressors['br'] = brotli.Compressor(quality=BROTLI_QUALITY)
+        for coding in ['identity'] + list(self.compressors):
+            self.paths[coding] = os.path.join(entry_dir, name if coding == 'identity' else f"{name}.{coding}")
+            self.files[coding] = open(self.paths[coding], 'wb')
+
+    def write(self, chunk):
+        self.sha256.update(chunk)
+        if self.parts is not None:
+            self.parts.append(chunk)
+            return
+        self.files['identity'].write(chunk)
+        for coding, compressor in self.compressors.items():
+            self.files[coding].write(compressor.process(chunk) if coding == 'br' else compressor.compress(chunk))
+
+    def finish(self):
+        if self.parts is not None:
+            return EncodedPayload(b''.join(self.parts), self.mimetype, self.last_modified)
+        for coding, compressor in self.compressors.items():
+            self.files[coding].write(compressor.finish() if coding == 'br' else compressor.flush())
+        for f in self.files.values():
+            f.close()
+        return EncodedPayload.from_variants({coding: _map_file(path) for coding, path in self.paths.items()},
+                                            EncodedPayload.tags(self.sha256, self.paths),
+                                            self.mimetype, self.last_modified)
+
+
+def _inputs_last_modified(*paths):
+    """Newest modification time among the input files, as a Unix timestamp"""
+    return max(int(os.path.getmtime(p)) for p in paths if os.path.exists(p)) if paths else None
+
+
+def send_payload(payload):
+    """Serve an EncodedPayload, honouring Accept-Encoding and conditional headers"""
+    coding = request.accept_encodings.best_match(
+        [c for c in ('br', 'gzip') if c in payload.variants]) or 'identity'
+
+    # Only the tag of the representation being served counts: a client holding the br copy has no gzip one
+    if request.if_none_match:
+        not_modified = payload.etags[coding] in request.if_none_match
+    else:
+        since = request.if_modified_since
+        not_modified = (since is not None and payload.last_modified is not None
+                        and payload.last_modified <= since.timestamp())
+
+    headers = {
+        'ETag': f'"{payload.etags[coding]}"',
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'no-cache',
+    }
+    if payload.last_modified is not None:
+        headers['Last-Modified'] = formatdate(payload.last_modified, usegmt=True)
+
+    if not_modified:
+        return Response(status=304, headers=headers)
+
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    body = payload.variants[coding]
+    headers['Content-Length'] = str(len(body))
+    return Response(_body_chunks(body), mimetype=payload.mimetype, headers=headers)
+
+
+def send_feature_sequence(payload, offsets):
+    """Stream a GeoJSON payload's features as application/geo+json-seq
+
+    The sequence is generated while it is sent, a chunk of features at a
+    time, so serving it takes no memory beyond one chunk.
+    """
+    compress = 'gzip' in request.accept_encodings
+    etag = f"{payload.etags['identity']}-seq" + ('-gzip' if compress else '')
+    headers = {'ETag': f'"{etag}"', 'Vary': 'Accept, Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if payload.last_modified is not None:
+        headers['Last-Modified'] = formatdate(payload.last_modified, usegmt=True)
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(feature_sequence(payload.variants['identity'], offsets, compress),
+                    mimetype=GEOJSON_SEQ_MIMETYPE, headers=headers)
+
+
+def _body_chunks(body, size=RESPONSE_CHUNK_SIZE):
+    """WSGI servers only accept bytes; copy memory-mapped bodies a chunk at a time"""
+    if isinstance(body, bytes):
+        yield body
+        return
+    for start in range(0, len(body), size):
+        yield bytes(body[start:start + size])
+
+
+# Vector tile encoding (Mapbox Vector Tile spec 2.1, single 'segments' layer)
+def _pb_varint(value):
+    if value < 0x80:
+        return _PB_SMALL_VARINTS[value]
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+_PB_SMALL_VARINTS = [bytes((v,)) for v in range(0x80)]
+
+
+def _pb_key(field, wire_type):
+    return _pb_varint((field << 3) | wire_type)
+
+
+def _pb_uint(field, value):
+    return _pb_key(field, 0) + _pb_varint(value)
+
+
+def _pb_bytes(field, data):
+    return _pb_key(field, 2) + _pb_varint(len(data)) + data
+
+
+def _pb_packed(field, values):
+    return _pb_bytes(field, b''.join(_pb_varint(v) for v in values))
+
+
+def _pb_varints(values):
+    """Varint-encode an array of non-negative integers in one pass
+
+    Returns the concatenated bytes and the encoded length of each value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    width = int(lengths.max()) if len(values) else 1
+    groups = ((values[:, None] >> (np.arange(width, dtype=np.uint64) * np.uint64(7)))
+              & np.uint64(0x7F)).astype(np.uint8)
+    column = np.arange(width)
+    groups[column < lengths[:, None] - 1] |= 0x80
+    return groups[column < lengths[:, None]].tobytes(), lengths
+
+
+def _mvt_value(value):
+    """Encode a property value as an MVT Value message"""
+    if isinstance(value, str):
+        return _pb_bytes(1, value.encode('utf-8'))
+    if isinstance(value, int):
+        return _pb_key(6, 0) + _pb_varint((value << 1) ^ (value >> 63))
+    return _pb_key(3, 1) + struct.pack('<d', value)
+
+
+def _mvt_line_geometries(coords, vertex_part, part_owner):
+    """Encode clipped LineString parts as MVT command streams, one per owner
+
+    coords are integer tile coordinates, vertex_part maps each vertex to its
+    part and part_owner maps each part to its feature. Returns the packed
+    command bytes plus, per feature, its owner and byte range.
+    """
+    # Quantization can collapse neighbouring vertices onto the same point
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1) | (vertex_part[1:] != vertex_part[:-1])
+    coords, vertex_part = coords[keep], vertex_part[keep]
+
+    # Parts that no longer have two distinct points are dropped
+    part_sizes = np.bincount(vertex_part, minlength=len(part_owner))
+    keep = part_sizes[vertex_part] >= 2
+    coords, vertex_part = coords[keep], vertex_part[keep]
+    if len(coords) == 0:
+        return b'', np.empty(0, dtype=np.int64), np.empty((0, 2), dtype=np.int64)
+    owner = part_owner[vertex_part]
+
+    # The cursor carries across parts but restarts at (0, 0) for every feature
+    first_of_part = np.r_[True, vertex_part[1:] != vertex_part[:-1]]
+    first_of_feature = np.r_[True, owner[1:] != owner[:-1]]
+    second_of_part = np.r_[False, first_of_part[:-1]]
+    previous = np.vstack([np.zeros((1, 2), dtype=np.int64), coords[:-1]])
+    previous[first_of_feature] = 0
+    deltas = coords - previous
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+
+    # Each vertex emits dx, dy, preceded by MoveTo(1) or LineTo(n - 1) where needed
+    tokens_per_vertex = 2 + first_of_part + second_of_part
+    starts = np.cumsum(tokens_per_vertex) - tokens_per_vertex
+    stream = np.empty(int(tokens_per_vertex.sum()), dtype=np.int64)
+    stream[starts[first_of_part]] = 9
+    stream[starts[second_of_part]] = 2 | ((part_sizes[vertex_part[second_of_part]] - 1) << 3)
+    position = starts + first_of_part + second_of_part
+    stream[position] = zigzag[:, 0]
+    stream[position + 1] = zigzag[:, 1]
+
+    data, lengths = _pb_varints(stream)
+    byte_offsets = np.r_[0, np.cumsum(lengths)]
+    feature_starts = np.flatnonzero(first_of_feature)
+    token_bounds = np.r_[starts[feature_starts], len(stream)]
+    ranges = np.column_stack([byte_offsets[token_bounds[:-1]], byte_offsets[token_bounds[1:]]])
+    return data, owner[feature_starts], ranges
+
+
+def _encode_tile(feature_ids, feature_tags, geometry, owners, ranges):
+    """Encode one single-layer MVT tile from pre-encoded geometry streams"""
+    keys, values = {}, {}
+    encoded = []
+    for owner, (start, stop) in zip(owners.tolist(), ranges.tolist()):
+        tag_ids = []
+        for key, value in feature_tags[owner]:
+            tag_ids.append(keys.setdefault(key, len(keys)))
+            tag_ids.append(values.setdefault((type(value), value), len(values)))
+        encoded.append(_pb_bytes(2, _pb_uint(1, feature_ids[owner]) + _pb_packed(2, tag_ids)
+                                 + _pb_uint(3, 2) + _pb_bytes(4, geometry[start:stop])))
+
+    layer = [_pb_uint(15, 2), _pb_bytes(1, TILE_LAYER.encode('utf-8'))]
+    layer.extend(encoded)
+    layer.extend(_pb_bytes(3, key.encode('utf-8')) for key in keys)
+    layer.extend(_pb_bytes(4, _mvt_value(value)) for _, value in values)
+    layer.append(_pb_uint(5, TILE_EXTENT))
+    return _pb_bytes(3, b''.join(layer))
+
+
+def _tile_size(z):
+    """Width of a zoom-z tile in Web Mercator metres"""
+    return 2 * WEB_MERCATOR_HALF / (1 << z)
+
+
+def _build_tile_chunk(z, tiles, geoms, feature_ids, feature_tags):
+    """Clip and encode a batch of tiles at zoom z; empty tiles are left out"""
+    size = _tile_size(z)
+    pad = size * TILE_BUFFER / TILE_EXTENT
+    scale = TILE_EXTENT / size
+    out = {}
+    for x, y, members in tiles:
+        minx = -WEB_MERCATOR_HALF + x * size
+        maxy = WEB_MERCATOR_HALF - y * size
+        clipped = shapely.clip_by_rect(geoms[members], minx - pad, maxy - size - pad,
+                                       minx + size + pad, maxy + pad)
+        parts, owners = shapely.get_parts(clipped, return_index=True)
+        coords, vertex_part = shapely.get_coordinates(parts, return_index=True)
+        if len(coords) == 0:
+            continue
+        tile_coords = np.empty(coords.shape, dtype=np.int64)
+        tile_coords[:, 0] = np.rint((coords[:, 0] - minx) * scale)
+        tile_coords[:, 1] = np.rint((maxy - coords[:, 1]) * scale)
+
+        geometry, feature_owner, ranges = _mvt_line_geometries(
+            tile_coords, vertex_part, members[owners])
+        if len(feature_owner):
+            out[(z, x, y)] = _encode_tile(feature_ids, feature_tags, geometry,
+                                          feature_owner, ranges)
+    return out
+
+
+def _tile_jobs(z, geoms, feature_ids, feature_tags, chunk_size=256):
+    """Assign simplified geometries to the zoom-z tiles they touch, in chunks"""
+    n_tiles = 1 << z
+    size = _tile_size(z)
+    pad = size * TILE_BUFFER / TILE_EXTENT
+
+    valid = np.flatnonzero(~(shapely.is_empty(geoms) | shapely.is_missing(geoms)))
+    bounds = shapely.bounds(geoms[valid])
+    tx0 = np.floor((bounds[:, 0] - pad + WEB_MERCATOR_HALF) / size).astype(np.int64)
+    tx1 = np.floor((bounds[:, 2] + pad + WEB_MERCATOR_HALF) / size).astype(np.int64)
+    ty0 = np.floor((WEB_MERCATOR_HALF - bounds[:, 3] - pad) / size).astype(np.int64)
+    ty1 = np.floor((WEB_MERCATOR_HALF - bounds[:, 1] + pad) / size).astype(np.int64)
+    tx0, tx1, ty0, ty1 = (np.clip(a, 0, n_tiles - 1) for a in (tx0, tx1, ty0, ty1))
+
+    # Expand every geometry into one row per tile it overlaps
+    nx = tx1 - tx0 + 1
+    counts = nx * (ty1 - ty0 + 1)
+    owner = np.repeat(np.arange(len(valid)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_x = tx0[owner] + offset % nx[owner]
+    tile_y = ty0[owner] + offset // nx[owner]
+
+    key = tile_x * n_tiles + tile_y
+    order = np.argsort(key, kind='stable')
+    key, members = key[order], valid[owner[order]]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    stops = np.r_[starts[1:], len(key)]
+
+    tiles = [(int(key[s] // n_tiles), int(key[s] % n_tiles), members[s:e])
+             for s, e in zip(starts, stops)]
+    for i in range(0, len(tiles), chunk_size):
+        chunk = tiles[i:i + chunk_size]
+        used = np.unique(np.concatenate([m for _, _, m in chunk]))
+        # Ship only the features this chunk needs, renumbered locally
+        remap = {g: l for l, g in enumerate(used.tolist())}
+        local = [(x, y, np.array([remap[g] for g in m.tolist()])) for x, y, m in chunk]
+        yield (z, local, geoms[used], [feature_ids[g] for g in used.tolist()],
+               [feature_tags[g] for g in used.tolist()])
+
+
+def build_tile_pyramid(gdf, ids, last_modified=None):
+    """Cut the street layer into Mapbox Vector Tiles for every zoom level
+
+    Features carry their ID_TRC as feature id and the segment index as
+    their only property; attributes are fetched from /api/segment.
+    """
+    merc = gdf.geometry.to_crs('EPSG:3857').to_numpy()
+    feature_ids = ids.tolist()
+    feature_tags = [(('i', i),) for i in range(len(feature_ids))]
+
+    jobs = []
+    for z in range(TILE_MIN_ZOOM, TILE_MAX_ZOOM + 1):
+        # Half a screen pixel at this zoom is below what can be seen
+        simplified = shapely.simplify(merc, _tile_size(z) / 512)
+        jobs.extend(_tile_jobs(z, simplified, feature_ids, feature_tags))
+
+    tiles = {}
+    if TILE_WORKERS > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=TILE_WORKERS) as pool:
+            for result in pool.map(_build_tile_chunk, *zip(*jobs)):
+                tiles.update(result)
+    else:
+        for job in jobs:
+            tiles.update(_build_tile_chunk(*job))
+
+    return {key: EncodedPayload(data, mimetype=TILE_MIMETYPE, last_modified=last_modified)
+            for key, data in tiles.items()}
+
+
+# Per-segment attribute store
+class SegmentStore:
+    """Columnar per-segment attributes, addressed by segment index or ID_TRC"""
+
+    def __init__(self, ids, columns, categories):
+        self.ids = ids
+        self.columns = columns
+        self.categories = categories
+        self.order = np.argsort(ids, kind='stable')
+        self.sorted_ids = ids[self.order]
+
+    @classmethod
+    def from_frame(cls, df):
+        import pandas as pd
+
+        ids = df['ID_TRC'].to_numpy(dtype=np.int64)
+        columns, categories = {}, {}
+        for name in SEGMENT_FIELDS[1:]:
+            if name not in df:
+                columns[name] = np.full(len(df), np.nan)
+            elif pd.api.types.is_numeric_dtype(df[name]):
+                columns[name] = df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                codes, labels = pd.factorize(df[name])
+                columns[name] = codes.astype(np.int32)
+                categories[name] = labels.astype(str).tolist()
+        return cls(ids, columns, categories)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, id_trc):
+        """Segment indices for one or many ID_TRC values, -1 where unknown"""
+        wanted = np.asarray(id_trc, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(wanted.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted_ids, wanted), len(self.ids) - 1)
+        return np.where(self.sorted_ids[pos] == wanted, self.order[pos], -1)
+
+    def record(self, index):
+        record = {'ID_TRC': int(self.ids[index])}
+        for name, column in self.columns.items():
+            if name in self.categories:
+                code = int(column[index])
+                record[name] = self.categories[name][code] if code >= 0 else None
+            else:
+                value = float(column[index])
+                record[name] = value if value == value else None
+        return record
+
+    def save(self, entry_dir):
+        """Write each column as a .npy file and return the manifest record"""
+        files = {'ID_TRC': 'segment_ids.npy'}
+        np.save(os.path.join(entry_dir, files['ID_TRC']), self.ids)
+        for i, (name, column) in enumerate(self.columns.items()):
+            files[name] = f"segment_col{i}.npy"
+            np.save(os.path.join(entry_dir, files[name]), column)
+        return {'files': files, 'categories': self.categories}
+
+    @classmethod
+    def load(cls, files, record):
+        arrays = {name: files.array(filename) for name, filename in record['files'].items()}
+        ids = arrays.pop('ID_TRC')
+        return cls(ids, arrays, record['categories'])
+
+
+def slim_geojson(geoms, ids):
+    """FeatureCollection of geometry plus segment index; attributes stay in the SegmentStore
+
+    Also returns each feature's (start, stop) byte range in the body, so
+    subsets can be served by slicing instead of re-encoding.
+    """
+    geometries = shapely.to_geojson(
+        shapely.set_precision(geoms, COORDINATE_PRECISION, mode='pointwise'))
+    return feature_collection(geometries, ids)
+
+
+def feature_collection(geometries, ids, keep=None):
+    """slim_geojson() body and byte ranges from GeoJSON geometry strings
+
+    Features where keep is False are left out; their range is empty.
+    """
+    offsets = np.zeros((len(ids), 2), dtype=np.int64)
+    return b''.join(feature_chunks(geometries, ids, keep, offsets)), offsets
+
+
+def encode_feature_collection(geometries, ids, keep=None, entry_dir=None, name='data.geojson',
+                              last_modified=None):
+    """feature_collection() as an EncodedPayload, streamed to entry_dir when given"""
+    offsets = np.zeros((len(ids), 2), dtype=np.int64)
+    writer = PayloadWriter(entry_dir, name, last_modified=last_modified)
+    for chunk in feature_chunks(geometries, ids, keep, offsets):
+        writer.write(chunk)
+    return writer.finish(), offsets
+
+
+def feature_chunks(geometries, ids, keep, offsets):
+    """The feature_collection() body, GEOJSON_CHUNK_FEATURES features at a time
+
+    Fills offsets, an (n, 2) array, with each feature's byte range.
+    """
+    keep = np.ones(len(ids), dtype=bool) if keep is None else np.asarray(keep)
+    head = b'{"type":"FeatureCollection","features":['
+    yield head
+    position, emitted = len(head), False
+    for start in range(0, len(ids), GEOJSON_CHUNK_FEATURES):
+        part = slice(start, start + GEOJSON_CHUNK_FEATURES)
+        features = [
+            f'{{"type":"Feature","id":{id_trc},"properties":{{"i":{i}}},"geometry":{g or "null"}}}'.encode('utf-8')
+            if kept else b''
+            for i, id_trc, g, kept in zip(range(start, start + len(ids[part])), ids[part].tolist(),
+                                          geometries[part].tolist(), keep[part].tolist())]
+        lengths = np.fromiter(map(len, features), dtype=np.int64, count=len(features))
+        # Kept features are followed by a comma; dropped ones take no space at all
+        steps = lengths + (lengths > 0)
+        starts = position + np.cumsum(steps) - steps
+        offsets[part] = np.column_stack([starts, starts + lengths])
+        position += int(steps.sum())
+        chunk = b','.join(f for f in features if f)
+        yield b',' + chunk if chunk and emitted else chunk
+        emitted = emitted or bool(chunk)
+    yield b']}'
+
+
+def feature_sequence(body, offsets, compress=False):
+    """The features of a slim_geojson() body as a GeoJSON text sequence (RFC 8142)
+
+    Features are sliced out of the encoded body, which is memory-mapped when
+    it comes from the cache, STREAM_CHUNK_FEATURES at a time and framed as
+    RS <feature> LF. With compress the stream is gzipped, flushing every
+    chunk so the client can decode and draw it while the rest arrives.
+    """
+    compressor = zlib.compressobj(STREAM_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    for start in range(0, len(offsets), STREAM_CHUNK_FEATURES):
+        ranges = offsets[start:start + STREAM_CHUNK_FEATURES]
+        ranges = ranges[ranges[:, 1] > ranges[:, 0]]
+        if len(ranges) == 0:
+            continue
+        base = int(ranges[0, 0])
+        block = bytes(body[base:int(ranges[-1, 1])])
+        chunk = b''.join(b'\x1e' + block[a:b] + b'\n' for a, b in (ranges - base).tolist())
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compress else chunk
+    if compress:
+        yield compressor.flush()
+
+
+# Binary geometry transport
+def encode_segments_binary(geoms, store):
+    """Geometry, segment IDs and attribute columns as little-endian typed arrays
+
+    Layout: BINARY_MAGIC, uint32 version, uint32 header length, a JSON header,
+    then 8-byte aligned sections. The header gives each section's offset from
+    the first section, its dtype and its length, so a client can wrap them in
+    typed arrays without parsing any geometry. Coordinates are integers in
+    units of COORDINATE_PRECISION degrees, interleaved lon/lat; the first
+    vertex of each line is absolute and every other one is the difference
+    from the vertex before it. line_segments maps lines to segment indices
+    and is left out when every segment is exactly one line.
+    """
+    parts, line_segments = shapely.get_parts(geoms, return_index=True)
+    coords, vertex_lines = shapely.get_coordinates(parts, return_index=True)
+    counts = np.bincount(vertex_lines, minlength=len(parts))
+    line_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    quantized = np.rint(coords / COORDINATE_PRECISION).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=0)
+    firsts = line_offsets[:-1][counts > 0]
+    deltas[firsts] = quantized[firsts]
+
+    ids = store.ids
+    fits_int32 = len(ids) == 0 or (ids.min() >= -2**31 and ids.max() < 2**31)
+    sections = {
+        'ids': ids.astype('<i4' if fits_int32 else '<f8'),
+        'line_offsets': line_offsets.astype('<u4'),
+        'line_segments': line_segments.astype('<u4'),
+        'coords': deltas.astype('<i4').ravel(),
+    }
+    if np.array_equal(line_segments, np.arange(len(ids))):
+        del sections['line_segments']
+    columns = {name: np.asarray(column).astype('<i4' if name in store.categories else '<f4')
+               for name, column in store.columns.items()}
+
+    layout, offset = {}, 0
+    for name, array in list(sections.items()) + list(columns.items()):
+        layout[name] = [offset, array.dtype.str, len(array)]
+        offset += -(-array.nbytes // 8) * 8
+    header = json.dumps({
+        'segments': len(store), 'lines': len(parts), 'vertices': len(coords),
+        'scale': COORDINATE_PRECISION,
+        'sections': {name: layout[name] for name in sections},
+        'columns': {name: layout[name] for name in columns},
+        'categories': store.categories,
+    }).encode('utf-8')
+
+    body = bytearray(BINARY_MAGIC + struct.pack('<II', BINARY_VERSION, len(header)) + header)
+    body += bytes(-len(body) % 8)
+    for array in list(sections.values()) + list(columns.values()):
+        body += array.tobytes()
+        body += bytes(-array.nbytes % 8)
+    return bytes(body)
+
+
+# Zoom-dependent levels of detail
+class DetailLevel(namedtuple('DetailLevel', ['zoom', 'tolerance', 'payload', 'offsets',
+                                             'vertices'])):
+    """The GeoJSON payload as simplified for one zoom level"""
+    __slots__ = ()
+
+    @property
+    def features(self):
+        return int(np.count_nonzero(self.offsets[:, 1] > self.offsets[:, 0]))
+
+    def report(self):
+        return {'zoom': self.zoom, 'tolerance_deg': self.tolerance, 'features': self.features,
+                'vertices': self.vertices,
+                'bytes': {coding: len(body) for coding, body in self.payload.variants.items()}}
+
+
+def _pixel_degrees(zoom, lat):
+    """Height of one 256 px screen pixel at a zoom, in degrees of latitude"""
+    return 360.0 / (256 * 2 ** zoom) * np.cos(np.radians(lat))
+
+
+def _lod_chunk(geoms, tolerance, grid_size):
+    """GeoJSON strings and vertex counts of one chunk simplified for a level"""
+    simplified = shapely.set_precision(shapely.simplify(geoms, tolerance, preserve_topology=True),
+                                       grid_size, mode='pointwise')
+    return shapely.to_geojson(simplified), shapely.get_num_coordinates(simplified)
+
+
+def build_detail_levels(geoms, ids, lengths, center_lat, last_modified=None, entry_dir=None):
+    """Encode the network once per LOD_ZOOMS level, each simplified from the full geometry
+
+    Shapely releases the GIL in its array operations, so chunks are
+    simplified on a thread pool without copying geometries between processes.
+    With entry_dir each level is streamed to its cache file instead of memory.
+    """
+    chunks = [slice(start, start + LOD_CHUNK_SIZE) for start in range(0, len(geoms), LOD_CHUNK_SIZE)]
+    lengths = np.asarray(lengths, dtype=np.float64)
+    levels = []
+    with ThreadPoolExecutor(max_workers=TILE_WORKERS) as pool:
+        for zoom in LOD_ZOOMS:
+            pixel = _pixel_degrees(zoom, center_lat)
+            tolerance = float(LOD_PIXEL_TOLERANCE * pixel)
+            # Round to the decimal digit just below the tolerance; finer is invisible
+            grid_size = max(COORDINATE_PRECISION, 10 ** np.floor(np.log10(tolerance / 2)))
+            parts = list(pool.map(lambda chunk: _lod_chunk(geoms[chunk], tolerance, grid_size), chunks))
+            geometries = np.concatenate([p[0] for p in parts]) if parts else np.empty(0, dtype=object)
+            vertices = np.concatenate([p[1] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+
+            keep = None
+            if zoom != LOD_ZOOMS[-1]:
+                min_length = LOD_MIN_SEGMENT_PIXELS * pixel * METERS_PER_DEGREE
+                keep = ~(lengths < min_length)
+            payload, offsets = encode_feature_collection(geometries, ids, keep, entry_dir,
+                                                         f"data_z{zoom}.geojson", last_modified)
+            kept_vertices = int(vertices.sum() if keep is None else vertices[keep].sum())
+            levels.append(DetailLevel(zoom, tolerance, payload, offsets, kept_vertices))
+    return levels
+
+
+# Spatial index
+class SpatialIndex:
+    """STRtree over segment geometries in a local metric frame
+
+    Coordinates are projected equirectangularly around the data center, which
+    keeps distances within a fraction of a percent across a city. geoms may
+    be a function returning them; the tree is then built by the first query
+    that needs it, or by build(), so that loading a cache does no geometry work.
+    """
+
+    def __init__(self, geoms, center):
+        lat0, lon0 = center
+        self.origin = np.array([lon0, lat0])
+        self.scale = np.array([METERS_PER_DEGREE * np.cos(np.radians(lat0)), METERS_PER_DEGREE])
+        self._source = geoms
+        self._geoms = self._tree = None
+        self._lock = threading.Lock()
+        if not callable(geoms):
+            self.build()
+
+    def build(self):
+        with self._lock:
+            if self._tree is None:
+                geoms = self._source() if callable(self._source) else self._source
+                self._geoms = shapely.transform(geoms, self.to_local)
+                self._tree = shapely.STRtree(self._geoms)
+                self._source = None
+        return self
+
+    @property
+    def geoms(self):
+        return self.build()._geoms if self._tree is None else self._geoms
+
+    @property
+    def tree(self):
+        return self.build()._tree if self._tree is None else self._tree
+
+    def to_local(self, lonlat):
+        return (np.asarray(lonlat, dtype=np.float64) - self.origin) * self.scale
+
+    def to_lonlat(self, xy):
+        return np.asarray(xy, dtype=np.float64) / self.scale + self.origin
+
+    def query_bbox(self, minlon, minlat, maxlon, maxlat):
+        """Indices of segments intersecting a lon/lat bounding box"""
+        (x0, y0), (x1, y1) = self.to_local([[minlon, minlat], [maxlon, maxlat]])
+        return self.tree.query(shapely.box(x0, y0, x1, y1), predicate='intersects')
+
+    def nearest(self, lon, lat, k=1):
+        """The k segments closest to a point, with distances in metres"""
+        point = shapely.points(self.to_local([lon, lat]))
+        if len(self.geoms) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        k = min(k, len(self.geoms))
+
+        # Grow a search radius from the single nearest hit until it holds k candidates
+        _, closest = self.tree.query_nearest(point, return_distance=True, all_matches=False)
+        if len(closest) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)  # a point off the map, e.g. at infinity
+        radius = max(2 * closest[0], 25.0)
+        while True:
+            candidates = self.tree.query(point, predicate='dwithin', distance=radius)
+            if len(candidates) >= k:
+                break
+            radius *= 2
+        distances = shapely.distance(self.geoms[candidates], point)
+        best = np.argsort(distances, kind='stable')[:k]
+        return candidates[best], distances[best]
+
+
+def save_geometry(entry_dir, geoms):
+    """Write geometries as ragged coordinate arrays for memory-mapped reloading"""
+    geom_type, coords, offsets = shapely.to_ragged_array(geoms)
+    np.save(os.path.join(entry_dir, 'geometry_coords.npy'), coords)
+    files = []
+    for i, offset in enumerate(offsets):
+        files.append(f"geometry_offsets{i}.npy")
+        np.save(os.path.join(entry_dir, files[-1]), offset)
+    return {'type': int(geom_type), 'coords': 'geometry_coords.npy', 'offsets': files}
+
+
+def load_geometry(files, record):
+    coords = files.array(record['coords'])
+    offsets = [files.array(name) for name in record['offsets']]
+    return shapely.from_ragged_array(shapely.GeometryType(record['type']), coords, offsets)
+
+
+def feature_subset(body, offsets, indices, **members):
+    """FeatureCollection of selected features, sliced out of a slim_geojson body"""
+    head = ''.join(f'"{key}":{json.dumps(value)},' for key, value in members.items())
+    features = b','.join(body[start:stop] for start, stop in offsets[indices].tolist()
+                         if stop > start)
+    return (b'{"type":"FeatureCollection",' + head.encode('utf-8') + b'"features":['
+            + features + b']}')
+
+
+# Composite walkability scoring
+class ScoreEngine:
+    """Weighted composite score of every segment, cached per weight vector"""
+
+    def __init__(self, store, last_modified=None):
+        # Missing metrics count as 0, as the sidebar's average always has
+        self.matrix = np.nan_to_num(np.column_stack(
+            [np.asarray(store.columns[name], dtype=np.float32) for name in SCORE_METRICS]))
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=SCORE_CACHE_SIZE)(self._payload)
+
+    def parse_weights(self, text):
+        """Normalized weight tuple from '1,0,2,...' or 'G-Score:2,SH_Score:1'"""
+        if not text:
+            weights = [1.0] * len(SCORE_METRICS)
+        elif ':' in text:
+            named = dict(item.split(':', 1) for item in text.split(','))
+            unknown = set(named) - set(SCORE_METRICS)
+            if unknown:
+                raise ValueError(f"unknown metrics: {', '.join(sorted(unknown))}")
+            weights = [float(named.get(name, 0)) for name in SCORE_METRICS]
+        else:
+            weights = [float(w) for w in text.split(',')]
+            if len(weights) != len(SCORE_METRICS):
+                raise ValueError(f"expected {len(SCORE_METRICS)} weights")
+        if not all(0 <= w < float('inf') for w in weights) or sum(weights) == 0:
+            raise ValueError("weights must be non-negative and not all zero")
+        total = sum(weights)
+        return tuple(round(w / total, 6) for w in weights)
+
+    def scores(self, weights):
+        return self.matrix @ np.asarray(weights, dtype=np.float32)
+
+    def _payload(self, weights):
+        body = self.scores(weights).astype('<f4').tobytes()
+        return EncodedPayload(body, mimetype='application/octet-stream',
+                              last_modified=self.last_modified, compress=False)
+
+
+class QueryEngine:
+    """Attribute filters over every segment, backed by indexes built once per snapshot
+
+    Numeric columns get a sorted index (the argsort order and the sorted
+    values), so a range or percentile bound costs two binary searches.
+    Categorical columns get one packed bitmap per label. Matches are packed
+    bitsets, bit i (least significant first) standing for segment index i,
+    combined with bitwise AND and cached per set of predicates.
+    """
+
+    def __init__(self, store, orders=None, last_modified=None):
+        self.count = len(store)
+        self.ids = store.ids
+        if orders is None:
+            orders = {name: np.argsort(column, kind='stable').astype(np.int32)
+                      for name, column in store.columns.items() if name not in store.categories}
+        self.orders = orders
+        self.sorted = {}
+        for name, order in orders.items():
+            values = np.asarray(store.columns[name])[order]
+            # argsort puts NaN last; missing values never match a range
+            self.sorted[name] = values[:len(values) - int(np.isnan(values).sum())]
+        self.labels = store.categories
+        self.bitmaps = {name: [np.packbits(np.asarray(store.columns[name]) == code, bitorder='little')
+                               for code in range(len(labels))]
+                        for name, labels in store.categories.items()}
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._payload)
+
+    def parse(self, args):
+        """Canonical predicate tuple from {column: spec}
+
+        A categorical spec is a comma-separated list of labels. A numeric spec
+        is 'min:max', both bounds inclusive and either one optional; a bound
+        is a number or a percentile of the column such as 'p80'.
+        """
+        predicates = []
+        for name, spec in sorted(args.items()):
+            if name in self.bitmaps:
+                labels = sorted({label for label in spec.split(',') if label})
+                unknown = set(labels) - set(self.labels[name])
+                if unknown:
+                    raise ValueError(f"unknown {name} values: {', '.join(sorted(unknown))}")
+                predicates.append((name, 'in', tuple(labels)))
+            elif name in self.sorted:
+                if ':' not in spec:
+                    raise ValueError(f"{name} must be 'min:max', e.g. '0.2:' or ':p80'")
+                predicates.append((name, 'range', tuple(self._bound(b) for b in spec.split(':', 1))))
+            else:
+                raise ValueError(f"unknown column {name}")
+        return tuple(predicates)
+
+    @staticmethod
+    def _bound(text):
+        text = text.strip()
+        if not text:
+            return None
+        if text[0] in 'pP':
+            percentile = float(text[1:])
+            if not 0 <= percentile <= 100:
+                raise ValueError(f"percentile {text} is not within p0..p100")
+            return ('p', percentile)
+        value = float(text)
+        if value != value:
+            raise ValueError("bounds must be numbers")
+        return value
+
+    def _value(self, name, bound):
+        if not isinstance(bound, tuple):
+            return bound
+        values = self.sorted[name]
+        if len(values) == 0:
+            return float('nan')
+        return float(values[int(round(bound[1] / 100 * (len(values) - 1)))])
+
+    def match(self, predicates):
+        """Packed bitset of the segments satisfying every predicate"""
+        bits = None
+        for name, kind, spec in predicates:
+            if kind == 'in':
+                part = np.zeros((self.count + 7) // 8, dtype=np.uint8)
+                for label in spec:
+                    part |= self.bitmaps[name][self.labels[name].index(label)]
+            else:
+                values, (lo, hi) = self.sorted[name], spec
+                start = np.searchsorted(values, self._value(name, lo), 'left') if lo is not None else 0
+                stop = np.searchsorted(values, self._value(name, hi), 'right') if hi is not None \
+                    else len(values)
+                mask = np.zeros(self.count, dtype=bool)
+                mask[self.orders[name][start:max(start, stop)]] = True
+                part = np.packbits(mask, bitorder='little')
+            bits = part if bits is None else bits & part
+        if bits is None:
+            bits = np.packbits(np.ones(self.count, dtype=bool), bitorder='little')
+        return bits
+
+    def _payload(self, predicates, fmt):
+        bits = self.match(predicates)
+        matches = np.flatnonzero(np.unpackbits(bits, count=self.count, bitorder='little'))
+        if fmt == 'bitset':
+            body, mimetype = bits.tobytes(), 'application/octet-stream'
+        else:
+            values = matches if fmt == 'indices' else self.ids[matches]
+            body = json.dumps({"count": len(matches), fmt: values.tolist()}).encode('utf-8')
+            mimetype = 'application/json'
+        return EncodedPayload(body, mimetype=mimetype, last_modified=self.last_modified), len(matches)
+
+    def save(self, entry_dir):
+        files = {}
+        for i, (name, order) in enumerate(self.orders.items()):
+            files[name] = f"query_order{i}.npy"
+            np.save(os.path.join(entry_dir, files[name]), order)
+        return files
+
+    @classmethod
+    def load(cls, files, record, store, last_modified=None):
+        orders = {name: files.array(filename) for name, filename in record.items()}
+        return cls(store, orders, last_modified=last_modified)
+
+
+class StatsEngine:
+    """Length-weighted summaries of the metrics, by street type and square grid cell
+
+    Each segment counts in the grid cell holding the middle of its bounding
+    box. For every cell and street type the engine keeps the segment count,
+    the street length and, per metric, the length-weighted sum, sum of squares
+    and a STATS_BINS-bin histogram, all as 2-D prefix sums over the grid: the
+    totals of any block of cells take four lookups, however many segments lie
+    inside. A bbox is widened to the whole cells it touches, and quantiles are
+    interpolated within histogram bins.
+    """
+
+    def __init__(self, store, index, last_modified=None):
+        self.to_local, self.to_lonlat = index.to_local, index.to_lonlat
+        lengths = np.nan_to_num(np.asarray(store.columns['Length'], dtype=np.float64))
+        if 'TYP_VOIE' in store.categories:
+            self.labels = list(store.categories['TYP_VOIE'])
+            groups = np.asarray(store.columns['TYP_VOIE'], dtype=np.int64)
+        else:
+            self.labels, groups = [], np.full(len(store), -1, dtype=np.int64)
+        if (groups < 0).any():
+            self.labels.append(None)  # segments without a street type
+            groups = np.where(groups < 0, len(self.labels) - 1, groups)
+
+        # Grid over the middle of each segment's bounds, in the index's metric frame
+        bounds = shapely.bounds(index.geoms)
+        middle = (bounds[:, :2] + bounds[:, 2:]) / 2
+        located = np.isfinite(middle).all(axis=1)
+        self.origin = middle[located].min(axis=0) if located.any() else np.zeros(2)
+        extent = middle[located].max(axis=0) - self.origin if located.any() else np.zeros(2)
+        cell = STATS_CELL_METERS
+        while np.prod(extent // cell + 1) * max(len(self.labels), 1) > STATS_MAX_SKETCHES:
+            cell *= 1.25
+        self.cell = cell
+        self.nx, self.ny = (extent // cell + 1).astype(int)
+        col, row = ((middle[located] - self.origin) // cell).astype(np.int64).T
+        key = (row * self.nx + col) * max(len(self.labels), 1) + groups[located]
+        slots = self.ny * self.nx * max(len(self.labels), 1)
+
+        # Channels: count, length, then per metric weight, sum, sum of squares and bins
+        self.metrics = SCORE_METRICS
+        self.ranges = {}
+        channels = [np.bincount(key, minlength=slots),
+                    np.bincount(key, weights=lengths[located], minlength=slots)]
+        for name in self.metrics:
+            values = np.asarray(store.columns[name], dtype=np.float64)[located]
+            valid = ~np.isnan(values)
+            lo, hi = (float(values[valid].min()), float(values[valid].max())) if valid.any() else (0.0, 1.0)
+            self.ranges[name] = (lo, hi if hi > lo else lo + 1.0)
+            weights = np.where(valid, lengths[located], 0.0)
+            values = np.where(valid, values, 0.0)
+            bins = self._bins(name, values)
+            channels += [np.bincount(key, weights=weights, minlength=slots),
+                         np.bincount(key, weights=weights * values, minlength=slots),
+                         np.bincount(key, weights=weights * values * values, minlength=slots)]
+            channels.append(np.bincount(key * STATS_BINS + bins, weights=weights,
+                                        minlength=slots * STATS_BINS).reshape(slots, STATS_BINS))
+        sketches = np.column_stack(channels).reshape(self.ny, self.nx, max(len(self.labels), 1), -1)
+        self.prefix = np.zeros((self.ny + 1, self.nx + 1) + sketches.shape[2:])
+        self.prefix[1:, 1:] = sketches.cumsum(axis=0).cumsum(axis=1)
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=STATS_CACHE_SIZE)(self._payload)
+
+    @property
+    def nbytes(self):
+        return self.prefix.nbytes
+
+    def save(self, entry_dir):
+        np.save(os.path.join(entry_dir, 'stats_prefix.npy'), self.prefix)
+        return {'prefix': 'stats_prefix.npy', 'origin': self.origin.tolist(), 'cell': self.cell,
+                'nx': int(self.nx), 'ny': int(self.ny), 'labels': self.labels,
+                'ranges': {name: list(bounds) for name, bounds in self.ranges.items()}}
+
+    @classmethod
+    def load(cls, files, record, index, last_modified=None):
+        """The saved grid, without touching the geometry"""
+        engine = cls.__new__(cls)
+        engine.to_local, engine.to_lonlat = index.to_local, index.to_lonlat
+        engine.labels = record['labels']
+        engine.origin = np.array(record['origin'])
+        engine.cell, engine.nx, engine.ny = record['cell'], record['nx'], record['ny']
+        engine.metrics = SCORE_METRICS
+        engine.ranges = {name: tuple(bounds) for name, bounds in record['ranges'].items()}
+        engine.prefix = files.array(record['prefix'])
+        engine.last_modified = last_modified
+        engine.payload = lru_cache(maxsize=STATS_CACHE_SIZE)(engine._payload)
+        return engine
+
+    def _bins(self, name, values):
+        lo, hi = self.ranges[name]
+        return np.clip(((values - lo) / (hi - lo) * STATS_BINS).astype(np.int64), 0, STATS_BINS - 1)
+
+    def cells(self, bbox=None):
+        """Inclusive (row0, row1, col0, col1) of the cells a lon/lat bbox touches, None if none"""
+        if bbox is None:
+            return (0, self.ny - 1, 0, self.nx - 1)
+        minlon, minlat, maxlon, maxlat = bbox
+        (x0, y0), (x1, y1) = (self.to_local([[minlon, minlat], [maxlon, maxlat]]) - self.origin) // self.cell
+        col0, col1 = max(int(x0), 0), min(int(x1), self.nx - 1)
+        row0, row1 = max(int(y0), 0), min(int(y1), self.ny - 1)
+        if col0 > col1 or row0 > row1:
+            return None
+        return (row0, row1, col0, col1)
+
+    def block(self, cells):
+        """Totals per street type over a block of cells, from the prefix sums"""
+        row0, row1, col0, col1 = cells
+        p = self.prefix
+        return np.maximum(p[row1 + 1, col1 + 1] - p[row0, col1 + 1] - p[row1 + 1, col0] + p[row0, col0], 0)
+
+    def cell_totals(self, cells):
+        """Totals of each cell of a block, street types together, as (rows, cols, channels)"""
+        # Per-cell totals are the differences of neighbouring prefix sums
+        row0, row1, col0, col1 = cells
+        return np.diff(np.diff(self.prefix[row0:row1 + 2, col0:col1 + 2].sum(axis=2), axis=0), axis=1)
+
+    def cell_bbox(self, cells):
+        row0, row1, col0, col1 = cells
+        corners = self.origin + np.array([[col0, row0], [col1 + 1, row1 + 1]]) * self.cell
+        return [round(v, 6) for v in self.to_lonlat(corners).ravel().tolist()]
+
+    def summaries(self, totals, metrics, histograms=True):
+        """JSON-ready summaries of rows of totals (count, length, then the metric channels)"""
+        totals = np.atleast_2d(totals)
+        results = [{"segments": int(round(count)), "length_m": round(length, 1), "metrics": {}}
+                   for count, length in totals[:, :2].tolist()]
+        width = 3 + STATS_BINS
+        for name in metrics:
+            i = 2 + self.metrics.index(name) * width
+            weight, total, squares = totals[:, i], totals[:, i + 1], totals[:, i + 2]
+            hist = totals[:, i + 3:i + width]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = total / weight
+                std = np.sqrt(np.maximum(squares / weight - mean * mean, 0.0))
+
+            # Quantiles: linear interpolation within the bin each one falls in
+            lo, hi = self.ranges[name]
+            cumulative = np.cumsum(hist, axis=1)
+            targets = np.asarray(STATS_QUANTILES) * cumulative[:, -1:]
+            bins = np.minimum((cumulative[:, :, None] < targets[:, None, :]).sum(axis=1), STATS_BINS - 1)
+            before = np.where(bins > 0, np.take_along_axis(cumulative, np.maximum(bins - 1, 0), axis=1), 0.0)
+            inside = np.take_along_axis(hist, bins, axis=1)
+            fraction = np.divide(targets - before, inside, out=np.zeros_like(targets), where=inside > 0)
+            quantiles = lo + (bins + np.clip(fraction, 0, 1)) * (hi - lo) / STATS_BINS
+
+            columns = zip(weight.round(1).tolist(), mean.round(4).tolist(), std.round(4).tolist(),
+                          quantiles.round(4).tolist(), hist.round(1).tolist())
+            for result, (w, m, sd, q, h) in zip(results, columns):
+                if w <= 0:
+                    result["metrics"][name] = None
+                    continue
+                result["metrics"][name] = {
+                    "length_m": w, "mean": m, "std": sd,
+                    "quantiles": {f"p{round(p * 100)}": v for p, v in zip(STATS_QUANTILES, q)},
+                }
+                if histograms:
+                    result["metrics"][name]["histogram"] = h
+        return results
+
+    def _payload(self, cells, by=None, metrics=None, histograms=True):
+        metrics = metrics or self.metrics
+        body = {"by": by, "cell_meters": round(self.cell, 1)}
+        if histograms:
+            body["bins"] = {name: np.linspace(*self.ranges[name], STATS_BINS + 1).round(4).tolist()
+                            for name in metrics}
+        if cells is None:
+            total, = self.summaries(np.zeros(self.prefix.shape[-1]), metrics, histograms)
+            body.update(bbox=None, total=total, groups=[])
+            return EncodedPayload(json.dumps(body).encode('utf-8'), last_modified=self.last_modified)
+
+        totals = self.block(cells)
+        body["bbox"] = self.cell_bbox(cells)
+        body["total"], = self.summaries(totals.sum(axis=0), metrics, histograms)
+        groups = []
+        if by == 'type':
+            present = totals[:, 0] > 0.5
+            for label, summary in zip([l for l, keep in zip(self.labels, present) if keep],
+                                      self.summaries(totals[present], metrics, histograms)):
+                groups.append(dict(key=label, **summary))
+        elif by == 'cell':
+            row0, row1, col0, col1 = cells
+            per_cell = self.cell_totals(cells)
+            rows, cols = np.nonzero(per_cell[:, :, 0] > 0.5)
+            summaries = self.summaries(np.maximum(per_cell[rows, cols], 0), metrics, histograms)
+            for row, col, summary in zip((rows + row0).tolist(), (cols + col0).tolist(), summaries):
+                groups.append(dict(key=[col, row], bbox=self.cell_bbox((row, row, col, col)), **summary))
+        body["groups"] = groups
+        return EncodedPayload(json.dumps(body).encode('utf-8'), last_modified=self.last_modified)
+
+
+# Similar streets
+class SimilarityEngine:
+    """Segments with a walkability profile like a given one's, cached per query
+
+    Each SCORE_METRICS column is standardized to zero mean and unit variance,
+    so every metric weighs the same in the Euclidean distance between
+    profiles; a missing value sits at the mean. With seven dimensions a tree
+    prunes little, so a query scans every profile: one matrix-vector product
+    against precomputed squared norms, then an argpartition for the k best,
+    which are re-ranked on their exact distances. A radius first narrows the
+    scan to the segments within that many metres, through the spatial index.
+    """
+
+    def __init__(self, store, index, last_modified=None):
+        columns = np.column_stack([np.asarray(store.columns[name], dtype=np.float64)
+                                   for name in SCORE_METRICS])
+        present = ~np.isnan(columns)
+        counts = np.maximum(present.sum(axis=0), 1)
+        mean = np.where(present, columns, 0).sum(axis=0) / counts
+        std = np.sqrt(np.where(present, (columns - mean) ** 2, 0).sum(axis=0) / counts)
+        self.profiles = np.nan_to_num((columns - mean) / np.where(std > 0, std, 1)).astype(np.float32)
+        self.norms = np.einsum('ij,ij->i', self.profiles, self.profiles)
+        self.ids = store.ids
+        self.index = index
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=SIMILAR_CACHE_SIZE)(self._payload)
+
+    def similar(self, segment, k, radius=None):
+        """The k segments closest in profile to a segment, itself left out, closest
+        first: (segment indices, profile distances)"""
+        profile = self.profiles[segment]
+        # Squared distances up to the query's own squared norm, which ranks the same
+        if radius is None:
+            k = min(k, len(self.profiles) - 1)
+            squared = self.norms - 2 * (self.profiles @ profile)
+            squared[segment] = np.inf
+            candidates = None
+        else:
+            candidates = self.index.tree.query(self.index.geoms[segment], predicate='dwithin',
+                                               distance=radius)
+            candidates = candidates[candidates != segment]
+            k = min(k, len(candidates))
+            squared = self.norms[candidates] - 2 * (self.profiles[candidates] @ profile)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        best = np.argpartition(squared, k - 1)[:k]
+        if candidates is not None:
+            best = candidates[best]
+        distances = np.sqrt(((self.profiles[best] - profile) ** 2).sum(axis=1, dtype=np.float64))
+        order = np.lexsort((best, distances))
+        return best[order], distances[order]
+
+    def _payload(self, segment, k, radius):
+        indices, distances = self.similar(segment, k, radius)
+        geoms = self.index.geoms
+        # Distance along the ground, and a point on each street to mark it on the map
+        ground = shapely.distance(geoms[indices], geoms[segment])
+        middles = self.index.to_lonlat(shapely.get_coordinates(
+            shapely.line_interpolate_point(geoms[indices], 0.5, normalized=True)))
+        body = json.dumps({
+            'ID_TRC': int(self.ids[segment]), 'i': segment, 'k': k, 'radius_m': radius,
+            'segments': [{'i': i, 'ID_TRC': int(self.ids[i]), 'distance': round(d, 4),
+                          'distance_m': round(m, 1), 'point': [round(lat, 6), round(lon, 6)]}
+                         for i, d, m, (lon, lat) in zip(indices.tolist(), distances.tolist(),
+                                                        ground.tolist(), middles.tolist())],
+        }).encode('utf-8')
+        return EncodedPayload(body, last_modified=self.last_modified)
+
+
+# Walkable street network
+def bounded_dijkstra(indptr, neighbors, costs, sources, limit):
+    """Cheapest walking cost from the sources to every node within limit
+
+    sources holds (node, starting cost) pairs. The graph arrays only need to
+    be indexable: memoryviews over NumPy, memory-mapped or shared-memory
+    arrays index as fast as lists without copying them.
+    """
+    settled = {}
+    heap = [(cost, node) for node, cost in sources if cost <= limit]
+    heapq.heapify(heap)
+    pop, push = heapq.heappop, heapq.heappush
+    while heap:
+        cost, node = pop(heap)
+        if node in settled:
+            continue
+        settled[node] = cost
+        for e in range(indptr[node], indptr[node + 1]):
+            reached = cost + costs[e]
+            if reached <= limit and neighbors[e] not in settled:
+                push(heap, (reached, neighbors[e]))
+    return settled
+
+
+class WalkGraph:
+    """Undirected street graph over segment endpoints, as CSR adjacency arrays
+
+    The edges of node v are indptr[v]:indptr[v + 1]; each one stores the node
+    at its far end and the segment it walks along.
+    """
+
+    FILES = ['segment_nodes', 'lengths', 'difficulty', 'indptr', 'neighbors', 'edge_segments']
+
+    def __init__(self, segment_nodes, lengths, difficulty, indptr, neighbors, edge_segments):
+        self.segment_nodes = segment_nodes
+        self.lengths = lengths
+        self.difficulty = difficulty
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.edge_segments = edge_segments
+        # memoryviews index as fast as lists in the search loop, NumPy scalars do not
+        self.adjacency = (memoryview(np.ascontiguousarray(indptr)),
+                          memoryview(np.ascontiguousarray(neighbors)))
+        self.costs = lru_cache(maxsize=8)(self._costs)
+
+    @classmethod
+    def from_geometry(cls, local_geoms, lengths, slope_normalized):
+        """Join segment endpoints (in a metric frame) into nodes and link them"""
+        n = len(local_geoms)
+        coords, owner = shapely.get_coordinates(local_geoms, return_index=True)
+        first = np.searchsorted(owner, np.arange(n))
+        last = np.searchsorted(owner, np.arange(n), side='right') - 1
+        valid = last >= first
+
+        segment_nodes = np.full((n, 2), -1, dtype=np.int32)
+        ends = np.concatenate([coords[first[valid]], coords[last[valid]]])
+        keys = np.round(ends / NODE_SNAP_METERS).astype(np.int64)
+        _, node_ids = np.unique(keys, axis=0, return_inverse=True)
+        node_ids = node_ids.reshape(-1)
+        segment_nodes[valid] = node_ids.reshape(2, -1).T
+        n_nodes = int(node_ids.max()) + 1 if len(node_ids) else 0
+
+        lengths = np.asarray(lengths, dtype=np.float64)
+        measured = shapely.length(local_geoms)
+        lengths = np.where(np.isfinite(lengths) & (lengths > 0), lengths, measured)
+        difficulty = cls.difficulty_of(slope_normalized)
+
+        # Both directions of every segment that joins two distinct nodes
+        u, v = segment_nodes[:, 0], segment_nodes[:, 1]
+        linked = np.flatnonzero(valid & (u != v)).astype(np.int32)
+        src = np.concatenate([u[linked], v[linked]])
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+        neighbors = np.concatenate([v[linked], u[linked]])[order]
+        edge_segments = np.concatenate([linked, linked])[order]
+        return cls(segment_nodes, lengths, difficulty, indptr, neighbors, edge_segments)
+
+    @staticmethod
+    def difficulty_of(slope_normalized):
+        """Slope difficulty in [0, 1] of each segment; a missing slope counts as flat"""
+        return np.clip(1.0 - np.nan_to_num(np.asarray(slope_normalized, dtype=np.float64), nan=1.0),
+                       0.0, 1.0)
+
+    @property
+    def node_count(self):
+        return len(self.indptr) - 1
+
+    def _costs(self, slope_penalty):
+        """Walking cost of each segment and of each edge, for one slope penalty"""
+        segment_costs = self.lengths * (1.0 + slope_penalty * self.difficulty)
+        return segment_costs, memoryview(segment_costs[self.edge_segments])
+
+    def reach(self, segment, along, limit, slope_penalty=WALK_SLOPE_PENALTY):
+        """Segments walkable within limit from a point part-way along a segment
+
+        Returns the segment indices, the walkable fraction of each, and the
+        number of intersections reached.
+        """
+        segment_costs, edge_costs = self.costs(slope_penalty)
+        indptr, neighbors = self.adjacency
+        cost = float(segment_costs[segment])
+        u, v = self.segment_nodes[segment].tolist()
+        settled = bounded_dijkstra(indptr, neighbors, edge_costs,
+                                   [(u, along * cost), (v, (1 - along) * cost)], limit)
+
+        # Every edge leaving a settled node, with the budget left at that node
+        nodes = np.fromiter(settled.keys(), dtype=np.int64, count=len(settled))
+        spare = limit - np.fromiter(settled.values(), dtype=np.float64, count=len(settled))
+        starts, counts = self.indptr[nodes], self.indptr[nodes + 1] - self.indptr[nodes]
+        edges = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        segments = self.edge_segments[edges]
+        walked = np.minimum(np.repeat(spare, counts), segment_costs[segments])
+
+        # A segment is covered from both ends at most once over
+        segments, inverse = np.unique(segments, return_inverse=True)
+        cost = segment_costs[segments]
+        covered = np.bincount(inverse, weights=walked, minlength=len(segments))
+        coverage = np.where(cost > 0, np.minimum(covered / np.where(cost > 0, cost, 1), 1.0), 1.0)
+
+        # The start segment is walkable from the start point even if neither end is reached
+        start = min(limit, along * segment_costs[segment]) + min(limit, (1 - along) * segment_costs[segment])
+        pos = np.searchsorted(segments, segment)
+        if pos == len(segments) or segments[pos] != segment:
+            segments, coverage = np.insert(segments, pos, segment), np.insert(coverage, pos, 0.0)
+        if segment_costs[segment] > 0:
+            coverage[pos] = max(coverage[pos], min(1.0, start / segment_costs[segment]))
+        else:
+            coverage[pos] = 1.0
+        return segments, coverage, len(settled)
+
+    def save(self, entry_dir):
+        files = {}
+        for name in self.FILES:
+            files[name] = f"walk_{name}.npy"
+            np.save(os.path.join(entry_dir, files[name]), getattr(self, name))
+        return files
+
+    @classmethod
+    def load(cls, files, record):
+        return cls(*(files.array(record[name]) for name in cls.FILES))
+
+
+class IsochroneEngine:
+    """Walksheds around map points, cached per origin grid cell"""
+
+    def __init__(self, graph, index, last_modified=None):
+        self.graph = graph
+        self.index = index
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=ISOCHRONE_CACHE_SIZE)(self._payload)
+
+    def origin_cell(self, lon, lat):
+        x, y = self.index.to_local([lon, lat]) / ISOCHRONE_CELL_METERS
+        return int(np.floor(x)), int(np.floor(y))
+
+    def snap(self, lon, lat):
+        """Closest routable segment to a point: (segment, fraction along it, distance in m)"""
+        if not np.isfinite([lon, lat]).all():
+            return None
+        indices, distances = self.index.nearest(lon, lat, 1)
+        if len(indices) == 0 or distances[0] > MAX_SNAP_METERS or self.graph.segment_nodes[indices[0]][0] < 0:
+            return None
+        segment = int(indices[0])
+        along = shapely.line_locate_point(self.index.geoms[segment],
+                                          shapely.points(self.index.to_local([lon, lat])),
+                                          normalized=True)
+        return segment, float(along), float(distances[0])
+
+    def walkshed(self, cell, minutes, slope_penalty=WALK_SLOPE_PENALTY):
+        """Streets reachable on foot from the centre of an origin cell"""
+        origin = (np.asarray(cell, dtype=np.float64) + 0.5) * ISOCHRONE_CELL_METERS
+        lon, lat = self.index.to_lonlat(origin)
+        limit = minutes * 60 * WALK_SPEED_MPS
+        result = {'origin': [round(float(lat), 6), round(float(lon), 6)], 'minutes': minutes,
+                  'slope_penalty': slope_penalty, 'distance_m': round(limit, 1)}
+
+        snapped = self.snap(lon, lat)
+        if snapped is None:
+            return {**result, 'snap_distance_m': None, 'nodes': 0, 'segments': [],
+                    'coverage': [], 'reachable_length_m': 0.0}
+
+        segment, along, distance = snapped
+        segments, coverage, nodes = self.graph.reach(segment, along, limit, slope_penalty)
+        return {**result, 'snap_distance_m': round(distance, 2), 'nodes': nodes,
+                'segments': segments.tolist(), 'coverage': np.round(coverage, 3).tolist(),
+                'reachable_length_m': round(float(coverage @ self.graph.lengths[segments]), 1)}
+
+    def _payload(self, cell, minutes, slope_penalty):
+        body = json.dumps(self.walkshed(cell, minutes, slope_penalty)).encode('utf-8')
+        return EncodedPayload(body, last_modified=self.last_modified)
+
+
+# Batch catchments: walksheds of many points, spread over worker processes
+_catchment_worker = None
+
+
+def _share_arrays(arrays):
+    """Copy named arrays into shared memory; returns the blocks and how to attach them"""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def _attach_catchment_worker(specs):
+    """Pool initializer: map the graph and metric arrays without copying them"""
+    global _catchment_worker
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        blocks.append(shared_memory.SharedMemory(name=block_name))
+        arrays[name] = np.ndarray(shape, dtype, buffer=blocks[-1].buf)
+    graph = WalkGraph(*(arrays[name] for name in WalkGraph.FILES))
+    _catchment_worker = (blocks, graph, arrays['metrics'])
+
+
+def _catchment_means(walked, values):
+    """Length-weighted mean of each column of values over the walked length of its segment"""
+    known = np.isfinite(values)
+    weights = (walked[:, None] * known).sum(axis=0)
+    sums = (np.where(known, values, 0.0) * walked[:, None]).sum(axis=0)
+    return np.divide(sums, weights, out=np.full(len(sums), np.nan), where=weights > 0)
+
+
+def _catchment_chunk(origins, limit, slope_penalty, graph=None, metrics=None):
+    """Length-weighted metric means and reachable length for each (segment, along) origin"""
+    if graph is None:
+        _, graph, metrics = _catchment_worker
+    results = []
+    for segment, along in origins:
+        segments, coverage, _ = graph.reach(segment, along, limit, slope_penalty)
+        walked = coverage * graph.lengths[segments]
+        results.append((_catchment_means(walked, metrics[segments]), float(walked.sum()), len(segments)))
+    return results
+
+
+def compute_catchments(points, minutes=DEFAULT_WALK_MINUTES, slope_penalty=WALK_SLOPE_PENALTY,
+                       workers=None, chunk_size=16):
+    """LWM-style scores of the streets within walking distance of each (lat, lon)
+
+    Returns one row per point: the length-weighted mean of every segment
+    metric in its catchment, their average as the comfort score, and the
+    walkable street length in km as Accessibility.
+    """
+    import pandas as pd
+
+    snapshot = current_snapshot()
+    limit = minutes * 60 * WALK_SPEED_MPS
+    graph = snapshot.isochrones.graph
+    metrics = np.column_stack([np.asarray(snapshot.store.columns[name], dtype=np.float64)
+                               for name in SCORE_METRICS])
+
+    # Snapping needs the STRtree, so it happens here; workers only walk the graph
+    snapped = [snapshot.isochrones.snap(lon, lat) for lat, lon in points]
+    origins = [(segment, along) for segment, along, _ in filter(None, snapped)]
+    chunks = [origins[i:i + chunk_size] for i in range(0, len(origins), chunk_size)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(chunks) > 1:
+        arrays = {name: getattr(graph, name) for name in WalkGraph.FILES}
+        blocks, specs = _share_arrays({**arrays, 'metrics': metrics})
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_catchment_worker,
+                                     initargs=(specs,)) as pool:
+                results = [row for chunk in pool.map(_catchment_chunk, chunks,
+                                                     [limit] * len(chunks),
+                                                     [slope_penalty] * len(chunks))
+                           for row in chunk]
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    else:
+        results = [row for chunk in chunks
+                   for row in _catchment_chunk(chunk, limit, slope_penalty, graph, metrics)]
+
+    rows = iter(results)
+    records = []
+    for snap in snapped:
+        means, walked, count = next(rows) if snap else (np.full(len(SCORE_METRICS), np.nan), 0.0, 0)
+        record = {'LWM_GCWI_Comfort_Score': float(np.nanmean(means)) if count else np.nan}
+        record.update({LWM_SCORE_COLUMNS[name]: float(value) for name, value in zip(SCORE_METRICS, means)})
+        record.update({'Accessibility': walked / 1000, 'segments': count,
+                       'snap_distance_m': snap[2] if snap else np.nan})
+        records.append(record)
+    return pd.DataFrame.from_records(records, columns=['LWM_GCWI_Comfort_Score',
+                                                       *LWM_SCORE_COLUMNS.values(),
+                                                       'Accessibility', 'segments',
+                                                       'snap_distance_m'])
+
+
+def run_catchments(args):
+    """Batch mode: catchment scores for every POI in a CSV, written to Parquet or CSV"""
+    import pandas as pd
+
+    pois = pd.read_csv(args.catchments, encoding=args.encoding)
+    missing = [c for c in (args.lat_column, args.lon_column) if c not in pois]
+    if missing:
+        sys.exit(f"{args.catchments} has no {' or '.join(map(repr, missing))} column; "
+                 f"point --lat-column/--lon-column at the POI coordinates")
+
+    snapshot = load_and_optimize_data(args.shapefile, args.slope_csv,
+                                      cache_dir=_single_dataset_cache(args.cache_dir),
+                                      rebuild=args.rebuild_cache)
+    if snapshot.isochrones is None:
+        sys.exit("No street network loaded")
+
+    start = time.perf_counter()
+    points = pois[[args.lat_column, args.lon_column]].to_numpy(dtype=np.float64)
+    unplaced = int((~np.isfinite(points).all(axis=1)).sum())
+    if unplaced:
+        print(f"{unplaced} POIs have no finite coordinates; their catchments are left empty")
+    scores = compute_catchments(points, minutes=args.minutes, slope_penalty=args.slope_penalty,
+                                workers=args.workers)
+    pois = pd.concat([pois.drop(columns=[c for c in scores if c in pois]).reset_index(drop=True),
+                      scores], axis=1)
+    print(f"Computed {len(pois)} catchments in {time.perf_counter() - start:.1f}s")
+
+    if args.output.endswith('.parquet'):
+        pois.to_parquet(args.output, index=False)
+    else:
+        pois.to_csv(args.output, index=False)
+    print(f"Wrote {args.output}")
+
+
+# What-if scenarios: metric edits saved as small diffs, applied over a snapshot without copying it
+class ScenarioScores(ScoreEngine):
+    """Composite scores with a scenario's edits: the base engine's, with the edited rows recomputed"""
+
+    def __init__(self, base, rows, new, last_modified=None):
+        self.base = base
+        self.rows = rows
+        # Missing metrics count as 0, as in the base engine
+        self.edited = np.nan_to_num(new.astype(np.float32))
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=SCORE_CACHE_SIZE)(self._payload)
+
+    def scores(self, weights):
+        # The base scores come from the base engine's cache; only the edited rows are computed here
+        scores = np.frombuffer(self.base.payload(weights).variants['identity'], dtype='<f4').copy()
+        scores[self.rows] = self.edited @ np.asarray(weights, dtype=np.float32)
+        return scores
+
+
+class ScenarioStats(StatsEngine):
+    """Network statistics with a scenario's edits: the base prefix sums plus per-segment deltas
+
+    Each edited segment adds the difference between its new and its old
+    contributions to the cell and street type it counts in. A block is the
+    base engine's four lookups plus the deltas of the edited segments inside
+    it, so nothing the size of the grid is rebuilt. The histogram bins stay
+    those of the base data; values edited outside them count in the end bins.
+    """
+
+    def __init__(self, base, index, store, rows, old, new, last_modified=None):
+        vars(self).update(vars(base))
+        self.base = base
+        lengths = np.nan_to_num(np.asarray(store.columns['Length'], dtype=np.float64)[rows])
+        if 'TYP_VOIE' in store.categories:
+            groups = np.asarray(store.columns['TYP_VOIE'], dtype=np.int64)[rows]
+        else:
+            groups = np.full(len(rows), -1, dtype=np.int64)
+        groups = np.where(groups < 0, len(self.labels) - 1, groups)
+
+        # The same cell as in the base grid, from the middle of the segment's bounds
+        bounds = shapely.bounds(index.geoms[rows])
+        middle = (bounds[:, :2] + bounds[:, 2:]) / 2
+        located = np.isfinite(middle).all(axis=1)
+        col, row = ((middle[located] - self.origin) // self.cell).astype(np.int64).T
+        width = max(len(self.labels), 1)
+        keys = (np.clip(row, 0, self.ny - 1) * self.nx + np.clip(col, 0, self.nx - 1)) * width + groups[located]
+
+        # Count and length do not change; each metric's channels change by new minus old
+        lengths = lengths[located]
+        deltas = [np.zeros(len(lengths)), np.zeros(len(lengths))]
+        for j, name in enumerate(self.metrics):
+            deltas.append(self._channels(name, lengths, new[located, j])
+                          - self._channels(name, lengths, old[located, j]))
+        deltas = np.column_stack(deltas)
+
+        # Edits in the same cell and street type add up, so there is one delta per slot
+        keys, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(keys)))
+        self.deltas = np.add.reduceat(deltas[order], starts, axis=0) if len(keys) else deltas
+        self.slots = (keys // width // self.nx, keys // width % self.nx, keys % width)
+        self.last_modified = last_modified
+        self.payload = lru_cache(maxsize=STATS_CACHE_SIZE)(self._payload)
+
+    def _channels(self, name, lengths, values):
+        """Weight, sum, sum of squares and histogram channels of one metric, per segment"""
+        valid = ~np.isnan(values)
+        weights = np.where(valid, lengths, 0.0)
+        values = np.where(valid, values, 0.0)
+        hist = np.zeros((len(values), STATS_BINS))
+        hist[np.arange(len(values)), self._bins(name, values)] = weights
+        return np.column_stack([weights, weights * values, weights * values * values, hist])
+
+    def _inside(self, cells):
+        row0, row1, col0, col1 = cells
+        row, col, _ = self.slots
+        return (row >= row0) & (row <= row1) & (col >= col0) & (col <= col1)
+
+    def block(self, cells):
+        totals = self.base.block(cells)
+        inside = self._inside(cells)
+        # Summed per street type as a product with the one-hot street types
+        totals += np.eye(len(totals))[self.slots[2][inside]].T @ self.deltas[inside]
+        return np.maximum(totals, 0)
+
+    def cell_totals(self, cells):
+        per_cell = self.base.cell_totals(cells)
+        inside = self._inside(cells)
+        np.add.at(per_cell, (self.slots[0][inside] - cells[0], self.slots[1][inside] - cells[2]),
+                  self.deltas[inside])
+        return per_cell
+
+
+class Scenario:
+    """A saved scenario applied to a snapshot, as a copy-on-write overlay
+
+    rows are the indices of the edited segments, sorted, and old and new
+    their SCORE_METRICS values before and after the edits, one row each. The
+    snapshot's columns are shared and never written: column() copies one
+    with the edits applied, and each engine recomputes only what the edited
+    rows touch.
+    """
+
+    def __init__(self, snapshot, scenario_id, diff):
+        store = snapshot.store
+        edits = list(diff['values'].values())
+        indices = store.lookup(np.array([int(i) for i in diff['values']], dtype=np.int64))
+        order = np.argsort(indices, kind='stable')
+        order = order[indices[order] >= 0]
+        self.rows = indices[order]
+        self.old = np.column_stack([np.asarray(store.columns[name], dtype=np.float64)[self.rows]
+                                    for name in SCORE_METRICS])
+        self.new = self.old.copy()
+        for k, i in enumerate(order.tolist()):
+            for name, value in edits[i].items():
+                self.new[k, SCORE_METRICS.index(name)] = value
+        self.id = scenario_id
+        self.diff = diff
+        self.snapshot = snapshot
+        # Segments of the diff that the snapshot does not have, e.g. after the data changed
+        self.missing = len(edits) - len(self.rows)
+        self.edited_metrics = [name for j, name in enumerate(SCORE_METRICS)
+                               if not np.array_equal(self.old[:, j], self.new[:, j], equal_nan=True)]
+
+        stats = snapshot.stats.resolve() if isinstance(snapshot.stats, Deferred) else snapshot.stats
+        last_modified = max(snapshot.scores.last_modified or 0, diff['created'])
+        self.scores = ScenarioScores(snapshot.scores, self.rows, self.new, last_modified)
+        self.stats = ScenarioStats(stats, snapshot.index, store, self.rows, self.old, self.new,
+                                   last_modified)
+        self._graph = None
+        self.summary = lru_cache(maxsize=SCORE_CACHE_SIZE)(self._summary)
+
+    @staticmethod
+    def resolve(snapshot, edits):
+        """{ID_TRC: {metric: value}} of a list of edits, applied in order
+
+        Each edit picks segments by "ids" (ID_TRC values) or "where" (the
+        filters of /api/query, matched against the base data) and changes
+        metrics with one of "set", "add" or "scale", as {metric: number}. An
+        edit sees the values the edits before it left; missing values stay
+        missing under "add" and "scale". Only values that end up different
+        from the base data are kept.
+        """
+        if not isinstance(edits, list) or not edits:
+            raise ValueError("edits must be a non-empty list")
+        store = snapshot.store
+        columns = {name: np.asarray(store.columns[name], dtype=np.float64) for name in SCORE_METRICS}
+        values = {}
+        for number, edit in enumerate(edits, 1):
+            if not isinstance(edit, dict):
+                raise ValueError(f"edit {number} is not an object")
+            operations = [op for op in SCENARIO_OPERATIONS if op in edit]
+            if len(operations) != 1:
+                raise ValueError(f"edit {number} needs exactly one of {', '.join(SCENARIO_OPERATIONS)}")
+            op = operations[0]
+            changes = edit[op]
+            if not isinstance(changes, dict) or not changes:
+                raise ValueError(f"edit {number}: {op} must be an object of metric: number")
+            unknown = set(changes) - set(SCORE_METRICS)
+            if unknown:
+                raise ValueError(f"edit {number}: unknown metrics {', '.join(sorted(unknown))}")
+            if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and np.isfinite(v)
+                       for v in changes.values()):
+                raise ValueError(f"edit {number}: {op} values must be finite numbers")
+
+            if 'ids' in edit:
+                ids = edit['ids']
+                if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool)
+                                                        for i in ids):
+                    raise ValueError(f"edit {number}: ids must be a list of integers")
+                try:
+                    ids = np.asarray(ids, dtype=np.int64)
+                except OverflowError:
+                    raise ValueError(f"edit {number}: ids must be a list of integers")
+                rows = store.lookup(ids)
+                if (rows < 0).any():
+                    raise ValueError(f"edit {number}: unknown segments "
+                                     f"{', '.join(map(str, ids[rows < 0][:5].tolist()))}")
+            elif 'where' in edit:
+                if not isinstance(edit['where'], dict):
+                    raise ValueError(f"edit {number}: where must be an object of column: filter")
+                try:
+                    predicates = snapshot.queries.parse({
+                        name: ','.join(map(str, spec)) if isinstance(spec, list) else str(spec)
+                        for name, spec in edit['where'].items()})
+                except ValueError as e:
+                    raise ValueError(f"edit {number}: {e}")
+                rows = np.flatnonzero(np.unpackbits(snapshot.queries.match(predicates), count=len(store),
+                                                    bitorder='little'))
+            else:
+                raise ValueError(f"edit {number} needs ids or where")
+            rows = np.unique(rows)
+            if len(rows) > MAX_SCENARIO_SEGMENTS:
+                raise ValueError(f"edit {number} picks {len(rows)} segments, more than {MAX_SCENARIO_SEGMENTS}")
+
+            for name, amount in changes.items():
+                current = np.array([values.get(i, {}).get(name, columns[name][i]) for i in rows.tolist()])
+                result = (np.full(len(rows), float(amount)) if op == 'set' else
+                          current + amount if op == 'add' else current * amount)
+                for i, value in zip(rows.tolist(), result.tolist()):
+                    if value == value:
+                        values.setdefault(i, {})[name] = value
+            if len(values) > MAX_SCENARIO_SEGMENTS:
+                raise ValueError(f"the edits change more than {MAX_SCENARIO_SEGMENTS} segments")
+
+        changed = {}
+        for i in sorted(values, key=lambda i: int(store.ids[i])):
+            metrics = {name: value for name, value in sorted(values[i].items())
+                       if value != columns[name][i]}
+            if metrics:
+                changed[str(int(store.ids[i]))] = metrics
+        return changed
+
+    def column(self, name):
+        """A copy of a SCORE_METRICS column with the edits applied"""
+        column = np.array(self.snapshot.store.columns[name], dtype=np.float64)
+        column[self.rows] = self.new[:, SCORE_METRICS.index(name)]
+        return column
+
+    def position(self, index):
+        """Position of a segment index in rows, -1 if the scenario does not edit it"""
+        pos = int(np.searchsorted(self.rows, index))
+        return pos if pos < len(self.rows) and self.rows[pos] == index else -1
+
+    def record(self, index):
+        """The store record of a segment with the edited values, and their base values under "base\""""
+        record = self.snapshot.store.record(index)
+        pos = self.position(index)
+        if pos >= 0:
+            record['base'] = {}
+            for name, before, after in zip(SCORE_METRICS, self.old[pos].tolist(), self.new[pos].tolist()):
+                if after != before and after == after:
+                    record['base'][name] = record[name]
+                    record[name] = after
+        return record
+
+    def graph(self, slope_penalty):
+        """The walk graph for catchments: the base one unless the edits change walking costs"""
+        base = self.snapshot.isochrones.graph
+        if slope_penalty == 0 or 'slope_normalized' not in self.edited_metrics:
+            return base
+        if self._graph is None:
+            # Only the slope difficulty is copied; the topology and lengths are the base graph's
+            difficulty = np.array(base.difficulty)
+            difficulty[self.rows] = WalkGraph.difficulty_of(self.new[:, SCORE_METRICS.index('slope_normalized')])
+            self._graph = WalkGraph(base.segment_nodes, base.lengths, difficulty, base.indptr,
+                                    base.neighbors, base.edge_segments)
+        return self._graph
+
+    def _overlay(self, segments, values):
+        """Write the edited values over the rows of values, one per segment; returns how many"""
+        if len(self.rows) == 0:
+            return 0
+        pos = np.minimum(np.searchsorted(self.rows, segments), len(self.rows) - 1)
+        hit = self.rows[pos] == segments
+        values[hit] = self.new[pos[hit]]
+        return int(hit.sum())
+
+    @staticmethod
+    def _catchment(graph, segments, coverage, values):
+        walked = coverage * graph.lengths[segments]
+        means = _catchment_means(walked, values)
+        comfort = float(np.nanmean(means)) if np.isfinite(means).any() else None
+        return {"comfort": round(comfort, 4) if comfort is not None else None,
+                "metrics": {name: round(v, 4) if v == v else None
+                            for name, v in zip(SCORE_METRICS, means.tolist())},
+                "accessibility_km": round(float(walked.sum()) / 1000, 4), "segments": len(segments)}
+
+    def catchments(self, points, minutes=DEFAULT_WALK_MINUTES, slope_penalty=WALK_SLOPE_PENALTY):
+        """Catchment scores around each (lat, lon), with the base data and with the edits
+
+        On the base graph only a catchment that reaches an edited segment is
+        scored twice; the others answer the base scores for both. Edited
+        slopes under a slope penalty change walking costs, and then every
+        point is also walked on the scenario's graph.
+        """
+        isochrones = self.snapshot.isochrones
+        base_graph, graph = isochrones.graph, self.graph(slope_penalty)
+        limit = minutes * 60 * WALK_SPEED_MPS
+        columns = [np.asarray(self.snapshot.store.columns[name], dtype=np.float64) for name in SCORE_METRICS]
+        results = []
+        for lat, lon in points:
+            snapped = isochrones.snap(lon, lat)
+            if snapped is None:
+                results.append({"point": [lat, lon], "snap_distance_m": None, "edited_segments": 0,
+                                "base": None, "scenario": None})
+                continue
+            segment, along, distance = snapped
+            segments, coverage, _ = base_graph.reach(segment, along, limit, slope_penalty)
+            values = np.column_stack([column[segments] for column in columns])
+            base = self._catchment(base_graph, segments, coverage, values)
+            if graph is not base_graph:
+                segments, coverage, _ = graph.reach(segment, along, limit, slope_penalty)
+                values = np.column_stack([column[segments] for column in columns])
+            edited = self._overlay(segments, values)
+            scenario = self._catchment(graph, segments, coverage, values) \
+                if edited or graph is not base_graph else base
+            results.append({"point": [lat, lon], "snap_distance_m": round(distance, 2),
+                            "edited_segments": edited, "base": base, "scenario": scenario})
+        return results
+
+    def describe(self):
+        return ScenarioStore.describe(self.id, self.diff, self.snapshot.version)
+
+    def _summary(self, weights):
+        """The scenario and its network-wide effect under one weighting"""
+        scores = np.frombuffer(self.scores.base.payload(weights).variants['identity'], dtype='<f4')
+        before = scores[self.rows].astype(np.float64)
+        after = (self.scores.edited @ np.asarray(weights, dtype=np.float32)).astype(np.float64)
+        total = float(scores.sum(dtype=np.float64))
+        n = max(len(scores), 1)
+        edited = len(self.rows) > 0
+        impact = {"score": {
+            "mean_before": round(total / n, 6),
+            "mean_after": round((total + float((after - before).sum())) / n, 6),
+            "edited_mean_before": round(float(before.mean()), 6) if edited else None,
+            "edited_mean_after": round(float(after.mean()), 6) if edited else None,
+        }, "metrics": {}}
+
+        # Network-wide, from the totals of the whole grid with and without the deltas
+        cells = self.stats.cells()
+        totals = [self.stats.base.block(cells).sum(axis=0), self.stats.block(cells).sum(axis=0)]
+        summaries = self.stats.summaries(np.array(totals), self.edited_metrics, histograms=False)
+        for name in self.edited_metrics:
+            impact["metrics"][name] = {}
+            for when, summary in zip(("before", "after"), summaries):
+                metric = summary["metrics"][name]
+                impact["metrics"][name][when] = \
+                    {"mean": metric["mean"], "p50": metric["quantiles"]["p50"]} if metric else None
+        body = dict(self.describe(), missing=self.missing, metrics=self.edited_metrics,
+                    edits=self.diff['edits'], weights=weights, impact=impact)
+        return EncodedPayload(json.dumps(body).encode('utf-8'), last_modified=self.scores.last_modified)
+
+
+class ScenarioStore:
+    """The scenarios saved for one dataset, each a JSON diff in a directory
+
+    A scenario is immutable: it is created and deleted, never changed, and
+    its id is a hash of its name and edited values. The files are the only
+    state, so every worker process sees the same scenarios. Scenarios are
+    applied to the snapshot a request is for, and the most recently used
+    ones are kept applied per snapshot version.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._applied = OrderedDict()
+
+    def path(self, scenario_id):
+        return os.path.join(self.directory, f"{scenario_id}.json")
+
+    def exists(self, scenario_id):
+        return bool(SCENARIO_ID_PATTERN.fullmatch(scenario_id)) and os.path.exists(self.path(scenario_id))
+
+    def get(self, scenario_id):
+        """The saved diff of a scenario, None if there is none"""
+        if not SCENARIO_ID_PATTERN.fullmatch(scenario_id):
+            return None
+        try:
+            with open(self.path(scenario_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def describe(scenario_id, diff, version=None):
+        return {"id": scenario_id, "name": diff['name'], "created": diff['created'],
+                "base_version": diff['base_version'], "stale": diff['base_version'] != version,
+                "segments": len(diff['values'])}
+
+    def list(self, version=None):
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        scenarios = []
+        for scenario_id in (os.path.splitext(name)[0] for name in names if name.endswith('.json')):
+            diff = self.get(scenario_id)
+            if diff is not None:
+                scenarios.append(self.describe(scenario_id, diff, version))
+        return sorted(scenarios, key=lambda s: s['created'])
+
+    def create(self, name, base_version, edits, values):
+        """Save a scenario; returns its id and whether it is new"""
+        scenario_id = hashlib.sha256(json.dumps({'name': name, 'values': values}, sort_keys=True)
+                                     .encode('utf-8')).hexdigest()[:16]
+        if self.exists(scenario_id):
+            return scenario_id, False
+        diff = {'name': name, 'base_version': base_version, 'created': time.time(), 'edits': edits,
+                'values': values}
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self.path(scenario_id)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(diff, f, separators=(',', ':'))
+        os.replace(tmp, self.path(scenario_id))
+        return scenario_id, True
+
+    def delete(self, scenario_id):
+        if not self.exists(scenario_id):
+            return False
+        try:
+            os.remove(self.path(scenario_id))
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            for key in [key for key in self._applied if key[1] == scenario_id]:
+                del self._applied[key]
+        return True
+
+    def apply(self, snapshot, scenario_id):
+        """The scenario applied to a snapshot, None if it does not exist (any more)"""
+        if not self.exists(scenario_id):
+            return None
+        key = (snapshot.version, scenario_id)
+        with self._lock:
+            scenario = self._applied.get(key)
+            if scenario is not None and scenario.snapshot is snapshot:
+                self._applied.move_to_end(key)
+                return scenario
+        diff = self.get(scenario_id)
+        if diff is None:
+            return None
+        scenario = Scenario(snapshot, scenario_id, diff)
+        with self._lock:
+            self._applied[key] = scenario
+            while len(self._applied) > SCENARIO_CACHE_SIZE:
+                self._applied.popitem(last=False)
+        return scenario
+
+
+# Where scenarios are saved, set by configure_scenarios(), and the ScenarioStore of each dataset
+_scenario_dir = SCENARIO_DIR
+_scenario_stores = {}
+
+
+def configure_scenarios(directory=SCENARIO_DIR):
+    """Save scenarios under directory; registry datasets other than the default in a subdirectory each"""
+    global _scenario_dir
+    _scenario_dir = directory
+    _scenario_stores.clear()
+
+
+def scenario_store():
+    """The ScenarioStore of the dataset the current request is for"""
+    dataset = g.get('dataset')
+    if dataset is None or (_registry is not None and dataset == _registry.default):
+        directory = _scenario_dir
+    else:
+        directory = os.path.join(_scenario_dir, dataset)
+    if directory not in _scenario_stores:
+        _scenario_stores.setdefault(directory, ScenarioStore(directory))
+    return _scenario_stores[directory]
+
+
+# Preprocessed-data cache: one directory per input/parameter signature
+def _input_files(shapefile_path, csv_path):
+    stem = os.path.splitext(shapefile_path)[0]
+    return [stem + ext for ext in SHAPEFILE_SIDECARS] + [csv_path]
+
+
+def _cache_key(shapefile_path, csv_path):
+    """Digest of the input files' identity and every parameter that shapes the output"""
+    inputs = []
+    for path in _input_files(shapefile_path, csv_path):
+        if os.path.exists(path):
+            st = os.stat(path)
+            inputs.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    signature = {
+        'version': CACHE_VERSION,
+        'inputs': inputs,
+        'simplify_tolerance': SIMPLIFY_TOLERANCE,
+        'coordinate_precision': COORDINATE_PRECISION,
+        'segment_fields': SEGMENT_FIELDS,
+        'tiles': [TILE_MIN_ZOOM, TILE_MAX_ZOOM, TILE_EXTENT, TILE_BUFFER],
+        'lod': [LOD_ZOOMS, LOD_PIXEL_TOLERANCE, LOD_MIN_SEGMENT_PIXELS],
+        'node_snap_meters': NODE_SNAP_METERS,
+        'compression': [GZIP_LEVEL, BROTLI_QUALITY if brotli is not None else None],
+    }
+    return hashlib.sha256(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+
+
+def _map_file(path):
+    """Read-only memory map of a whole file, as a zero-copy memoryview"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _write_payload(entry_dir, name, payload):
+    """Write each variant of a payload to disk and return its manifest record
+
+    Variants a PayloadWriter already streamed to the entry are left as they are.
+    """
+    files = {}
+    for coding, body in payload.variants.items():
+        filename = name if coding == 'identity' else f"{name}.{coding}"
+        if not os.path.exists(os.path.join(entry_dir, filename)):
+            with open(os.path.join(entry_dir, filename), 'wb') as f:
+                f.write(body)
+        files[coding] = filename
+    return {'mimetype': payload.mimetype, 'etags': payload.etags,
+            'last_modified': payload.last_modified, 'files': files}
+
+
+def _open_payload(files, record):
+    variants = {coding: files.map(filename) for coding, filename in record['files'].items()}
+    return EncodedPayload.from_variants(variants, record['etags'], record['mimetype'],
+                                        record['last_modified'])
+
+
+def _write_tiles(entry_dir, tiles):
+    """Pack every tile variant into one file, indexed by byte ranges"""
+    index = []
+    offset = 0
+    with open(os.path.join(entry_dir, 'tiles.bin'), 'wb') as f:
+        for (z, x, y), payload in tiles.items():
+            ranges = {}
+            for coding, body in payload.variants.items():
+                f.write(body)
+                ranges[coding] = [offset, len(body)]
+                offset += len(body)
+            index.append([z, x, y, ranges, payload.etags])
+    return index
+
+
+def _open_tiles(files, index, last_modified):
+    data = files.map('tiles.bin')
+    return {(z, x, y): EncodedPayload.from_variants(
+                {coding: data[start:start + length] for coding, (start, length) in ranges.items()},
+                etags, TILE_MIMETYPE, last_modified)
+            for z, x, y, ranges, etags in index}
+
+
+@contextmanager
+def _cache_lock(cache_dir):
+    """Hold an exclusive lock on a cache directory, so that of several processes
+    needing the same entry one builds it and the others then load it"""
+    if not cache_dir or fcntl is None:
+        yield
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        f = open(os.path.join(cache_dir, 'build.lock'), 'a')
+    except OSError:
+        yield  # build_snapshot() reports an unwritable cache itself
+        return
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _staging_dir(entry_dir):
+    """Empty directory a cache entry is assembled in before write_cache() renames it"""
+    tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def write_cache(entry_dir, gdf, snapshot, tmp_dir=None):
+    """Persist the prepared dataset; the entry only appears once it is complete
+
+    tmp_dir is the _staging_dir() payloads were already streamed into, if any.
+    """
+    parent = os.path.dirname(entry_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tmp_dir or _staging_dir(entry_dir)
+
+    manifest = {
+        'version': CACHE_VERSION,
+        'segments': len(gdf),
+        'center': snapshot.center,
+        'last_modified': snapshot.geojson.last_modified,
+        'geojson': _write_payload(tmp_dir, 'data.geojson', snapshot.geojson),
+        'tiles': _write_tiles(tmp_dir, snapshot.tiles),
+        'feature_offsets': 'feature_offsets.npy',
+        'levels': [],
+        'binary': _write_payload(tmp_dir, 'data.bin', snapshot.binary),
+        'store': snapshot.store.save(tmp_dir),
+        'geometry': save_geometry(tmp_dir, gdf.geometry.to_numpy()),
+        'walk_graph': snapshot.isochrones.graph.save(tmp_dir),
+        'queries': snapshot.queries.save(tmp_dir),
+        'stats': snapshot.stats.save(tmp_dir),
+    }
+    np.save(os.path.join(tmp_dir, manifest['feature_offsets']), snapshot.feature_offsets)
+    for level in snapshot.levels:
+        offsets = f"feature_offsets_z{level.zoom}.npy"
+        np.save(os.path.join(tmp_dir, offsets), level.offsets)
+        manifest['levels'].append({
+            'zoom': level.zoom, 'tolerance': level.tolerance, 'vertices': level.vertices,
+            'geojson': _write_payload(tmp_dir, f"data_z{level.zoom}.geojson", level.payload),
+            'offsets': offsets,
+        })
+    try:
+        gdf.to_parquet(os.path.join(tmp_dir, 'segments.parquet'))
+    except ImportError:
+        pass  # GeoParquet needs pyarrow; the served payloads do not
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.rename(tmp_dir, entry_dir)
+
+    # Entries for older inputs or parameters can never be hit again. A snapshot
+    # still serving from one keeps its memory maps after the files are removed.
+    # Anything that is not an entry, such as another dataset's cache directory,
+    # is left alone.
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if path == entry_dir or not CACHE_KEY_PATTERN.fullmatch(name):
+            continue
+        try:
+            with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+                json.load(f)['version']
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class EntryFiles:
+    """The files of a cache entry directory, opened as read-only zero-copy views"""
+
+    def __init__(self, entry_dir):
+        self.entry_dir = entry_dir
+        self.version = os.path.basename(entry_dir)
+
+    def map(self, name):
+        return _map_file(os.path.join(self.entry_dir, name))
+
+    def array(self, name):
+        return np.load(os.path.join(self.entry_dir, name), mmap_mode='r')
+
+
+class ArtifactFiles(EntryFiles):
+    """The files of a cache entry packed into one artifact by write_artifact()
+
+    Layout: ARTIFACT_MAGIC, uint32 version, uint32 header length, a JSON
+    header giving the entry's version and each file's offset and length, then
+    the files, each starting on an ARTIFACT_ALIGNMENT boundary. The whole file
+    is mapped once and every file is a slice of that map.
+    """
+
+    def __init__(self, path):
+        data = _map_file(path)
+        magic, version, header_length = (struct.unpack_from('<4sII', data) if len(data) >= 12
+                                          else (b'', 0, 0))
+        if magic != ARTIFACT_MAGIC or version != ARTIFACT_VERSION:
+            raise ValueError(f"{path} is not a version {ARTIFACT_VERSION} dataset artifact")
+        header = json.loads(bytes(data[12:12 + header_length]))
+        start = 12 + header_length
+        self.data = data[start + -start % ARTIFACT_ALIGNMENT:]
+        self.files = header['files']
+        self.entry_dir = None
+        self.version = header['version']
+
+    def map(self, name):
+        offset, length = self.files[name]
+        return self.data[offset:offset + length]
+
+    def array(self, name):
+        # The .npy header pads the data to a 64-byte boundary, and so does the artifact
+        view = self.map(name)
+        header = io.BytesIO(bytes(view[:4096]))
+        npy_version = np.lib.format.read_magic(header)
+        read_header = (np.lib.format.read_array_header_1_0 if npy_version == (1, 0)
+                       else np.lib.format.read_array_header_2_0)
+        shape, fortran_order, dtype = read_header(header)
+        array = np.frombuffer(view, dtype=dtype, count=int(np.prod(shape)), offset=header.tell())
+        return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def load_cache(files):
+    """Memory-map a cache entry (EntryFiles or ArtifactFiles) as a Snapshot
+
+    Only the pre-encoded payloads and tiles are opened here, which takes
+    neither numpy nor shapely. The arrays and the engines built on them are
+    Deferred until a request first needs them, and the spatial index until a
+    query does; Snapshot.prepare() loads them all at once.
+    """
+    manifest = json.loads(bytes(files.map('manifest.json')))
+    if manifest.get('version') != CACHE_VERSION:
+        raise ValueError(f"cache entry has version {manifest.get('version')}")
+
+    last_modified = manifest['last_modified']
+    store = Deferred(partial(SegmentStore.load, files, manifest['store']),
+                     length=manifest['segments'], categories=manifest['store']['categories'])
+    index = Deferred(partial(SpatialIndex, partial(load_geometry, files, manifest['geometry']),
+                             manifest['center']))
+    return Snapshot(
+        version=files.version,
+        loaded_at=time.time(),
+        center=manifest['center'],
+        geojson=_open_payload(files, manifest['geojson']),
+        feature_offsets=Deferred(partial(files.array, manifest['feature_offsets'])),
+        levels=[DetailLevel(level['zoom'], level['tolerance'], _open_payload(files, level['geojson']),
+                            Deferred(partial(files.array, level['offsets'])), level['vertices'])
+                for level in manifest['levels']],
+        binary=_open_payload(files, manifest['binary']),
+        tiles=_open_tiles(files, manifest['tiles'], last_modified),
+        store=store,
+        index=index,
+        scores=Deferred(lambda: ScoreEngine(store, last_modified=last_modified)),
+        queries=Deferred(lambda: QueryEngine.load(files, manifest['queries'], store,
+                                                  last_modified=last_modified)),
+        stats=Deferred(lambda: StatsEngine.load(files, manifest['stats'], index,
+                                                last_modified=last_modified)),
+        isochrones=Deferred(lambda: IsochroneEngine(WalkGraph.load(files, manifest['walk_graph']),
+                                                    index, last_modified=last_modified)),
+        similar=Deferred(lambda: SimilarityEngine(store, index, last_modified=last_modified)),
+    )
+
+
+def write_artifact(entry_dir, path):
+    """Pack a cache entry into the single file that load_artifact() maps; returns its size
+
+    The GeoParquet copy of the segments is left out; nothing serves it.
+    """
+    names = sorted(name for name in os.listdir(entry_dir) if name != 'segments.parquet')
+    files, offset = {}, 0
+    for name in names:
+        size = os.path.getsize(os.path.join(entry_dir, name))
+        files[name] = [offset, size]
+        offset += -(-size // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+    header = json.dumps({'version': os.path.basename(entry_dir), 'files': files}).encode('utf-8')
+
+    # Written next to the target and renamed, so a server mapping the old one keeps it intact
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as out:
+        out.write(ARTIFACT_MAGIC + struct.pack('<II', ARTIFACT_VERSION, len(header)) + header)
+        out.write(bytes(-out.tell() % ARTIFACT_ALIGNMENT))
+        for name in names:
+            with open(os.path.join(entry_dir, name), 'rb') as f:
+                shutil.copyfileobj(f, out, RESPONSE_CHUNK_SIZE)
+            out.write(bytes(-files[name][1] % ARTIFACT_ALIGNMENT))
+        size = out.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def build_artifact(shapefile_path=SHAPEFILE_PATH, csv_path=SLOPE_CSV_PATH, output=ARTIFACT_PATH):
+    """Run the whole pipeline on the input files and write its result as one artifact
+
+    Serving the artifact with load_artifact() then takes no processing at
+    all. Returns the artifact's size in bytes.
+    """
+    timer = StageTimer()
+    # Built next to the output, so that packing the entry stays on one file system
+    with tempfile.TemporaryDirectory(prefix='.uwa-build-',
+                                     dir=os.path.dirname(os.path.abspath(output))) as cache_dir:
+        version = build_snapshot(shapefile_path, csv_path, cache_dir, rebuild=True, timer=timer).version
+        size = write_artifact(os.path.join(cache_dir, version), output)
+    timer.lap('write artifact')
+    print(f"Wrote {output} ({size / 2**20:.1f} MB) in {sum(s for _, s in timer.stages):.1f}s")
+    return size
+
+
+def load_artifact(path, timer=None):
+    """Memory-map an artifact written by build_artifact() as a Snapshot"""
+    timer = timer or StageTimer()
+    snapshot = load_cache(ArtifactFiles(path))
+    timer.lap('map artifact')
+    print(f"Data mapped from {path}! {len(snapshot.store)} segments ready.")
+    return snapshot
+
+
+# Instrumentation
+class Histogram:
+    """Prometheus histogram with one series per tuple of label values"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, values, amount):
+        bucket = bisect.bisect_left(self.buckets, amount)
+        with self.lock:
+            series = self.series.get(values)
+            if series is None:
+                series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((values, list(counts), total)
+                            for values, (counts, total) in self.series.items())
+        for values, counts, total in series:
+            labels = _prom_labels(zip(self.labels, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_prom_labels(zip(self.labels, values), le=le)} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _prom_labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+
+def _prom_gauge(name, help_text, samples, kind='gauge'):
+    """Exposition lines of a gauge or counter from (labels dict, value) samples"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_prom_labels(labels.items())} {value}" for labels, value in samples]
+    return lines
+
+
+# Switched on by enable_metrics(); while off, requests skip all bookkeeping
+_metrics_enabled = False
+_trace_memory = False
+# Stage timings of the most recent load_and_optimize_data() call
+_last_load = None
+LOADS_TOTAL = {}
+REQUEST_SECONDS = Histogram('uwa_http_request_duration_seconds',
+                            'Time to produce a response, by route',
+                            ('method', 'route', 'status'), LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram('uwa_http_response_size_bytes',
+                           'Response body size as sent, after content-coding',
+                           ('method', 'route'), SIZE_BUCKETS)
+
+
+def enable_metrics(enabled=True, trace_memory=False):
+    """Turn request metrics and /metrics on or off, and tracemalloc for load stages"""
+    global _metrics_enabled, _trace_memory
+    _metrics_enabled = enabled
+    _trace_memory = trace_memory
+
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text exposition format"""
+    snapshot = current_snapshot()
+    lines = []
+    if _last_load is not None:
+        lines += _prom_gauge('uwa_load_stage_seconds', 'Wall time of each stage of the last data load',
+                             [({'stage': name}, round(seconds, 6)) for name, seconds in _last_load.stages])
+        lines += _prom_gauge('uwa_load_stage_peak_traced_bytes',
+                             'Peak memory traced by tracemalloc during each stage of the last data load',
+                             [({'stage': name}, peak) for name, peak in _last_load.peaks.items()])
+    lines += _prom_gauge('uwa_loads_total', 'Data loads by result',
+                         [({'result': result}, count) for result, count in sorted(LOADS_TOTAL.items())],
+                         kind='counter')
+    lines += _prom_gauge('uwa_data_ready', 'Whether a dataset has been loaded and is being served',
+                         [({}, int(_snapshot is not None))])
+    lines += _prom_gauge('uwa_data_segments', 'Street segments being served',
+                         [({}, len(snapshot.store) if snapshot.store is not None else 0)])
+    lines += _prom_gauge('uwa_data_loaded_timestamp_seconds', 'When the served data was loaded',
+                         [({}, round(snapshot.loaded_at, 3))])
+    caches = []
+    for name, engine in (('score', snapshot.scores), ('query', snapshot.queries), ('stats', snapshot.stats),
+                         ('isochrone', snapshot.isochrones), ('similar', snapshot.similar)):
+        # A scrape must not load an engine no request has needed yet
+        engine = engine.peek() if isinstance(engine, Deferred) else engine
+        if engine is not None:
+            caches.append((name, engine.payload.cache_info()))
+    if _registry is not None:
+        sizes = _registry.sizes()
+        lines += _prom_gauge('uwa_dataset_loaded_bytes', 'Approximate memory of each registry dataset loaded on demand',
+                             [({'dataset': name}, size) for name, size in sorted(sizes.items())])
+        lines += _prom_gauge('uwa_dataset_memory_budget_bytes', 'Memory budget of the datasets loaded on demand',
+                             [({}, _registry.budget)])
+        lines += _prom_gauge('uwa_dataset_evictions_total', 'Datasets evicted to stay within the memory budget',
+                             [({}, _registry.evictions)], kind='counter')
+    lines += _prom_gauge('uwa_cache_hits_total', 'Response cache hits since the data was loaded',
+                         [({'cache': name}, info.hits) for name, info in caches], kind='counter')
+    lines += _prom_gauge('uwa_cache_misses_total', 'Response cache misses since the data was loaded',
+                         [({'cache': name}, info.misses) for name, info in caches], kind='counter')
+    lines += REQUEST_SECONDS.expose()
+    lines += RESPONSE_BYTES.expose()
+    return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    """Wall time of consecutive pipeline stages, each measured from the previous lap
+
+    With trace_memory (the default after enable_metrics(trace_memory=True))
+    each stage also records the peak of the memory traced by tracemalloc
+    during it. Tracing makes allocation-heavy stages several times slower,
+    so it only runs between creation and close().
+    """
+
+    def __init__(self, trace_memory=None):
+        self.stages = []
+        self.peaks = {}
+        self.trace_memory = _trace_memory if trace_memory is None else trace_memory
+        self._own_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self._own_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self.started = self._last = time.perf_counter()
+
+    def lap(self, name):
+        self.stages.append((name, time.perf_counter() - self._last))
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peaks[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        self._last = time.perf_counter()
+
+    def close(self):
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.stages)
+        return ', '.join(
+            f"{name} {seconds:.2f}s" + (f" ({self.peaks[name] / 2**20:.0f} MB peak)"
+                                        if name in self.peaks else '')
+            for name, seconds in self.stages) + f" (total {total:.2f}s)"
+
+
+def _optional_module(name):
+    """An optional dependency, or None when it is not installed"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def read_inputs(shapefile_path=SHAPEFILE_PATH, csv_path=SLOPE_CSV_PATH, timer=None):
+    """Street segments with their slope in EPSG:4326, and the map center
+
+    Only the SEGMENT_FIELDS columns are read from either file.
+    """
+    import geopandas as gpd
+    import pandas as pd
+    pyogrio, pyarrow = _optional_module('pyogrio'), _optional_module('pyarrow')
+
+    timer = timer or StageTimer()
+
+    # 1. Load Data, skipping every column that is never served
+    columns = [name for name in SEGMENT_FIELDS if name != 'slope_normalized']
+    if pyogrio is not None:
+        gdf = pyogrio.read_dataframe(shapefile_path, columns=columns, use_arrow=pyarrow is not None)
+    else:
+        gdf = gpd.read_file(shapefile_path)
+        gdf = gdf[[name for name in columns if name in gdf] + [gdf.geometry.name]]
+    timer.lap('read shapefile')
+    slope_df = pd.read_csv(csv_path, usecols=['ID_TRC', 'slope_normalized'],
+                           dtype={'ID_TRC': np.int64, 'slope_normalized': np.float64},
+                           engine='pyarrow' if pyarrow is not None else 'c')
+    timer.lap('read slope csv')
+
+    # 2. Join the slope through an ID_TRC index rather than a merge
+    slope = slope_df.drop_duplicates('ID_TRC').set_index('ID_TRC')['slope_normalized']
+    gdf['slope_normalized'] = slope.reindex(gdf['ID_TRC'].to_numpy(dtype=np.int64)).to_numpy()
+    timer.lap('join slope')
+
+    # 3. Calculate Center from the bounds, in the source CRS, instead of every centroid
+    minx, miny, maxx, maxy = gdf.total_bounds
+    center_point = gpd.GeoSeries([shapely.Point((minx + maxx) / 2, (miny + maxy) / 2)], crs=gdf.crs)
+
+    # 4. CRS Conversion
+    if gdf.crs != 'EPSG:4326':
+        gdf = gdf.to_crs('EPSG:4326')
+        center_point = center_point.to_crs('EPSG:4326')
+    center = [float(center_point.y.iloc[0]), float(center_point.x.iloc[0])]
+    timer.lap('reproject')
+    return gdf, center
+
+
+def build_snapshot(shapefile_path=SHAPEFILE_PATH, csv_path=SLOPE_CSV_PATH,
+                   cache_dir=CACHE_DIR, rebuild=False, timer=None):
+    """Load the dataset from the cache, or process the input files and cache the result
+
+    Processes sharing cache_dir build a missing entry once: the others wait
+    for it and load it from the cache.
+    """
+    timer = timer or StageTimer()
+    with _cache_lock(cache_dir):
+        return _load_or_build_snapshot(shapefile_path, csv_path, cache_dir, rebuild, timer)
+
+
+def _load_or_build_snapshot(shapefile_path, csv_path, cache_dir, rebuild, timer):
+    # 0. Reuse the preprocessed cache when no input or parameter has changed
+    version = _cache_key(shapefile_path, csv_path)
+    entry_dir = os.path.join(cache_dir, version) if cache_dir else None
+    if entry_dir and not rebuild and os.path.isdir(entry_dir):
+        try:
+            snapshot = load_cache(EntryFiles(entry_dir))
+            timer.lap('load cache')
+            print(f"Data loaded from cache! {len(snapshot.store)} segments ready.")
+            return snapshot
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry {entry_dir}: {e}")
+            timer.lap('unreadable cache')
+
+    # The GeoJSON payloads are streamed into the new cache entry as they are encoded
+    staging = None
+    if entry_dir:
+        try:
+            staging = _staging_dir(entry_dir)
+        except OSError as e:
+            print(f"Could not create cache entry {entry_dir}: {e}")
+    try:
+        return _build_snapshot(shapefile_path, csv_path, version, entry_dir, staging, timer)
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _build_snapshot(shapefile_path, csv_path, version, entry_dir, staging, timer):
+    """build_snapshot() from the input files, streaming payloads into staging if given"""
+    # 1-4. Load only the served columns, join the slope and reproject
+    gdf, center = read_inputs(shapefile_path, csv_path, timer)
+
+    # 5. Columnar attribute store; the map payloads only carry the segment index
+    last_modified = _inputs_last_modified(*_input_files(shapefile_path, csv_path))
+    store = SegmentStore.from_frame(gdf)
+    timer.lap('segment store')
+
+    # 6. Cut vector tiles, each zoom simplified from the full geometry
+    tiles = build_tile_pyramid(gdf, store.ids, last_modified=last_modified)
+    timer.lap('vector tiles')
+
+    # 7. GeoJSON levels of detail for /api/data?zoom=, also from the full geometry
+    levels = build_detail_levels(gdf.geometry.to_numpy(), store.ids, store.columns['Length'],
+                                 center[0], last_modified=last_modified, entry_dir=staging)
+    timer.lap('levels of detail')
+
+    # 8. Simplify the geometry used for analysis
+    gdf['geometry'] = gdf.geometry.simplify(tolerance=SIMPLIFY_TOLERANCE, preserve_topology=True)
+    timer.lap('simplify')
+
+    # 9. Index the simplified geometry for viewport and nearest-segment queries
+    index = SpatialIndex(gdf.geometry.to_numpy(), center)
+    timer.lap('spatial index')
+
+    # 10. Link segment endpoints into a routable graph for walksheds
+    walk_graph = WalkGraph.from_geometry(index.geoms, store.columns['Length'],
+                                         store.columns['slope_normalized'])
+    timer.lap('walk graph')
+
+    # 11. Aggregate the metrics per grid cell and street type for /api/stats
+    stats = StatsEngine(store, index, last_modified=last_modified)
+    timer.lap('stats grid')
+
+    # 12. Standardize the metric profiles for /api/similar
+    similar = SimilarityEngine(store, index, last_modified=last_modified)
+    timer.lap('similarity profiles')
+
+    # 13. Encode the responses once; requests only pick a pre-compressed variant
+    geojson, feature_offsets = encode_feature_collection(
+        shapely.to_geojson(shapely.set_precision(gdf.geometry.to_numpy(), COORDINATE_PRECISION,
+                                                 mode='pointwise')),
+        store.ids, entry_dir=staging, last_modified=last_modified)
+    binary = encode_segments_binary(gdf.geometry.to_numpy(), store)
+    snapshot = Snapshot(
+        version=version,
+        loaded_at=time.time(),
+        center=center,
+        geojson=geojson,
+        feature_offsets=feature_offsets,
+        levels=levels,
+        binary=EncodedPayload(binary, mimetype=BINARY_MIMETYPE, last_modified=last_modified),
+        tiles=tiles,
+        store=store,
+        index=index,
+        scores=ScoreEngine(store, last_modified=last_modified),
+        queries=QueryEngine(store, last_modified=last_modified),
+        stats=stats,
+        isochrones=IsochroneEngine(walk_graph, index, last_modified=last_modified),
+        similar=similar,
+    )
+    timer.lap('encode payloads')
+
+    print(f"Data loaded! {len(gdf)} segments ready, {len(tiles)} vector tiles, "
+          f"{walk_graph.node_count} street nodes.")
+    for level in levels:
+        report = level.report()
+        print(f"  LOD z{level.zoom}: {report['features']} features, {report['vertices']} vertices, "
+              f"{report['bytes']['identity'] / 2**20:.1f} MB")
+
+    # 14. Persist for the next start
+    if staging:
+        try:
+            write_cache(entry_dir, gdf, snapshot, staging)
+        except OSError as e:
+            print(f"Could not write cache entry {entry_dir}: {e}")
+        timer.lap('write cache')
+    print(f"  Load stages: {timer.report()}")
+    return snapshot
+
+
+def load_and_optimize_data(shapefile_path=SHAPEFILE_PATH, csv_path=SLOPE_CSV_PATH,
+                           cache_dir=CACHE_DIR, rebuild=False):
+    """Build a snapshot of the input files and start serving it
+
+    Returns the snapshot being served afterwards: the previous one if the
+    load failed, or an empty one if no load has succeeded yet.
+    """
+    return _swap_in(lambda timer: build_snapshot(shapefile_path, csv_path, cache_dir, rebuild, timer))
+
+
+def load_artifact_data(path):
+    """Map an artifact and start serving it; returns like load_and_optimize_data()"""
+    return _swap_in(lambda timer: load_artifact(path, timer))
+
+
+def _swap_in(load):
+    """Serve the snapshot load(timer) returns, keeping the previous one if it fails"""
+    global _snapshot, _last_load, _loading, _load_error
+
+    timer = StageTimer()
+    _loading = timer
+    try:
+        _snapshot = load(timer)
+        _load_error = None
+        result = 'ok'
+    except Exception as e:
+        stage = timer.stages[-1][0] if timer.stages else None
+        print(f"Error loading data{f' after stage {stage!r}' if stage else ''}: "
+              f"{type(e).__name__}: {e}")
+        # Keep serving the previous data if there is any; /readyz reports the error
+        _load_error = f"{type(e).__name__}: {e}" + (f" (after stage {stage!r})" if stage else '')
+        result = 'error'
+    finally:
+        timer.close()
+        _loading = None
+    _last_load = timer
+    LOADS_TOTAL[result] = LOADS_TOTAL.get(result, 0) + 1
+    return current_snapshot()
+
+
+def load_status():
+    """Readiness of the data, as reported by /readyz
+
+    'ready' once a load has succeeded (later reloads keep the data being
+    served), 'error' when the only loads so far have failed, and 'loading'
+    before that.
+    """
+    timer = _loading
+    if _snapshot is not None:
+        status = 'ready'
+    elif _load_error is not None and timer is None:
+        status = 'error'
+    else:
+        status = 'loading'
+    result = {"status": status}
+    if _snapshot is not None:
+        result.update(version=_snapshot.version, segments=len(_snapshot.store))
+    if timer is not None:
+        result.update(loading_s=round(time.perf_counter() - timer.started, 1),
+                      stage=timer.stages[-1][0] if timer.stages else None)
+    if _load_error is not None:
+        result["error"] = _load_error
+    return result
+
+
+def input_changes(shapefile_path=SHAPEFILE_PATH, csv_path=SLOPE_CSV_PATH,
+                  interval=WATCH_INTERVAL, stop=None):
+    """Yield whenever the input files have changed and then stayed untouched for an interval"""
+    return _changes(lambda: _cache_key(shapefile_path, csv_path), interval, stop)
+
+
+def artifact_changes(path, interval=WATCH_INTERVAL, stop=None):
+    """Yield whenever the artifact at path has been replaced, e.g. by a new build"""
+    def signature():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    return _changes(signature, interval, stop)
+
+
+def _changes(signature, interval, stop):
+    stop = stop or threading.Event()
+    seen = signature()
+    while not stop.wait(interval):
+        changed = signature()
+        if changed == seen:
+            continue
+        # The shapefile is several files; wait until a whole interval passes without writes
+        if stop.wait(interval) or signature() != changed:
+            continue
+        seen = changed
+        yield
+
+
+class DatasetRegistry:
+    """The datasets named in a JSON config file, loaded on first use within a memory budget
+
+        {"default": "montreal", "memory_mb": 4096,
+         "datasets": {"montreal": {"shapefile": "...", "slope_csv": "...", "label": "Montréal"},
+                      "montreal-2030": {"shapefile": "...", "slope_csv": "..."}}}
+
+    A dataset may give the "artifact" written by the build command instead of
+    its input files. Relative paths are relative to the config file;
+    "default" is the first dataset unless given. The default dataset is loaded at startup and also
+    served at the routes without a dataset, like a single dataset. The others
+    are loaded by the first request for them. Concurrent requests for a dataset
+    share one load. Loaded datasets are kept in least-recently-used order, and
+    the least recently used are evicted while they take up more than
+    memory_mb together. A request still holding an evicted snapshot finishes
+    with it. Each dataset is cached in its own subdirectory of cache_dir. Only
+    the default dataset is reloaded when its input files change; another one
+    picks up changed files when it is next loaded after an eviction.
+    """
+
+    def __init__(self, datasets, default=None, cache_dir=CACHE_DIR, memory_mb=DATASET_MEMORY_MB):
+        if not datasets:
+            raise ValueError("no datasets configured")
+        reserved = {rule.rule.split('/')[2] for rule in app.url_map.iter_rules()
+                    if rule.rule.startswith('/api/') and '<' not in rule.rule.split('/')[2]}
+        for dataset_id, config in datasets.items():
+            if not DATASET_ID_PATTERN.fullmatch(dataset_id) or dataset_id in reserved:
+                raise ValueError(f"invalid dataset id {dataset_id!r}")
+            missing = {'shapefile', 'slope_csv'} - set(config)
+            if 'artifact' not in config and missing:
+                raise ValueError(f"dataset {dataset_id!r} needs an artifact or "
+                                 f"{', '.join(sorted(missing))}")
+        self.datasets = datasets
+        self.default = default if default is not None else next(iter(datasets))
+        if self.default not in datasets:
+            raise ValueError(f"default dataset {self.default!r} is not configured")
+        self.cache_dir = cache_dir
+        self.budget = int(memory_mb * 2**20)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Loaded snapshots and their sizes, least recently used first
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        # Loads in progress as (Future, StageTimer), and why the last load of each failed
+        self._loading = {}
+        self._errors = {}
+
+    @classmethod
+    def from_file(cls, path, cache_dir=CACHE_DIR):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+        datasets = {dataset_id: dict(entry, **{key: os.path.join(base, entry[key])
+                                               for key in ('shapefile', 'slope_csv', 'artifact')
+                                               if key in entry})
+                    for dataset_id, entry in config.get('datasets', {}).items()}
+        return cls(datasets, config.get('default'), cache_dir,
+                   config.get('memory_mb', DATASET_MEMORY_MB))
+
+    def inputs(self, dataset_id):
+        """(shapefile_path, csv_path, cache_dir) of a dataset"""
+        config = self.datasets[dataset_id]
+        return (config['shapefile'], config['slope_csv'],
+                os.path.join(self.cache_dir, dataset_id) if self.cache_dir else '')
+
+    def get(self, dataset_id, wait=DATASET_LOAD_WAIT):
+        """The snapshot of a dataset other than the default, loading it if needed
+
+        Returns None if the load is still running after wait seconds, and
+        raises the load's error if it failed; the next call retries it.
+        """
+        with self._lock:
+            snapshot = self._loaded.get(dataset_id)
+            if snapshot is not None:
+                self._loaded.move_to_end(dataset_id)
+                return snapshot
+            future = self._start(dataset_id)
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeoutError:
+            return None
+
+    def _start(self, dataset_id):
+        # Called with the lock held; joins the load in progress if there is one
+        if dataset_id in self._loading:
+            return self._loading[dataset_id][0]
+        future, timer = Future(), StageTimer(trace_memory=False)
+        self._loading[dataset_id] = (future, timer)
+        threading.Thread(target=self._load, args=(dataset_id, future, timer),
+                         name=f"dataset-loader-{dataset_id}", daemon=True).start()
+        return future
+
+    def _load(self, dataset_id, future, timer):
+        print(f"Loading dataset {dataset_id}...")
+        try:
+            if 'artifact' in self.datasets[dataset_id]:
+                snapshot = load_artifact(self.datasets[dataset_id]['artifact'], timer)
+            else:
+                snapshot = build_snapshot(*self.inputs(dataset_id), timer=timer)
+            # Loaded in full so the memory budget sees what the dataset will take
+            size = snapshot.prepare().nbytes()
+        except Exception as e:
+            print(f"Error loading dataset {dataset_id}: {type(e).__name__}: {e}")
+            with self._lock:
+                self._errors[dataset_id] = f"{type(e).__name__}: {e}"
+                del self._loading[dataset_id]
+            future.set_exception(e)
+            return
+        finally:
+            timer.close()
+
+        with self._lock:
+            self._loaded[dataset_id] = snapshot
+            self._sizes[dataset_id] = size
+            self._errors.pop(dataset_id, None)
+            del self._loading[dataset_id]
+            # Evict least recently used first, never the dataset just loaded
+            while len(self._loaded) > 1 and sum(self._sizes.values()) > self.budget:
+                evicted, _ = self._loaded.popitem(last=False)
+                del self._sizes[evicted]
+                self.evictions += 1
+                print(f"Evicted dataset {evicted} to stay within {self.budget / 2**20:.0f} MB")
+        print(f"Dataset {dataset_id} loaded, {size / 2**20:.0f} MB.")
+        future.set_result(snapshot)
+
+    def status(self, dataset_id, start=False):
+        """Readiness of a dataset in the form of load_status()
+
+        start=True starts loading a dataset that has not been loaded yet; one
+        whose last load failed is only retried by the next get().
+        """
+        if dataset_id == self.default:
+            return load_status()
+        with self._lock:
+            snapshot = self._loaded.get(dataset_id)
+            if (start and snapshot is None and dataset_id not in self._loading
+                    and dataset_id not in self._errors):
+                self._start(dataset_id)
+            timer = self._loading[dataset_id][1] if dataset_id in self._loading else None
+            error = self._errors.get(dataset_id)
+        if snapshot is not None:
+            result = {"status": "ready", "version": snapshot.version, "segments": len(snapshot.store)}
+        else:
+            result = {"status": "error" if error is not None and timer is None else
+                      "loading" if timer is not None else "unloaded"}
+        if timer is not None:
+            result.update(loading_s=round(time.perf_counter() - timer.started, 1),
+                          stage=timer.stages[-1][0] if timer.stages else None)
+        if error is not None:
+            result["error"] = error
+        return result
+
+    def report(self):
+        """Every dataset with its state and, when loaded, its size; for /api/datasets"""
+        with self._lock:
+            sizes = dict(self._sizes)
+        datasets = []
+        for dataset_id, config in self.datasets.items():
+            entry = dict(id=dataset_id, label=config.get('label', dataset_id),
+                         default=dataset_id == self.default, **self.status(dataset_id))
+            if dataset_id in sizes:
+                entry['bytes'] = sizes[dataset_id]
+            datasets.append(entry)
+        return {"datasets": datasets, "memory_budget_bytes": self.budget,
+                "loaded_bytes": sum(sizes.values()), "evictions": self.evictions}
+
+    def sizes(self):
+        with self._lock:
+            return dict(self._sizes)
+
+
+def configure_datasets(path, cache_dir=CACHE_DIR):
+    """Serve the datasets of a config file under /api/<dataset>/; see DatasetRegistry"""
+    global _registry
+    _registry = DatasetRegistry.from_file(path, cache_dir) if path else None
+    return _registry
+
+
+def create_app(shapefile_path=SHAPEFILE_PATH, csv_path=SLOPE_CSV_PATH, cache_dir=CACHE_DIR,
+               rebuild=False, watch=False, metrics=False, trace_memory=False, datasets=None,
+               artifact=None, scenario_dir=SCENARIO_DIR):
+    """WSGI entry point: load the dataset, then return the Flask app
+
+    Under gunicorn, preload so the dataset is loaded once and shared by the
+    forked workers:
+
+        gunicorn --preload -w 4 'urban_walkability_analytics_app:create_app()'
+
+    Leave watch off there; each worker would rebuild the data on its own.
+    artifact serves a file written by the build command instead of the input
+    files, with no geospatial work and without importing geopandas:
+
+        gunicorn --preload -w 4 'urban_walkability_analytics_app:create_app(artifact="walkability.uwa")'
+
+    datasets is a DatasetRegistry config file; its default dataset then
+    replaces the other inputs. Scenarios made at /api/scenarios are saved
+    in scenario_dir, which every worker shares.
+    """
+    enable_metrics(metrics, trace_memory)
+    configure_scenarios(scenario_dir)
+    load, changes = _data_source(shapefile_path, csv_path, cache_dir, rebuild, artifact,
+                                 configure_datasets(datasets, cache_dir))
+    # Everything is loaded before returning, so that preloaded workers share it
+    load().prepare()
+    if watch:
+        def reload_on_changes():
+            for _ in changes():
+                print("Data changed, reloading...")
+                load()
+
+        threading.Thread(target=reload_on_changes, name='data-watcher', daemon=True).start()
+    return app
+
+
+def _single_dataset_cache(cache_dir):
+    """Cache directory of the input files served without --datasets
+
+    Kept apart from the registry's dataset directories, so that pruning the
+    entries beside a new one never reaches another dataset's cache.
+    """
+    return os.path.join(cache_dir, SINGLE_DATASET_CACHE) if cache_dir else cache_dir
+
+
+def _data_source(shapefile_path, csv_path, cache_dir, rebuild, artifact, registry):
+    """(load, changes) of the dataset served at the routes without a dataset: load()
+    loads and swaps it in, and changes() yields each time it should run again"""
+    if registry is not None:
+        config = registry.datasets[registry.default]
+        artifact = config.get('artifact')
+        if artifact is None:
+            shapefile_path, csv_path, cache_dir = registry.inputs(registry.default)
+    else:
+        cache_dir = _single_dataset_cache(cache_dir)
+    if artifact is not None:
+        return partial(load_artifact_data, artifact), partial(artifact_changes, artifact)
+    return (partial(load_and_optimize_data, shapefile_path, csv_path, cache_dir, rebuild),
+            partial(input_changes, shapefile_path, csv_path))
+
+
+def _serve_worker(host, port, fd):
+    """One forked server process; returns once told to stop with SIGTERM"""
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, app, threaded=True, fd=fd)
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever()
+    # The socket is no longer read; let requests already accepted finish
+    time.sleep(WORKER_SHUTDOWN_GRACE)
+
+
+def serve(host='127.0.0.1', port=5000, workers=1, load=None, watch=None):
+    """Serve the loaded snapshot from worker processes forked off this one
+
+    The dataset is loaded before the fork, so the workers share its pages
+    (memory-mapped cache files and copy-on-write heap) instead of each
+    building a copy, and they all accept from one listening socket. The
+    Deferred parts of the snapshot and the spatial index are loaded here too
+    before forking, for the same reason.
+
+    load() loads the dataset and swaps it in, e.g. a partial() of
+    load_and_optimize_data() or load_artifact_data(). It only runs once the
+    port is bound: a thread does it next to the single server, or this
+    process does while workers forked beforehand answer data requests with
+    503, and are then replaced by workers that have the data. Each time
+    watch, an iterable such as input_changes(), yields, load() runs again
+    here and the workers are replaced with freshly forked ones.
+    """
+    if workers <= 1 or not hasattr(os, 'fork'):
+        def load_then_watch():
+            load()
+            for _ in watch or ():
+                print("Data changed, reloading...")
+                load()
+
+        if load:
+            threading.Thread(target=load_then_watch, name='data-loader', daemon=True).start()
+        app.run(host=host, port=port, debug=False)
+        return
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    listener = socket.create_server((host, port), backlog=SERVER_BACKLOG)
+
+    def spawn():
+        current_snapshot().prepare()
+        # Frozen objects are never scanned by the collector, which would dirty shared pages
+        gc.collect()
+        gc.freeze()
+        pids = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    _serve_worker(host, port, listener.fileno())
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        gc.unfreeze()
+        return pids
+
+    def retire(pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    pids = spawn()
+    print(f" * {workers} workers serving on http://{host}:{port}/")
+    try:
+        if load:
+            # Replace the workers even if the load failed, so they report the error
+            load()
+            old, pids = pids, spawn()
+            retire(old)
+        if load and watch:
+            for _ in watch:
+                print("Data changed, reloading...")
+                previous = current_snapshot()
+                if load() is not previous:
+                    old, pids = pids, spawn()
+                    retire(old)
+        else:
+            for pid in pids:
+                os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        retire(pids)
+
+
+# Enhanced HTML Template
+HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Urban Walkability Analytics</title>
+    
+    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
+    <link href="https://fonts.googleapis.com/css2?family=Space+Grotesk:wght@400;500;600;700&family=Inter:wght@300;400;500;600&display=swap" rel="stylesheet">
+    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+    <script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>
+    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
+    
+    <style>
+        :root {
+            --primary-gradient: linear-gradient(135deg, #2563eb 0%, #7c3aed 100%);
+            --accent-gradient: linear-gradient(135deg, #ec4899 0%, #f97316 100%);
+            --success-gradient: linear-gradient(135deg, #10b981 0%, #3b82f6 100%);
+            --text-dark: #0f172a;
+            --text-mid: #334155;
+            --text-light: #64748b;
+            --bg-glass: rgba(255, 255, 255, 0.85);
+            --bg-glass-dark: rgba(255, 255, 255, 0.95);
+            --shadow-sm: 0 2px 8px rgba(0, 0, 0, 0.08);
+            --shadow-md: 0 8px 30px rgba(37, 99, 235, 0.15);
+            --shadow-lg: 0 20px 60px rgba(37, 99, 235, 0.2);
+        }
+
+        * { box-sizing: border-box; }
+        
+        body { 
+            margin: 0; 
+            padding: 0; 
+            font-family: 'Inter', sans-serif; 
+            overflow: hidden;
+            background: #f7fafc;
+        }
+
+        /* Full Screen Map */
+        #map { 
+            height: 100vh; 
+            width: 100vw; 
+            z-index: 1;
+            filter: brightness(0.98) saturate(1.1);
+        }
+
+        /* Animated Background Pattern */
+        #map::before {
+            content: '';
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            bottom: 0;
+            background: radial-gradient(circle at 20% 80%, rgba(37, 99, 235, 0.04) 0%, transparent 50%),
+                        radial-gradient(circle at 80% 20%, rgba(236, 72, 153, 0.04) 0%, transparent 50%);
+            pointer-events: none;
+            z-index: 1;
+        }
+
+        /* Floating Header Bar */
+        #header-bar {
+            position: absolute;
+            top: 24px;
+            left: 50%;
+            transform: translateX(-50%);
+            background: var(--bg-glass-dark);
+            backdrop-filter: blur(20px) saturate(180%);
+            padding: 16px 32px;
+            border-radius: 100px;
+            box-shadow: var(--shadow-md);
+            z-index: 1001;
+            display: flex;
+            align-items: center;
+            gap: 16px;
+            border: 1px solid rgba(255, 255, 255, 0.6);
+            animation: slideDown 0.6s ease-out;
+        }
+
+        @keyframes slideDown {
+            from { transform: translateX(-50%) translateY(-20px); opacity: 0; }
+            to { transform: translateX(-50%) translateY(0); opacity: 1; }
+        }
+
+        #update-banner {
+            display: none;
+            position: absolute;
+            top: 110px;
+            left: 50%;
+            transform: translateX(-50%);
+            z-index: 1001;
+            align-items: center;
+            gap: 12px;
+            padding: 10px 20px;
+            border-radius: 100px;
+            background: var(--bg-glass-dark);
+            box-shadow: var(--shadow-md);
+            font-size: 0.85rem;
+            font-weight: 600;
+            color: var(--text-dark);
+            animation: slideDown 0.6s ease-out;
+        }
+
+        #update-banner button {
+            padding: 6px 14px;
+            border: none;
+            border-radius: 100px;
+            background: #2563eb;
+            color: white;
+            font-weight: 600;
+            cursor: pointer;
+        }
+
+        .header-icon {
+            width: 40px;
+            height: 40px;
+            background: var(--primary-gradient);
+            border-radius: 12px;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            font-size: 20px;
+            box-shadow: var(--shadow-sm);
+        }
+
+        .header-content h1 {
+            margin: 0;
+            font-family: 'Space Grotesk', sans-serif;
+            font-size: 1.25rem;
+            font-weight: 700;
+            background: var(--primary-gradient);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            background-clip: text;
+        }
+
+        .header-content p {
+            margin: 2px 0 0 0;
+            font-size: 0.8rem;
+            color: var(--text-light);
+            font-weight: 500;
+        }
+
+        /* Enhanced Sidebar */
+        #sidebar {
+            position: absolute;
+            top: 110px;
+            left: 24px;
+            width: 420px;
+            max-height: calc(100vh - 134px);
+            background: var(--bg-glass-dark);
+            backdrop-filter: blur(20px) saturate(180%);
+            border-radius: 24px;
+            box-shadow: var(--shadow-lg);
+            z-index: 1000;
+            display: flex;
+            flex-direction: column;
+            overflow: hidden;
+            border: 1px solid rgba(255, 255, 255, 0.6);
+            animation: slideInLeft 0.6s ease-out 0.2s both;
+        }
+
+        @keyframes slideInLeft {
+            from { transform: translateX(-40px); opacity: 0; }
+            to { transform: translateX(0); opacity: 1; }
+        }
+
+        #sidebar-header {
+            padding: 28px;
+            background: var(--primary-gradient);
+            color: white;
+            position: relative;
+            overflow: hidden;
+        }
+
+        #sidebar-header::before {
+            content: '';
+            position: absolute;
+            top: -50%;
+            right: -50%;
+            width: 200%;
+            height: 200%;
+            background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
+            animation: pulse 4s ease-in-out infinite;
+        }
+
+        @keyframes pulse {
+            0%, 100% { transform: scale(1); opacity: 0.5; }
+            50% { transform: scale(1.1); opacity: 0.8; }
+        }
+
+        #sidebar-header h2 { 
+            margin: 0; 
+            font-size: 1.4rem; 
+            font-weight: 700;
+            font-family: 'Space Grotesk', sans-serif;
+            letter-spacing: -0.02em;
+            position: relative;
+            z-index: 1;
+        }
+
+        #sidebar-header p { 
+            margin: 8px 0 0 0; 
+            font-size: 0.9rem; 
+            opacity: 0.95;
+            font-weight: 400;
+            position: relative;
+            z-index: 1;
+        }
+
+        #sidebar-content {
+            padding: 28px;
+            overflow-y: auto;
+            flex: 1;
+        }
+
+        #sidebar-content::-webkit-scrollbar { width: 6px; }
+        #sidebar-content::-webkit-scrollbar-track { background: transparent; }
+        #sidebar-content::-webkit-scrollbar-thumb { 
+            background: linear-gradient(180deg, #2563eb, #7c3aed); 
+            border-radius: 10px; 
+        }
+
+        /* Loading Overlay */
+        #loader {
+            position: fixed;
+            top: 0; left: 0; width: 100%; height: 100%;
+            background: linear-gradient(135deg, #2563eb 0%, #7c3aed 100%);
+            z-index: 9999;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            justify-content: center;
+            color: white;
+        }
+
+        .loader-content {
+            text-align: center;
+            animation: fadeInUp 0.6s ease-out;
+        }
+
+        @keyframes fadeInUp {
+            from { transform: translateY(20px); opacity: 0; }
+            to { transform: translateY(0); opacity: 1; }
+        }
+
+        .spinner {
+            width: 60px; 
+            height: 60px;
+            border: 4px solid rgba(255, 255, 255, 0.2);
+            border-top: 4px solid white;
+            border-radius: 50%;
+            animation: spin 1s cubic-bezier(0.68, -0.55, 0.265, 1.55) infinite;
+            margin-bottom: 24px;
+        }
+
+        @keyframes spin { 
+            0% { transform: rotate(0deg); } 
+            100% { transform: rotate(360deg); } 
+        }
+
+        #loader-text {
+            font-size: 1.3rem;
+            font-weight: 600;
+            font-family: 'Space Grotesk', sans-serif;
+            margin-bottom: 8px;
+        }
+
+        .loader-subtitle {
+            font-size: 0.95rem;
+            opacity: 0.9;
+        }
+
+        /* Metrics Grid */
+        .metric-grid {
+            display: grid;
+            grid-template-columns: 1fr 1fr;
+            gap: 14px;
+            margin-bottom: 24px;
+        }
+
+        .metric-card {
+            background: linear-gradient(135deg, rgba(255, 255, 255, 0.9) 0%, rgba(255, 255, 255, 0.6) 100%);
+            padding: 18px;
+            border-radius: 16px;
+            border: 1px solid rgba(37, 99, 235, 0.1);
+            box-shadow: var(--shadow-sm);
+            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+            position: relative;
+            overflow: hidden;
+        }
+
+        .metric-card::before {
+            content: '';
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            height: 3px;
+            background: var(--primary-gradient);
+            transform: scaleX(0);
+            transition: transform 0.3s ease;
+        }
+
+        .metric-card:hover {
+            transform: translateY(-4px);
+            box-shadow: var(--shadow-md);
+            border-color: rgba(37, 99, 235, 0.3);
+        }
+
+        .metric-card:hover::before {
+            transform: scaleX(1);
+        }
+
+        .metric-label { 
+            font-size: 0.75rem; 
+            color: var(--text-light); 
+            text-transform: uppercase; 
+            letter-spacing: 0.08em;
+            font-weight: 600;
+            margin-bottom: 8px;
+        }
+
+        .metric-value { 
+            font-size: 1.5rem; 
+            font-weight: 700; 
+            background: var(--primary-gradient);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            background-clip: text;
+            font-family: 'Space Grotesk', sans-serif;
+        }
+
+        /* Empty State */
+        .empty-state {
+            text-align: center;
+            padding: 60px 24px;
+            color: var(--text-mid);
+            background: linear-gradient(135deg, rgba(37, 99, 235, 0.05) 0%, rgba(124, 58, 237, 0.05) 100%);
+            border-radius: 20px;
+            border: 2px dashed rgba(37, 99, 235, 0.25);
+            animation: float 3s ease-in-out infinite;
+        }
+
+        @keyframes float {
+            0%, 100% { transform: translateY(0); }
+            50% { transform: translateY(-10px); }
+        }
+
+        .empty-icon { 
+            font-size: 3.5rem; 
+            margin-bottom: 16px; 
+            display: block;
+            animation: bounce 2s ease-in-out infinite;
+        }
+
+        @keyframes bounce {
+            0%, 100% { transform: translateY(0); }
+            50% { transform: translateY(-10px); }
+        }
+
+        .empty-state p {
+            font-size: 1rem;
+            line-height: 1.6;
+            margin: 0;
+            font-weight: 500;
+        }
+
+        /* Chart Container */
+        #chart-div { 
+            height: 380px; 
+            width: 100%;
+            background: linear-gradient(135deg, rgba(255, 255, 255, 0.5) 0%, rgba(255, 255, 255, 0.2) 100%);
+            border-radius: 16px;
+            padding: 16px;
+            box-shadow: inset 0 2px 8px rgba(0, 0, 0, 0.05);
+        }
+
+        /* Stats Summary Badge */
+        .stats-badge {
+            display: inline-flex;
+            align-items: center;
+            gap: 8px;
+            background: var(--success-gradient);
+            color: white;
+            padding: 10px 20px;
+            border-radius: 100px;
+            font-size: 0.85rem;
+            font-weight: 600;
+            margin-bottom: 20px;
+            box-shadow: var(--shadow-sm);
+            animation: slideIn 0.6s ease-out;
+        }
+
+        @keyframes slideIn {
+            from { transform: translateX(-20px); opacity: 0; }
+            to { transform: translateX(0); opacity: 1; }
+        }
+
+        .stats-badge-icon {
+            font-size: 1.2rem;
+        }
+
+        /* Score Map Panel */
+        .score-panel {
+            margin-top: 24px;
+            padding: 18px;
+            border-radius: 16px;
+            border: 1px solid rgba(37, 99, 235, 0.1);
+            background: linear-gradient(135deg, rgba(255, 255, 255, 0.9) 0%, rgba(255, 255, 255, 0.6) 100%);
+            box-shadow: var(--shadow-sm);
+        }
+
+        .score-toggle {
+            display: flex;
+            align-items: center;
+            gap: 10px;
+            font-size: 0.9rem;
+            font-weight: 600;
+            color: var(--text-dark);
+            cursor: pointer;
+        }
+
+        .score-weights {
+            display: none;
+            margin-top: 14px;
+        }
+
+        .weight-row {
+            display: grid;
+            grid-template-columns: 1fr 110px 28px;
+            align-items: center;
+            gap: 10px;
+            font-size: 0.8rem;
+            color: var(--text-mid);
+            margin-bottom: 6px;
+        }
+
+        .weight-row output {
+            text-align: right;
+            font-weight: 600;
+            color: var(--text-dark);
+        }
+
+        .score-legend {
+            display: flex;
+            align-items: center;
+            gap: 8px;
+            margin-top: 12px;
+            font-size: 0.75rem;
+            color: var(--text-light);
+            text-transform: uppercase;
+            letter-spacing: 0.08em;
+        }
+
+        .score-ramp {
+            flex: 1;
+            height: 8px;
+            border-radius: 4px;
+            background: linear-gradient(90deg, #ef4444, #f97316, #eab308, #84cc16, #10b981);
+        }
+
+        .walkshed-hint {
+            margin-top: 8px;
+            font-size: 0.8rem;
+            color: var(--text-light);
+        }
+
+        .walkshed-summary {
+            margin-top: 10px;
+            font-size: 0.85rem;
+            font-weight: 600;
+            color: var(--text-dark);
+        }
+
+        .filter-types {
+            display: flex;
+            flex-wrap: wrap;
+            gap: 4px 12px;
+            margin-bottom: 10px;
+            font-size: 0.8rem;
+            color: var(--text-mid);
+        }
+
+        .filter-row {
+            display: grid;
+            grid-template-columns: 1fr 44px 80px 36px;
+            align-items: center;
+            gap: 8px;
+            font-size: 0.8rem;
+            color: var(--text-mid);
+            margin-bottom: 6px;
+        }
+
+        .filter-row output {
+            text-align: right;
+            font-weight: 600;
+            color: var(--text-dark);
+        }
+
+        .stats-table {
+            width: 100%;
+            margin-top: 10px;
+            border-collapse: collapse;
+            font-size: 0.8rem;
+            color: var(--text-mid);
+        }
+
+        .stats-table th {
+            font-size: 0.7rem;
+            font-weight: 600;
+            color: var(--text-light);
+            text-transform: uppercase;
+            letter-spacing: 0.05em;
+        }
+
+        .stats-table td + td,
+        .stats-table th + th {
+            text-align: right;
+            font-weight: 600;
+            color: var(--text-dark);
+        }
+
+        .similar-radius {
+            grid-template-columns: 1fr 130px;
+            margin-top: 10px;
+        }
+
+        .similar-row {
+            cursor: pointer;
+        }
+
+        .similar-row:hover td {
+            color: #ec4899;
+        }
+
+        .walkshed-clear {
+            display: none;
+            margin-top: 10px;
+            padding: 6px 12px;
+            border: 1px solid rgba(37, 99, 235, 0.2);
+            border-radius: 8px;
+            background: white;
+            font-size: 0.8rem;
+            color: var(--text-mid);
+            cursor: pointer;
+        }
+
+        /* Leaflet Custom Controls */
+        .leaflet-control-zoom {
+            border: none !important;
+            box-shadow: var(--shadow-md) !important;
+            border-radius: 12px !important;
+            overflow: hidden;
+            background: var(--bg-glass-dark) !important;
+            backdrop-filter: blur(20px) !important;
+        }
+
+        .leaflet-control-zoom a {
+            width: 40px !important;
+            height: 40px !important;
+            line-height: 40px !important;
+            font-size: 20px !important;
+            font-weight: 700 !important;
+            color: #2563eb !important;
+            background: transparent !important;
+            border: none !important;
+            transition: all 0.2s ease !important;
+        }
+
+        .leaflet-control-zoom a:hover {
+            background: rgba(37, 99, 235, 0.1) !important;
+            color: #7c3aed !important;
+        }
+
+        /* Responsive Design */
+        @media (max-width: 768px) {
+            #sidebar {
+                width: calc(100% - 48px);
+                left: 24px;
+                right: 24px;
+                max-height: 50vh;
+            }
+
+            #header-bar {
+                left: 24px;
+                right: 24px;
+                transform: none;
+                border-radius: 20px;
+            }
+
+            .metric-grid {
+                grid-template-columns: 1fr;
+            }
+        }
+    </style>
+</head>
+<body>
+
+    <div id="loader">
+        <div class="loader-content">
+            <div class="spinner"></div>
+            <div id="loader-text">Loading Urban Data</div>
+            <div id="loader-subtitle" class="loader-subtitle">Preparing street analytics...</div>
+        </div>
+    </div>
+
+    <div id="header-bar">
+        <div class="header-icon">🗺️</div>
+        <div class="header-content">
+            <h1>Urban Walkability Analytics</h1>
+            <p id="header-subtitle">Interactive Street Segment Analysis Dashboard</p>
+        </div>
+    </div>
+
+    <div id="update-banner">
+        <span>New street data is available</span>
+        <button onclick="window.location.reload()">Reload</button>
+    </div>
+
+    <div id="sidebar">
+        <div id="sidebar-header">
+            <h2>Segment Details</h2>
+            <p>Click any street to explore metrics</p>
+        </div>
+        <div id="sidebar-content">
+            <div id="details-container" style="display: none;">
+                <div class="stats-badge">
+                    <span class="stats-badge-icon">📊</span>
+                    <span>Selected Segment Analysis</span>
+                </div>
+                
+                <div class="metric-grid">
+                    <div class="metric-card">
+                        <div class="metric-label">Street ID</div>
+                        <div class="metric-value" id="val-id">-</div>
+                    </div>
+                    <div class="metric-card">
+                        <div class="metric-label">Length</div>
+                        <div class="metric-value" id="val-len">-</div>
+                    </div>
+                    <div class="metric-card">
+                        <div class="metric-label">Type</div>
+                        <div class="metric-value" id="val-type">-</div>
+                    </div>
+                    <div class="metric-card">
+                        <div class="metric-label">Overall Score</div>
+                        <div class="metric-value" id="val-avg">-</div>
+                    </div>
+                </div>
+                <div id="chart-div"></div>
+
+                <div class="score-panel">
+                    <div class="score-toggle">
+                        <span>🔍 Similar streets</span>
+                    </div>
+                    <p class="walkshed-hint">Streets whose seven metrics are closest to this one's. Click one to fly to it.</p>
+                    <label class="weight-row similar-radius">
+                        <span>Within</span>
+                        <select id="similar-radius">
+                            <option value="">Anywhere</option>
+                            <option value="500">500 m</option>
+                            <option value="1000">1 km</option>
+                            <option value="2000">2 km</option>
+                            <option value="5000">5 km</option>
+                        </select>
+                    </label>
+                    <div id="similar-summary" class="walkshed-summary"></div>
+                    <table id="similar-table" class="stats-table"></table>
+                </div>
+            </div>
+
+            <div id="empty-state" class="empty-state">
+                <span class="empty-icon">🎯</span>
+                <p>Select any street segment on the map<br>to view detailed walkability metrics</p>
+            </div>
+
+            <div class="score-panel">
+                <label class="score-toggle">
+                    <input type="checkbox" id="score-toggle">
+                    <span>Color streets by walkability score</span>
+                </label>
+                <div id="score-weights" class="score-weights">
+                    <div id="weight-controls"></div>
+                    <div class="score-legend">
+                        <span>Low</span>
+                        <div class="score-ramp"></div>
+                        <span>High</span>
+                    </div>
+                </div>
+            </div>
+
+            <div class="score-panel">
+                <label class="score-toggle">
+                    <input type="checkbox" id="filter-toggle">
+                    <span>Filter streets</span>
+                </label>
+                <div id="filter-controls" class="score-weights">
+                    <div id="filter-types" class="filter-types"></div>
+                    <div id="filter-metrics"></div>
+                    <div id="filter-summary" class="walkshed-summary"></div>
+                </div>
+            </div>
+
+            <div class="score-panel">
+                <label class="score-toggle">
+                    <input type="checkbox" id="stats-toggle">
+                    <span>Summarize streets in view</span>
+                </label>
+                <div id="stats-view" class="score-weights">
+                    <p class="walkshed-hint">Weighted by street length, over the grid cells the map view touches.</p>
+                    <div id="stats-summary" class="walkshed-summary"></div>
+                    <table id="stats-table" class="stats-table"></table>
+                </div>
+            </div>
+
+            <div class="score-panel">
+                <div class="score-toggle">
+                    <span>🚶 Walkshed</span>
+                </div>
+                <p class="walkshed-hint">Right-click the map to highlight every street within walking distance.</p>
+                <label class="weight-row">
+                    <span>Minutes</span>
+                    <input type="range" id="walkshed-minutes" min="5" max="30" step="5" value="15">
+                    <output id="walkshed-minutes-value">15</output>
+                </label>
+                <div id="walkshed-summary" class="walkshed-summary"></div>
+                <button id="walkshed-clear" class="walkshed-clear">Clear walkshed</button>
+            </div>
+        </div>
+    </div>
+
+    <div id="map"></div>
 
-def load_and_optimize_data():
-    global geojson_response_cache, center_coords
-    
-    shapefile_path = "./data/GCWI_SCORE_streetswithsidewalk_Cleaned.shp"
-    csv_path = "./data/street_segment_slope.csv"
-    
-    try:
-        # 1. Load Data
-        gdf = gpd.read_file(shapefile_path)
-        slope_df = pd.read_csv(csv_path)
-        
-        # 2. Merge Data
-        gdf = gdf.merge(slope_df[['ID_TRC', 'slope_normalized']], on='ID_TRC', how='left')
+    <script>
+        // Init Map
+        const map = L.map('map', {
+            zoomControl: false
+        }).setView({{ center }}, 13);
         
-        # 3. CRS Conversion
-        if gdf.crs != 'EPSG:4326':
-            gdf = gdf.to_crs('EPSG:4326')
-            
-        # 4. Calculate Center
-        center_lat = gdf.geometry.centroid.y.mean()
-        center_lon = gdf.geometry.centroid.x.mean()
-        center_coords = [center_lat, center_lon]
+        L.control.zoom({ position: 'bottomright' }).addTo(map);
 
-        # 5. Simplify Geometry
-        gdf['geometry'] = gdf.geometry.simplify(tolerance=0.00005, preserve_topology=True)
+        // Enhanced base map
+        L.tileLayer('https://{s}.basemaps.cartocdn.com/rastertiles/voyager/{z}/{x}/{y}{r}.png', {
+            attribution: '&copy; OpenStreetMap &copy; CARTO',
+            subdomains: 'abcd',
+            maxZoom: 20
+        }).addTo(map);
 
-        # 6. Cache JSON
-        json_str = gdf.to_json()
-        geojson_response_cache = json.loads(json_str)
-        
-        print(f"Data loaded! {len(gdf)} segments ready.")
-        
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        geojson_response_cache = {"type": "FeatureCollection", "features": []}
+        const DATA_SOURCE = {{ data_source|tojson }};
+        const DATA_VERSION = {{ data_version|tojson }};
+        // Every request goes to the dataset this page shows: /api, or /api/<dataset> for ?dataset=
+        const DATASET = {{ dataset|tojson }};
+        const API = {{ api_base|tojson }};
+        // ?scenario= shows a what-if scenario: scores, statistics and segment details come with its edits
+        const SCENARIO = {{ scenario|tojson }};
+        const SCENARIO_API = SCENARIO ? API + '/scenarios/' + SCENARIO : API;
+        const LOD_ZOOMS = {{ lod_zooms|tojson }};
+        const BASE_STYLE = { color: '#3b82f6', weight: 3, opacity: 0.7, lineCap: 'round', lineJoin: 'round' };
+        const HOVER_STYLE = { opacity: 1, weight: 5, color: '#8b5cf6' };
+        const SELECTED_STYLE = { color: '#ec4899', weight: 6, opacity: 1.0 };
+        const SCORE_METRICS = {{ score_metrics|tojson }};
+        const METRIC_LABELS = {
+            'LUM_Score': 'Luminosity',
+            'SFI_score': 'Space for Interaction',
+            'G-Score': 'Greenery',
+            'SH_Score': 'Shade',
+            'CO_Score': 'Connectivity',
+            'Pop_Score': 'Population Density',
+            'slope_normalized': 'Slope'
+        };
+        const SCORE_COLORS = ['#ef4444', '#f97316', '#eab308', '#84cc16', '#10b981'];
+        const SCORE_STYLE = { weight: 3, opacity: 0.85, lineCap: 'round', lineJoin: 'round' };
+        const WALKSHED_STYLE = { color: '#0d9488', weight: 4, opacity: 0.9, lineCap: 'round', lineJoin: 'round' };
+        const OUTSIDE_WALKSHED_STYLE = { color: '#94a3b8', weight: 2, opacity: 0.3, lineCap: 'round', lineJoin: 'round' };
+        const FILTERED_OUT_STYLE = { color: '#cbd5e1', weight: 1.5, opacity: 0.25, lineCap: 'round', lineJoin: 'round' };
+        const STREET_TYPES = {{ street_types|tojson }};
+        const BENCHMARK = {{ benchmark|tojson }};
+        let benchmarkStarted = false;
 
-# Enhanced HTML Template
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Urban Walkability Analytics</title>
-    
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-    <link href="https://fonts.googleapis.com/css2?family=Space+Grotesk:wght@400;500;600;700&family=Inter:wght@300;400;500;600&display=swap" rel="stylesheet">
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
-    
-    <style>
-        :root {
-            --primary-gradient: linear-gradient(135deg, #2563eb 0%, #7c3aed 100%);
-            --accent-gradient: linear-gradient(135deg, #ec4899 0%, #f97316 100%);
-            --success-gradient: linear-gradient(135deg, #10b981 0%, #3b82f6 100%);
-            --text-dark: #0f172a;
-            --text-mid: #334155;
-            --text-light: #64748b;
-            --bg-glass: rgba(255, 255, 255, 0.85);
-            --bg-glass-dark: rgba(255, 255, 255, 0.95);
-            --shadow-sm: 0 2px 8px rgba(0, 0, 0, 0.08);
-            --shadow-md: 0 8px 30px rgba(37, 99, 235, 0.15);
-            --shadow-lg: 0 20px 60px rgba(37, 99, 235, 0.2);
+        // Composite score per segment index, from /api/score; null shows the plain style
+        let segmentScores = null;
+        let scoreRange = [0, 1];
+        // Segment indices reachable on foot from the last right-click, from /api/isochrone
+        let walkshed = null;
+        // Packed bitset of the segments matching the filters, from /api/query; null keeps them all
+        let segmentFilter = null;
+        // Set by the active loader to re-evaluate segmentStyle() for every drawn segment
+        let restyleSegments = () => {};
+
+        function passesFilter(i) {
+            return segmentFilter === null || i === undefined || ((segmentFilter[i >> 3] >> (i & 7)) & 1) === 1;
         }
 
-        * { box-sizing: border-box; }
-        
-        body { 
-            margin: 0; 
-            padding: 0; 
-            font-family: 'Inter', sans-serif; 
-            overflow: hidden;
-            background: #f7fafc;
+        function segmentStyle(i) {
+            if (!passesFilter(i)) {
+                return FILTERED_OUT_STYLE;
+            }
+            if (walkshed !== null && !walkshed.has(i)) {
+                return OUTSIDE_WALKSHED_STYLE;
+            }
+            if (segmentScores === null || i === undefined) {
+                return walkshed !== null ? WALKSHED_STYLE : BASE_STYLE;
+            }
+            const [lo, hi] = scoreRange;
+            const t = (segmentScores[i] - lo) / ((hi - lo) || 1);
+            const bucket = Math.max(0, Math.min(SCORE_COLORS.length - 1, Math.floor(t * SCORE_COLORS.length)));
+            return Object.assign({ color: SCORE_COLORS[bucket] }, SCORE_STYLE);
         }
 
-        /* Full Screen Map */
-        #map { 
-            height: 100vh; 
-            width: 100vw; 
-            z-index: 1;
-            filter: brightness(0.98) saturate(1.1);
+        // Handle of the selected segment: { key, setStyle, reset, bringToFront }
+        let highlightLayer = null;
+
+        function hideLoader() {
+            const loader = document.getElementById('loader');
+            loader.style.transition = 'opacity 0.5s ease';
+            loader.style.opacity = '0';
+            setTimeout(() => loader.style.display = 'none', 500);
+            if (BENCHMARK && !benchmarkStarted) {
+                benchmarkStarted = true;
+                const loadMs = performance.now();
+                // Let the initial fitBounds() and its redraw finish first
+                setTimeout(() => runRenderBenchmark(loadMs), 1500);
+            }
         }
 
-        /* Animated Background Pattern */
-        #map::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: radial-gradient(circle at 20% 80%, rgba(37, 99, 235, 0.04) 0%, transparent 50%),
-                        radial-gradient(circle at 80% 20%, rgba(236, 72, 153, 0.04) 0%, transparent 50%);
-            pointer-events: none;
-            z-index: 1;
+        function showLoadError(err) {
+            document.getElementById('loader-text').innerText = "Error loading data";
+            console.error(err);
         }
 
-        /* Floating Header Bar */
-        #header-bar {
-            position: absolute;
-            top: 24px;
-            left: 50%;
-            transform: translateX(-50%);
-            background: var(--bg-glass-dark);
-            backdrop-filter: blur(20px) saturate(180%);
-            padding: 16px 32px;
-            border-radius: 100px;
-            box-shadow: var(--shadow-md);
-            z-index: 1001;
-            display: flex;
-            align-items: center;
-            gap: 16px;
-            border: 1px solid rgba(255, 255, 255, 0.6);
-            animation: slideDown 0.6s ease-out;
+        function isHighlighted(handle) {
+            return highlightLayer !== null && highlightLayer.key === handle.key;
         }
 
-        @keyframes slideDown {
-            from { transform: translateX(-50%) translateY(-20px); opacity: 0; }
-            to { transform: translateX(-50%) translateY(0); opacity: 1; }
+        function bindSegmentEvents(target, handleFor) {
+            target.on('click', function(e) {
+                L.DomEvent.stopPropagation(e);
+                const [props, handle] = handleFor(e);
+                selectSegment(props, handle);
+            });
+
+            target.on('mouseover', function(e) {
+                const handle = handleFor(e)[1];
+                if (!isHighlighted(handle)) {
+                    handle.setStyle(HOVER_STYLE);
+                }
+            });
+
+            target.on('mouseout', function(e) {
+                const handle = handleFor(e)[1];
+                if (!isHighlighted(handle)) {
+                    handle.reset();
+                }
+            });
         }
 
-        .header-icon {
-            width: 40px;
-            height: 40px;
-            background: var(--primary-gradient);
-            border-radius: 12px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 20px;
-            box-shadow: var(--shadow-sm);
+        // Server-side level of detail for a map zoom: the last LOD_ZOOMS entry not above it
+        function detailLevel(zoom) {
+            return LOD_ZOOMS.filter(z => z <= zoom).pop() || LOD_ZOOMS[0];
         }
 
-        .header-content h1 {
-            margin: 0;
-            font-family: 'Space Grotesk', sans-serif;
-            font-size: 1.25rem;
-            font-weight: 700;
-            background: var(--primary-gradient);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
+        // Reads an application/geo+json-seq response, handing over each chunk's features as it arrives
+        function readFeatureSequence(response, onFeatures) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const parse = text => text.split('\x1e').filter(record => record.trim()).map(record => JSON.parse(record));
+            let pending = '';
+
+            function pump() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        onFeatures(parse(pending + decoder.decode()));
+                        return;
+                    }
+                    pending += decoder.decode(value, { stream: true });
+                    // Every record before the last separator is complete
+                    const cut = pending.lastIndexOf('\x1e');
+                    if (cut > 0) {
+                        onFeatures(parse(pending.slice(0, cut)));
+                        pending = pending.slice(cut);
+                    }
+                    return pump();
+                });
+            }
+            return pump();
         }
 
-        .header-content p {
-            margin: 2px 0 0 0;
-            font-size: 0.8rem;
-            color: var(--text-light);
-            font-weight: 500;
+        // Whole network as one GeoJSON download, re-fetched when the zoom changes level
+        function loadGeoJsonLayer(progressive) {
+            const myRenderer = L.canvas({ padding: 0.5 });
+
+            const geoJsonLayer = L.geoJSON(null, {
+                renderer: myRenderer,
+                style: function(feature) {
+                    return segmentStyle(feature.properties.i);
+                },
+                onEachFeature: function(feature, layer) {
+                    const handle = {
+                        key: feature.properties.i,
+                        setStyle: style => layer.setStyle(style),
+                        reset: () => geoJsonLayer.resetStyle(layer),
+                        bringToFront: () => layer.bringToFront()
+                    };
+                    bindSegmentEvents(layer, () => [feature.id, handle]);
+                }
+            }).addTo(map);
+            restyleSegments = () => geoJsonLayer.resetStyle();
+
+            let level = null;
+            let streaming = null;
+            function load(fit) {
+                const wanted = detailLevel(map.getZoom());
+                if (wanted === level) {
+                    return;
+                }
+                level = wanted;
+
+                if (progressive) {
+                    // Draw each chunk of features as it arrives; a new zoom cancels the old stream
+                    if (streaming) {
+                        streaming.abort();
+                    }
+                    streaming = new AbortController();
+                    fetch(API + '/data?format=seq&zoom=' + wanted, { signal: streaming.signal })
+                        .then(response => {
+                            if (!response.ok) {
+                                throw new Error('Data request failed: HTTP ' + response.status);
+                            }
+                            hideLoader();
+                            resetSelection();
+                            geoJsonLayer.clearLayers();
+                            return readFeatureSequence(response, features => geoJsonLayer.addData(features));
+                        })
+                        .then(() => {
+                            if (fit && geoJsonLayer.getLayers().length > 0) {
+                                map.fitBounds(geoJsonLayer.getBounds());
+                            }
+                        })
+                        .catch(err => {
+                            if (err.name !== 'AbortError') {
+                                showLoadError(err);
+                            }
+                        });
+                    return;
+                }
+
+                fetch(API + '/data?zoom=' + wanted)
+                    .then(response => response.json())
+                    .then(data => {
+                        // A later zoom may already have asked for another level
+                        if (level !== wanted) {
+                            return;
+                        }
+                        hideLoader();
+                        resetSelection();
+                        geoJsonLayer.clearLayers();
+                        geoJsonLayer.addData(data);
+
+                        if (fit && data.features.length > 0) {
+                            map.fitBounds(geoJsonLayer.getBounds());
+                        }
+                    })
+                    .catch(showLoadError);
+            }
+
+            map.on('zoomend', () => load(false));
+            load(true);
         }
 
-        /* Enhanced Sidebar */
-        #sidebar {
-            position: absolute;
-            top: 110px;
-            left: 24px;
-            width: 420px;
-            max-height: calc(100vh - 134px);
-            background: var(--bg-glass-dark);
-            backdrop-filter: blur(20px) saturate(180%);
-            border-radius: 24px;
-            box-shadow: var(--shadow-lg);
-            z-index: 1000;
-            display: flex;
-            flex-direction: column;
-            overflow: hidden;
-            border: 1px solid rgba(255, 255, 255, 0.6);
-            animation: slideInLeft 0.6s ease-out 0.2s both;
+        // Decoder for /api/data.bin: typed-array views over the response, only the small header is JSON
+        const BINARY_ARRAYS = { '<i4': Int32Array, '<u4': Uint32Array, '<f4': Float32Array, '<f8': Float64Array };
+
+        function decodeSegments(buffer) {
+            const view = new DataView(buffer);
+            const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+            if (magic !== 'UWAB' || view.getUint32(4, true) !== 1) {
+                throw new Error('Unsupported binary data format');
+            }
+            const headerLength = view.getUint32(8, true);
+            const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, headerLength)));
+            const base = Math.ceil((12 + headerLength) / 8) * 8;
+            const section = ([offset, dtype, length]) => new BINARY_ARRAYS[dtype](buffer, base + offset, length);
+
+            // Undo the per-line delta encoding, back to degrees
+            const lineOffsets = section(header.sections.line_offsets);
+            const deltas = section(header.sections.coords);
+            const coords = new Float64Array(deltas.length);
+            for (let line = 0; line + 1 < lineOffsets.length; line++) {
+                let x = 0, y = 0;
+                for (let v = lineOffsets[line]; v < lineOffsets[line + 1]; v++) {
+                    x += deltas[2 * v];
+                    y += deltas[2 * v + 1];
+                    coords[2 * v] = x * header.scale;
+                    coords[2 * v + 1] = y * header.scale;
+                }
+            }
+
+            const ids = section(header.sections.ids);
+            const columns = {};
+            for (const [name, spec] of Object.entries(header.columns)) {
+                columns[name] = section(spec);
+            }
+            return {
+                count: header.segments,
+                ids: ids,
+                lineOffsets: lineOffsets,
+                lineSegments: header.sections.line_segments ? section(header.sections.line_segments)
+                                                            : Uint32Array.from({ length: header.lines }, (_, i) => i),
+                coords: coords,
+                columns: columns,
+                // Same shape as /api/segment/<id>
+                record(i) {
+                    const record = { ID_TRC: Number(ids[i]) };
+                    for (const [name, column] of Object.entries(columns)) {
+                        const labels = header.categories[name];
+                        if (labels) {
+                            record[name] = column[i] >= 0 ? labels[column[i]] : null;
+                        } else {
+                            record[name] = Number.isNaN(column[i]) ? null : column[i];
+                        }
+                    }
+                    return record;
+                }
+            };
+        }
+
+        function fetchSegments() {
+            return fetch(API + '/data.bin')
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('HTTP ' + response.status);
+                    }
+                    return response.arrayBuffer();
+                })
+                .then(decodeSegments);
+        }
+
+        // One Leaflet polyline per segment on a shared canvas
+        function drawLeafletSegments(data) {
+            const renderer = L.canvas({ padding: 0.5 });
+            const binaryLayer = L.featureGroup().addTo(map);
+            const layers = [];
+            restyleSegments = () => layers.forEach((layer, i) => layer.setStyle(segmentStyle(i)));
+
+            const lines = Array.from({ length: data.count }, () => []);
+            for (let line = 0; line < data.lineSegments.length; line++) {
+                const latlngs = [];
+                for (let v = data.lineOffsets[line]; v < data.lineOffsets[line + 1]; v++) {
+                    latlngs.push([data.coords[2 * v + 1], data.coords[2 * v]]);
+                }
+                lines[data.lineSegments[line]].push(latlngs);
+            }
+
+            lines.forEach((parts, i) => {
+                if (parts.length === 0) {
+                    return;
+                }
+                const id = Number(data.ids[i]);
+                const layer = L.polyline(parts.length === 1 ? parts[0] : parts,
+                                         Object.assign({ renderer: renderer }, segmentStyle(i)));
+                const handle = {
+                    key: i,
+                    setStyle: style => layer.setStyle(style),
+                    reset: () => layer.setStyle(segmentStyle(i)),
+                    bringToFront: () => layer.bringToFront()
+                };
+                bindSegmentEvents(layer, () => {
+                    // The attributes came with the geometry, so a click needs no request,
+                    // except in a scenario, whose edited values only the server has
+                    if (!SCENARIO && !segmentDetails.has(id)) {
+                        segmentDetails.set(id, Promise.resolve(data.record(i)));
+                    }
+                    return [id, handle];
+                });
+                layers[i] = layer;
+                binaryLayer.addLayer(layer);
+            });
+
+            hideLoader();
+            if (binaryLayer.getLayers().length > 0) {
+                map.fitBounds(binaryLayer.getBounds());
+            }
+        }
+
+        // Whole network as one binary download, attributes included
+        function loadBinaryLayer() {
+            fetchSegments()
+                .then(drawLeafletSegments)
+                .catch(showLoadError);
+        }
+
+        // WebGL: every segment drawn by one instanced draw call over flat typed arrays. Each
+        // instance is the piece between two consecutive vertices, widened into a quad in the
+        // vertex shader, which also picks its style from per-segment textures
+        const GL_TEXTURE_WIDTH = 4096;
+        // Indexed by the vertex shader: the fixed styles, then one per score bucket
+        const GL_STYLES = [BASE_STYLE, WALKSHED_STYLE, OUTSIDE_WALKSHED_STYLE, FILTERED_OUT_STYLE, HOVER_STYLE, SELECTED_STYLE]
+            .concat(SCORE_COLORS.map(color => Object.assign({ color: color }, SCORE_STYLE)));
+        // Segment state bits in the state texture
+        const GL_FILTERED_OUT = 1, GL_OUTSIDE_WALKSHED = 2;
+
+        const GL_VERTEX_SHADER = `#version 300 es
+            precision highp float;
+            precision highp int;
+
+            uniform vec2 u_origin;
+            uniform float u_scale;
+            uniform vec2 u_size;
+            uniform int u_count;
+            uniform highp usampler2D u_states;
+            uniform highp sampler2D u_metric;
+            uniform bool u_metricOn;
+            uniform bool u_walkshedOn;
+            uniform vec2 u_range;
+            uniform int u_hovered;
+            uniform int u_selected;
+            uniform vec4 u_colors[${GL_STYLES.length}];
+            uniform float u_widths[${GL_STYLES.length}];
+
+            in vec2 a_corner;
+            in vec2 a_start;
+            in vec2 a_end;
+            in int a_segment;
+            out vec4 v_color;
+
+            // Index into GL_STYLES, with the same precedence as segmentStyle() and the handles
+            int styleOf(int i) {
+                if (i == u_selected) return 5;
+                if (i == u_hovered) return 4;
+                ivec2 texel = ivec2(i % ${GL_TEXTURE_WIDTH}, i / ${GL_TEXTURE_WIDTH});
+                uint state = texelFetch(u_states, texel, 0).r;
+                if ((state & ${GL_FILTERED_OUT}u) != 0u) return 3;
+                if ((state & ${GL_OUTSIDE_WALKSHED}u) != 0u) return 2;
+                if (!u_metricOn) return u_walkshedOn ? 1 : 0;
+                float span = u_range.y - u_range.x;
+                float t = (texelFetch(u_metric, texel, 0).r - u_range.x) / (span != 0.0 ? span : 1.0);
+                return 6 + clamp(int(floor(t * ${SCORE_COLORS.length}.0)), 0, ${SCORE_COLORS.length - 1});
+            }
+
+            void main() {
+                // The piece from a line's last vertex to the next line's first is not drawn
+                if (a_segment < 0) {
+                    gl_Position = vec4(0.0, 0.0, 2.0, 1.0);
+                    return;
+                }
+                int style = styleOf(a_segment);
+                vec2 start = (a_start - u_origin) * u_scale;
+                vec2 end = (a_end - u_origin) * u_scale;
+                float len = length(end - start);
+                vec2 dir = len > 0.0 ? (end - start) / len : vec2(1.0, 0.0);
+                float halfWidth = u_widths[style] / 2.0;
+                // Overrun both ends by half the width so the joins between pieces are filled
+                vec2 point = mix(start - dir * halfWidth, end + dir * halfWidth, a_corner.x)
+                           + vec2(-dir.y, dir.x) * halfWidth * a_corner.y;
+                // One depth per segment: with NOTEQUAL its overlapping pieces do not blend twice
+                float depth = float(a_segment + 1) / float(u_count + 2) * 2.0 - 1.0;
+                gl_Position = vec4(point.x / u_size.x * 2.0 - 1.0, 1.0 - point.y / u_size.y * 2.0, depth, 1.0);
+                v_color = u_colors[style];
+            }`;
+
+        const GL_FRAGMENT_SHADER = `#version 300 es
+            precision mediump float;
+            in vec4 v_color;
+            out vec4 color;
+
+            void main() {
+                color = vec4(v_color.rgb * v_color.a, v_color.a);
+            }`;
+
+        function glProgram(gl, vertexSource, fragmentSource) {
+            const program = gl.createProgram();
+            [[gl.VERTEX_SHADER, vertexSource], [gl.FRAGMENT_SHADER, fragmentSource]].forEach(([type, source]) => {
+                const shader = gl.createShader(type);
+                gl.shaderSource(shader, source);
+                gl.compileShader(shader);
+                if (!gl.getShaderParameter(shader, gl.COMPILE_STATUS)) {
+                    throw new Error('Shader: ' + gl.getShaderInfoLog(shader));
+                }
+                gl.attachShader(program, shader);
+            });
+            gl.linkProgram(program);
+            if (!gl.getProgramParameter(program, gl.LINK_STATUS)) {
+                throw new Error('Program: ' + gl.getProgramInfoLog(program));
+            }
+            return program;
+        }
+
+        // Web Mercator in pixels at zoom 0, as L.CRS.EPSG3857 projects
+        function mercatorX(lon) {
+            return (lon + 180) / 360 * 256;
+        }
+
+        function mercatorY(lat) {
+            return 128 - 128 / Math.PI * Math.log(Math.tan(Math.PI / 4 + lat * Math.PI / 360));
+        }
+
+        // Hover and click distance from a line in screen pixels, and line pieces per grid cell
+        const PICK_TOLERANCE = 5;
+        const PICK_PIECES_PER_CELL = 4;
+
+        // Uniform grid over the line pieces for picking, with each cell's pieces stored
+        // contiguously: starts[c] to starts[c + 1] in items
+        function pieceGrid(positions, pieceSegments) {
+            let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity, pieces = 0;
+            for (let v = 0; v < pieceSegments.length; v++) {
+                minX = Math.min(minX, positions[2 * v]);
+                maxX = Math.max(maxX, positions[2 * v]);
+                minY = Math.min(minY, positions[2 * v + 1]);
+                maxY = Math.max(maxY, positions[2 * v + 1]);
+                if (pieceSegments[v] >= 0) {
+                    pieces++;
+                }
+            }
+            const width = Math.max(maxX - minX, 0), height = Math.max(maxY - minY, 0);
+            // At most 4096 cells along the long side, so a network that is a single line stays small
+            const cell = Math.max(Math.sqrt(width * height * PICK_PIECES_PER_CELL / Math.max(pieces, 1)),
+                                  Math.max(width, height) / 4096, 1e-12);
+            const nx = Math.floor(width / cell) + 1, ny = Math.floor(height / cell) + 1;
+            const cellX = x => Math.min(nx - 1, Math.max(0, Math.floor((x - minX) / cell)));
+            const cellY = y => Math.min(ny - 1, Math.max(0, Math.floor((y - minY) / cell)));
+
+            // Count the pieces of each cell, then fill them in
+            const starts = new Uint32Array(nx * ny + 1);
+            let items = null, cursor = null;
+            for (let pass = 0; pass < 2; pass++) {
+                for (let k = 0; k < pieceSegments.length; k++) {
+                    if (pieceSegments[k] < 0) {
+                        continue;
+                    }
+                    const ax = positions[2 * k], ay = positions[2 * k + 1];
+                    const bx = positions[2 * k + 2], by = positions[2 * k + 3];
+                    const x1 = cellX(Math.max(ax, bx)), y1 = cellY(Math.max(ay, by));
+                    for (let cy = cellY(Math.min(ay, by)); cy <= y1; cy++) {
+                        for (let cx = cellX(Math.min(ax, bx)); cx <= x1; cx++) {
+                            if (pass === 0) {
+                                starts[cy * nx + cx + 1]++;
+                            } else {
+                                items[cursor[cy * nx + cx]++] = k;
+                            }
+                        }
+                    }
+                }
+                if (pass === 0) {
+                    for (let c = 0; c < nx * ny; c++) {
+                        starts[c + 1] += starts[c];
+                    }
+                    items = new Uint32Array(starts[nx * ny]);
+                    cursor = starts.slice(0, nx * ny);
+                }
+            }
+
+            return {
+                cells: nx * ny,
+                // Segment index of the nearest piece within tolerance of (x, y), or -1
+                nearest(x, y, tolerance) {
+                    let best = -1, bestDistance = tolerance * tolerance;
+                    const x0 = Math.max(0, Math.floor((x - tolerance - minX) / cell));
+                    const x1 = Math.min(nx - 1, Math.floor((x + tolerance - minX) / cell));
+                    const y0 = Math.max(0, Math.floor((y - tolerance - minY) / cell));
+                    const y1 = Math.min(ny - 1, Math.floor((y + tolerance - minY) / cell));
+                    for (let cy = y0; cy <= y1; cy++) {
+                        for (let cx = x0; cx <= x1; cx++) {
+                            for (let j = starts[cy * nx + cx]; j < starts[cy * nx + cx + 1]; j++) {
+                                const k = items[j];
+                                const ax = positions[2 * k], ay = positions[2 * k + 1];
+                                const dx = positions[2 * k + 2] - ax, dy = positions[2 * k + 3] - ay;
+                                const lengthSquared = dx * dx + dy * dy;
+                                const t = lengthSquared > 0
+                                    ? Math.max(0, Math.min(1, ((x - ax) * dx + (y - ay) * dy) / lengthSquared)) : 0;
+                                const ex = ax + t * dx - x, ey = ay + t * dy - y;
+                                if (ex * ex + ey * ey <= bestDistance) {
+                                    bestDistance = ex * ex + ey * ey;
+                                    best = pieceSegments[k];
+                                }
+                            }
+                        }
+                    }
+                    return best;
+                }
+            };
         }
 
-        @keyframes slideInLeft {
-            from { transform: translateX(-40px); opacity: 0; }
-            to { transform: translateX(0); opacity: 1; }
-        }
+        // A renderer in Leaflet's sense, like L.Canvas: the canvas moves with the map while
+        // panning and during zoom animations, and is only redrawn once the view settles
+        const SegmentGLLayer = L.Renderer.extend({
+            options: { padding: 0.25 },
+
+            initialize: function(data, options) {
+                L.Renderer.prototype.initialize.call(this, options);
+                this._count = data.count;
+                this._hovered = -1;
+                this._selected = -1;
+                this._pointed = -1;
+
+                const coords = data.coords, vertices = coords.length / 2;
+                let west = Infinity, south = Infinity, east = -Infinity, north = -Infinity;
+                for (let v = 0; v < vertices; v++) {
+                    west = Math.min(west, coords[2 * v]);
+                    east = Math.max(east, coords[2 * v]);
+                    south = Math.min(south, coords[2 * v + 1]);
+                    north = Math.max(north, coords[2 * v + 1]);
+                }
+                this._latLngBounds = vertices > 0 ? L.latLngBounds([south, west], [north, east]) : null;
+
+                // Zoom-0 pixels from the network's center: float32 then stays exact to a few millimetres
+                this._origin = vertices > 0 ? [mercatorX((west + east) / 2), mercatorY((south + north) / 2)] : [0, 0];
+                const positions = this._positions = new Float32Array(coords.length);
+                for (let v = 0; v < vertices; v++) {
+                    positions[2 * v] = mercatorX(coords[2 * v]) - this._origin[0];
+                    positions[2 * v + 1] = mercatorY(coords[2 * v + 1]) - this._origin[1];
+                }
+
+                // Segment of the piece starting at each vertex; -1 at a line's last vertex
+                const pieceSegments = this._pieceSegments = new Int32Array(vertices).fill(-1);
+                const lineOffsets = data.lineOffsets, lineSegments = data.lineSegments;
+                for (let line = 0; line < lineSegments.length; line++) {
+                    pieceSegments.fill(lineSegments[line], lineOffsets[line], Math.max(lineOffsets[line], lineOffsets[line + 1] - 1));
+                }
+                // A segment's lines are consecutive, so its vertices are one range
+                const segmentStarts = this._segmentStarts = new Uint32Array(data.count + 1);
+                for (let i = 0, line = 0; i <= data.count; i++) {
+                    while (line < lineSegments.length && lineSegments[line] < i) {
+                        line++;
+                    }
+                    segmentStarts[i] = lineOffsets[line];
+                }
+                this._grid = pieceGrid(positions, pieceSegments);
+
+                this._rows = Math.max(1, Math.ceil(data.count / GL_TEXTURE_WIDTH));
+                this._states = new Uint8Array(GL_TEXTURE_WIDTH * this._rows);
+                this._metric = new Float32Array(GL_TEXTURE_WIDTH * this._rows);
+            },
+
+            getBounds: function() {
+                return this._latLngBounds;
+            },
+
+            _initContainer: function() {
+                const canvas = this._container = document.createElement('canvas');
+                const gl = this._gl = canvas.getContext('webgl2', { antialias: true, premultipliedAlpha: true });
+                if (!gl) {
+                    throw new Error('WebGL2 is not available');
+                }
+                const program = glProgram(gl, GL_VERTEX_SHADER, GL_FRAGMENT_SHADER);
+                gl.useProgram(program);
+                this._locations = {};
+                ['u_origin', 'u_scale', 'u_size', 'u_count', 'u_states', 'u_metric', 'u_metricOn', 'u_walkshedOn',
+                 'u_range', 'u_hovered', 'u_selected', 'u_colors', 'u_widths'].forEach(name => {
+                    this._locations[name] = gl.getUniformLocation(program, name);
+                });
+
+                const buffer = data => {
+                    const buffer = gl.createBuffer();
+                    gl.bindBuffer(gl.ARRAY_BUFFER, buffer);
+                    gl.bufferData(gl.ARRAY_BUFFER, data, gl.STATIC_DRAW);
+                    return buffer;
+                };
+                // The six corners of a piece's quad: (along, across)
+                buffer(new Float32Array([0, -1, 1, -1, 0, 1, 0, 1, 1, -1, 1, 1]));
+                this._attributes = {};
+                ['a_corner', 'a_start', 'a_end', 'a_segment'].forEach(name => {
+                    const location = this._attributes[name] = gl.getAttribLocation(program, name);
+                    gl.enableVertexAttribArray(location);
+                    gl.vertexAttribDivisor(location, name === 'a_corner' ? 0 : 1);
+                });
+                gl.vertexAttribPointer(this._attributes.a_corner, 2, gl.FLOAT, false, 0, 0);
+                this._positionBuffer = buffer(this._positions);
+                this._segmentBuffer = buffer(this._pieceSegments);
+
+                // Segment i is texel (i % GL_TEXTURE_WIDTH, i / GL_TEXTURE_WIDTH); each texture keeps its own unit
+                [[0, gl.R8UI, 'u_states'], [1, gl.R32F, 'u_metric']].forEach(([unit, format, name]) => {
+                    gl.activeTexture(gl.TEXTURE0 + unit);
+                    gl.bindTexture(gl.TEXTURE_2D, gl.createTexture());
+                    gl.texStorage2D(gl.TEXTURE_2D, 1, format, GL_TEXTURE_WIDTH, this._rows);
+                    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.NEAREST);
+                    gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.NEAREST);
+                    gl.uniform1i(this._locations[name], unit);
+                });
+
+                const colors = [], widths = [];
+                GL_STYLES.forEach(style => {
+                    const hex = parseInt(style.color.slice(1), 16);
+                    colors.push((hex >> 16) / 255, ((hex >> 8) & 255) / 255, (hex & 255) / 255, style.opacity);
+                    widths.push(style.weight);
+                });
+                gl.uniform4fv(this._locations.u_colors, colors);
+                gl.uniform1fv(this._locations.u_widths, widths);
+                gl.uniform1i(this._locations.u_count, this._count);
+                gl.enable(gl.BLEND);
+                gl.blendFunc(gl.ONE, gl.ONE_MINUS_SRC_ALPHA);
+                gl.depthFunc(gl.NOTEQUAL);
+                this._uploadStyles();
 
-        #sidebar-header {
-            padding: 28px;
-            background: var(--primary-gradient);
-            color: white;
-            position: relative;
-            overflow: hidden;
-        }
+                L.DomEvent.on(canvas, 'mousemove', this._onMouseMove, this);
+                L.DomEvent.on(canvas, 'mouseout', this._onMouseOut, this);
+                L.DomEvent.on(canvas, 'click', this._onClick, this);
+            },
 
-        #sidebar-header::before {
-            content: '';
-            position: absolute;
-            top: -50%;
-            right: -50%;
-            width: 200%;
-            height: 200%;
-            background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
-            animation: pulse 4s ease-in-out infinite;
-        }
+            _destroyContainer: function() {
+                L.Util.cancelAnimFrame(this._frame);
+                this._frame = null;
+                L.DomEvent.off(this._container);
+                L.DomUtil.remove(this._container);
+                delete this._gl;
+                delete this._container;
+            },
 
-        @keyframes pulse {
-            0%, 100% { transform: scale(1); opacity: 0.5; }
-            50% { transform: scale(1.1); opacity: 0.8; }
-        }
+            _update: function() {
+                L.Renderer.prototype._update.call(this);
+                const b = this._bounds, size = b.getSize(), canvas = this._container;
+                const ratio = Math.min(window.devicePixelRatio || 1, 2);
+                L.DomUtil.setPosition(canvas, b.min);
+                canvas.width = Math.round(size.x * ratio);
+                canvas.height = Math.round(size.y * ratio);
+                canvas.style.width = size.x + 'px';
+                canvas.style.height = size.y + 'px';
 
-        #sidebar-header h2 { 
-            margin: 0; 
-            font-size: 1.4rem; 
-            font-weight: 700;
-            font-family: 'Space Grotesk', sans-serif;
-            letter-spacing: -0.02em;
-            position: relative;
-            z-index: 1;
-        }
+                // The canvas's top-left corner in zoom-0 pixels from the origin, and the zoom's scale
+                this._scale = this._map.getZoomScale(this._zoom, 0);
+                const topLeft = b.min.add(this._map.getPixelOrigin());
+                this._view = [topLeft.x / this._scale - this._origin[0], topLeft.y / this._scale - this._origin[1]];
+                this._draw();
+            },
 
-        #sidebar-header p { 
-            margin: 8px 0 0 0; 
-            font-size: 0.9rem; 
-            opacity: 0.95;
-            font-weight: 400;
-            position: relative;
-            z-index: 1;
-        }
+            // Segment states and metric from the page's filter, walkshed and scores
+            _uploadStyles: function() {
+                const gl = this._gl, count = this._count, states = this._states;
+                states.fill(walkshed !== null ? GL_OUTSIDE_WALKSHED : 0, 0, count);
+                if (walkshed !== null) {
+                    walkshed.forEach(i => { states[i] = 0; });
+                }
+                if (segmentFilter !== null) {
+                    for (let i = 0; i < count; i++) {
+                        if (!passesFilter(i)) {
+                            states[i] |= GL_FILTERED_OUT;
+                        }
+                    }
+                }
+                gl.activeTexture(gl.TEXTURE0);
+                gl.texSubImage2D(gl.TEXTURE_2D, 0, 0, 0, GL_TEXTURE_WIDTH, this._rows, gl.RED_INTEGER, gl.UNSIGNED_BYTE, states);
+                if (segmentScores !== null) {
+                    this._metric.set(segmentScores.subarray(0, count));
+                    gl.activeTexture(gl.TEXTURE1);
+                    gl.texSubImage2D(gl.TEXTURE_2D, 0, 0, 0, GL_TEXTURE_WIDTH, this._rows, gl.RED, gl.FLOAT, this._metric);
+                }
+                gl.uniform1i(this._locations.u_metricOn, segmentScores !== null ? 1 : 0);
+                gl.uniform1i(this._locations.u_walkshedOn, walkshed !== null ? 1 : 0);
+                gl.uniform2f(this._locations.u_range, scoreRange[0], scoreRange[1]);
+            },
 
-        #sidebar-content {
-            padding: 28px;
-            overflow-y: auto;
-            flex: 1;
-        }
+            restyle: function() {
+                if (this._gl) {
+                    this._uploadStyles();
+                    this.redraw();
+                }
+            },
 
-        #sidebar-content::-webkit-scrollbar { width: 6px; }
-        #sidebar-content::-webkit-scrollbar-track { background: transparent; }
-        #sidebar-content::-webkit-scrollbar-thumb { 
-            background: linear-gradient(180deg, #2563eb, #7c3aed); 
-            border-radius: 10px; 
-        }
+            redraw: function() {
+                if (this._gl && !this._frame) {
+                    this._frame = L.Util.requestAnimFrame(this._draw, this);
+                }
+                return this;
+            },
 
-        /* Loading Overlay */
-        #loader {
-            position: fixed;
-            top: 0; left: 0; width: 100%; height: 100%;
-            background: linear-gradient(135deg, #2563eb 0%, #7c3aed 100%);
-            z-index: 9999;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            color: white;
-        }
+            _draw: function() {
+                L.Util.cancelAnimFrame(this._frame);
+                this._frame = null;
+                const gl = this._gl, size = this._bounds.getSize(), starts = this._segmentStarts;
+                gl.viewport(0, 0, gl.drawingBufferWidth, gl.drawingBufferHeight);
+                gl.clearColor(0, 0, 0, 0);
+                gl.clear(gl.COLOR_BUFFER_BIT | gl.DEPTH_BUFFER_BIT);
+                gl.uniform2f(this._locations.u_origin, this._view[0], this._view[1]);
+                gl.uniform1f(this._locations.u_scale, this._scale);
+                gl.uniform2f(this._locations.u_size, size.x, size.y);
+                gl.uniform1i(this._locations.u_hovered, this._hovered);
+                gl.uniform1i(this._locations.u_selected, this._selected);
 
-        .loader-content {
-            text-align: center;
-            animation: fadeInUp 0.6s ease-out;
-        }
+                gl.enable(gl.DEPTH_TEST);
+                this._drawPieces(0, this._pieceSegments.length - 1);
+                // Hovered and selected segments again on top, as bringToFront() does for Leaflet layers
+                gl.disable(gl.DEPTH_TEST);
+                [this._hovered, this._selected].forEach(i => {
+                    if (i >= 0) {
+                        this._drawPieces(starts[i], starts[i + 1] - starts[i] - 1);
+                    }
+                });
+            },
 
-        @keyframes fadeInUp {
-            from { transform: translateY(20px); opacity: 0; }
-            to { transform: translateY(0); opacity: 1; }
-        }
+            // Draws the pieces starting at vertices first .. first + count - 1
+            _drawPieces: function(first, count) {
+                if (count <= 0) {
+                    return;
+                }
+                const gl = this._gl, attributes = this._attributes;
+                gl.bindBuffer(gl.ARRAY_BUFFER, this._positionBuffer);
+                gl.vertexAttribPointer(attributes.a_start, 2, gl.FLOAT, false, 8, first * 8);
+                gl.vertexAttribPointer(attributes.a_end, 2, gl.FLOAT, false, 8, first * 8 + 8);
+                gl.bindBuffer(gl.ARRAY_BUFFER, this._segmentBuffer);
+                gl.vertexAttribIPointer(attributes.a_segment, 1, gl.INT, 4, first * 4);
+                gl.drawArraysInstanced(gl.TRIANGLES, 0, 6, count);
+            },
 
-        .spinner {
-            width: 60px; 
-            height: 60px;
-            border: 4px solid rgba(255, 255, 255, 0.2);
-            border-top: 4px solid white;
-            border-radius: 50%;
-            animation: spin 1s cubic-bezier(0.68, -0.55, 0.265, 1.55) infinite;
-            margin-bottom: 24px;
-        }
+            // Same shape as the other loaders' handles, see bindSegmentEvents()
+            handle: function(i) {
+                return {
+                    key: i,
+                    setStyle: style => {
+                        if (style === SELECTED_STYLE) {
+                            this._selected = i;
+                        } else {
+                            this._hovered = i;
+                        }
+                        this.redraw();
+                    },
+                    reset: () => {
+                        if (this._selected === i) {
+                            this._selected = -1;
+                        }
+                        if (this._hovered === i) {
+                            this._hovered = -1;
+                        }
+                        this.redraw();
+                    },
+                    bringToFront: () => {}
+                };
+            },
 
-        @keyframes spin { 
-            0% { transform: rotate(0deg); } 
-            100% { transform: rotate(360deg); } 
-        }
+            // Index of the segment under a container point, or -1
+            pick: function(point) {
+                const p = this._map.project(this._map.containerPointToLatLng(point), 0);
+                return this._grid.nearest(p.x - this._origin[0], p.y - this._origin[1],
+                                          PICK_TOLERANCE / this._map.getZoomScale(this._map.getZoom(), 0));
+            },
 
-        #loader-text {
-            font-size: 1.3rem;
-            font-weight: 600;
-            font-family: 'Space Grotesk', sans-serif;
-            margin-bottom: 8px;
-        }
+            _onMouseMove: function(e) {
+                if (!this._map.dragging || !this._map.dragging.moving()) {
+                    this._pointAt(this.pick(this._map.mouseEventToContainerPoint(e)), e);
+                }
+            },
 
-        .loader-subtitle {
-            font-size: 0.95rem;
-            opacity: 0.9;
-        }
+            _onMouseOut: function(e) {
+                this._pointAt(-1, e);
+            },
 
-        /* Metrics Grid */
-        .metric-grid {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 14px;
-            margin-bottom: 24px;
-        }
+            // Fires mouseout and mouseover as the segment under the pointer changes
+            _pointAt: function(i, e) {
+                if (i === this._pointed) {
+                    return;
+                }
+                if (this._pointed >= 0) {
+                    this.fire('mouseout', { index: this._pointed, originalEvent: e });
+                }
+                this._pointed = i;
+                if (i >= 0) {
+                    this.fire('mouseover', { index: i, originalEvent: e });
+                    L.DomUtil.addClass(this._container, 'leaflet-interactive');
+                } else {
+                    L.DomUtil.removeClass(this._container, 'leaflet-interactive');
+                }
+            },
 
-        .metric-card {
-            background: linear-gradient(135deg, rgba(255, 255, 255, 0.9) 0%, rgba(255, 255, 255, 0.6) 100%);
-            padding: 18px;
-            border-radius: 16px;
-            border: 1px solid rgba(37, 99, 235, 0.1);
-            box-shadow: var(--shadow-sm);
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-            position: relative;
-            overflow: hidden;
-        }
+            _onClick: function(e) {
+                if (this._map.dragging && this._map.dragging.moved()) {
+                    return;
+                }
+                const i = this.pick(this._map.mouseEventToContainerPoint(e));
+                if (i >= 0) {
+                    // Keep the map's own click handler from clearing the selection
+                    L.DomEvent.stopPropagation(e);
+                    this.fire('click', { index: i, originalEvent: e, latlng: this._map.mouseEventToLatLng(e) });
+                }
+            }
+        });
 
-        .metric-card::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            height: 3px;
-            background: var(--primary-gradient);
-            transform: scaleX(0);
-            transition: transform 0.3s ease;
-        }
+        // The binary download drawn with WebGL; without WebGL2, one Leaflet polyline per segment
+        function loadWebGLLayer() {
+            fetchSegments()
+                .then(data => {
+                    const glLayer = new SegmentGLLayer(data);
+                    try {
+                        glLayer.addTo(map);
+                    } catch (err) {
+                        console.warn('Drawing with Leaflet instead of WebGL:', err);
+                        map.removeLayer(glLayer);
+                        drawLeafletSegments(data);
+                        return;
+                    }
+                    restyleSegments = () => glLayer.restyle();
+                    bindSegmentEvents(glLayer, e => {
+                        const id = Number(data.ids[e.index]);
+                        if (!SCENARIO && !segmentDetails.has(id)) {
+                            segmentDetails.set(id, Promise.resolve(data.record(e.index)));
+                        }
+                        return [id, glLayer.handle(e.index)];
+                    });
 
-        .metric-card:hover {
-            transform: translateY(-4px);
-            box-shadow: var(--shadow-md);
-            border-color: rgba(37, 99, 235, 0.3);
+                    hideLoader();
+                    if (glLayer.getBounds()) {
+                        map.fitBounds(glLayer.getBounds());
+                    }
+                })
+                .catch(showLoadError);
         }
 
-        .metric-card:hover::before {
-            transform: scaleX(1);
-        }
+        // Vector tiles: only the tiles in view are fetched and drawn
+        function loadTileLayer() {
+            // Tile features carry ID_TRC as their id and the segment index as 'i'
+            const segmentIds = new Map();
+            const tileLayer = L.vectorGrid.protobuf((DATASET === null ? '' : API) + '/tiles/{z}/{x}/{y}.mvt', {
+                rendererFactory: L.canvas.tile,
+                interactive: true,
+                minNativeZoom: {{ tile_min_zoom }},
+                maxNativeZoom: {{ tile_max_zoom }},
+                maxZoom: 20,
+                getFeatureId: f => {
+                    segmentIds.set(f.properties.i, f.id);
+                    return f.properties.i;
+                },
+                vectorTileLayerStyles: { segments: properties => segmentStyle(properties.i) }
+            });
+            restyleSegments = () => tileLayer.redraw();
 
-        .metric-label { 
-            font-size: 0.75rem; 
-            color: var(--text-light); 
-            text-transform: uppercase; 
-            letter-spacing: 0.08em;
-            font-weight: 600;
-            margin-bottom: 8px;
-        }
+            bindSegmentEvents(tileLayer, e => {
+                const i = e.layer.properties.i;
+                return [segmentIds.get(i), {
+                    key: i,
+                    setStyle: style => tileLayer.setFeatureStyle(i, style),
+                    reset: () => tileLayer.resetFeatureStyle(i),
+                    bringToFront: () => {}
+                }];
+            });
 
-        .metric-value { 
-            font-size: 1.5rem; 
-            font-weight: 700; 
-            background: var(--primary-gradient);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            font-family: 'Space Grotesk', sans-serif;
+            tileLayer.once('load', hideLoader);
+            tileLayer.once('tileerror', showLoadError);
+            tileLayer.addTo(map);
         }
 
-        /* Empty State */
-        .empty-state {
-            text-align: center;
-            padding: 60px 24px;
-            color: var(--text-mid);
-            background: linear-gradient(135deg, rgba(37, 99, 235, 0.05) 0%, rgba(124, 58, 237, 0.05) 100%);
-            border-radius: 20px;
-            border: 2px dashed rgba(37, 99, 235, 0.25);
-            animation: float 3s ease-in-out infinite;
-        }
+        // Viewport loading: only segments inside the visible bounds are fetched
+        function loadViewportLayer() {
+            const loaded = new Map();
+            const viewportLayer = L.geoJSON(null, {
+                renderer: L.canvas({ padding: 0.5 }),
+                style: function(feature) {
+                    return segmentStyle(feature.properties.i);
+                },
+                onEachFeature: function(feature, layer) {
+                    const handle = {
+                        key: feature.properties.i,
+                        setStyle: style => layer.setStyle(style),
+                        reset: () => viewportLayer.resetStyle(layer),
+                        bringToFront: () => layer.bringToFront()
+                    };
+                    loaded.set(feature.properties.i, layer);
+                    bindSegmentEvents(layer, () => [feature.id, handle]);
+                }
+            }).addTo(map);
+            restyleSegments = () => viewportLayer.resetStyle();
 
-        @keyframes float {
-            0%, 100% { transform: translateY(0); }
-            50% { transform: translateY(-10px); }
-        }
+            let pending = null;
+            let loadedLevel = null;
+            function refresh() {
+                const b = map.getBounds().pad(0.25);
+                const bbox = [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].join(',');
+                const level = detailLevel(map.getZoom());
+                if (pending) {
+                    pending.abort();
+                }
+                pending = new AbortController();
 
-        .empty-icon { 
-            font-size: 3.5rem; 
-            margin-bottom: 16px; 
-            display: block;
-            animation: bounce 2s ease-in-out infinite;
-        }
+                fetch(API + '/segments?bbox=' + bbox + '&zoom=' + level, { signal: pending.signal })
+                    .then(response => response.json())
+                    .then(data => {
+                        hideLoader();
+                        // Geometry drawn at another level of detail is replaced, not kept
+                        if (level !== loadedLevel) {
+                            resetSelection();
+                            viewportLayer.clearLayers();
+                            loaded.clear();
+                            loadedLevel = level;
+                        }
+                        const visible = new Set(data.features.map(f => f.properties.i));
+                        loaded.forEach((layer, i) => {
+                            if (!visible.has(i) && !(highlightLayer && highlightLayer.key === i)) {
+                                viewportLayer.removeLayer(layer);
+                                loaded.delete(i);
+                            }
+                        });
+                        viewportLayer.addData(data.features.filter(f => !loaded.has(f.properties.i)));
+                    })
+                    .catch(err => {
+                        if (err.name !== 'AbortError') {
+                            showLoadError(err);
+                        }
+                    });
+            }
 
-        @keyframes bounce {
-            0%, 100% { transform: translateY(0); }
-            50% { transform: translateY(-10px); }
+            map.on('moveend', refresh);
+            refresh();
         }
 
-        .empty-state p {
-            font-size: 1rem;
-            line-height: 1.6;
-            margin: 0;
-            font-weight: 500;
-        }
+        const loaders = {
+            tiles: loadTileLayer,
+            geojson: () => loadGeoJsonLayer(false),
+            stream: () => loadGeoJsonLayer(true),
+            binary: loadBinaryLayer,
+            webgl: loadWebGLLayer,
+            viewport: loadViewportLayer
+        };
 
-        /* Chart Container */
-        #chart-div { 
-            height: 380px; 
-            width: 100%;
-            background: linear-gradient(135deg, rgba(255, 255, 255, 0.5) 0%, rgba(255, 255, 255, 0.2) 100%);
-            border-radius: 16px;
-            padding: 16px;
-            box-shadow: inset 0 2px 8px rgba(0, 0, 0, 0.05);
+        // The server answers before its data is loaded; this page then has none, so
+        // poll /readyz and reload once the data is there
+        function waitForData() {
+            const url = '/readyz' + (DATASET === null ? '' : '?dataset=' + encodeURIComponent(DATASET));
+            fetch(url, { cache: 'no-store' })
+                .then(response => {
+                    const retry = Number(response.headers.get('Retry-After')) || 2;
+                    return response.json().then(data => [data, retry]);
+                })
+                .then(([data, retry]) => {
+                    if (data.status === 'ready') {
+                        location.reload();
+                        return;
+                    }
+                    const subtitle = document.getElementById('loader-subtitle');
+                    if (data.status === 'error') {
+                        document.getElementById('loader-text').innerText = 'Error loading data';
+                        subtitle.innerText = data.error;
+                    } else {
+                        subtitle.innerText = 'Preparing street analytics...' +
+                            (data.loading_s !== undefined ? ' (' + Math.round(data.loading_s) + 's)' : '');
+                    }
+                    setTimeout(waitForData, retry * 1000);
+                })
+                .catch(() => setTimeout(waitForData, 2000));
         }
 
-        /* Stats Summary Badge */
-        .stats-badge {
-            display: inline-flex;
-            align-items: center;
-            gap: 8px;
-            background: var(--success-gradient);
-            color: white;
-            padding: 10px 20px;
-            border-radius: 100px;
-            font-size: 0.85rem;
-            font-weight: 600;
-            margin-bottom: 20px;
-            box-shadow: var(--shadow-sm);
-            animation: slideIn 0.6s ease-out;
+        if (DATA_VERSION === null) {
+            waitForData();
+        } else {
+            loaders[DATA_SOURCE]();
         }
 
-        @keyframes slideIn {
-            from { transform: translateX(-20px); opacity: 0; }
-            to { transform: translateX(0); opacity: 1; }
+        map.on('click', function() {
+            resetSelection();
+        });
+
+        // Network-wide score map, recomputed server-side for the chosen weights
+        const weightInputs = {};
+        let scoreTimer = null;
+
+        function buildWeightControls() {
+            const container = document.getElementById('weight-controls');
+            SCORE_METRICS.forEach(key => {
+                const row = document.createElement('label');
+                row.className = 'weight-row';
+                row.innerHTML = '<span></span><input type="range" min="0" max="5" step="0.5" value="1"><output>1</output>';
+                row.querySelector('span').innerText = METRIC_LABELS[key] || key;
+                const input = row.querySelector('input');
+                input.addEventListener('input', () => {
+                    row.querySelector('output').innerText = input.value;
+                    clearTimeout(scoreTimer);
+                    scoreTimer = setTimeout(updateScores, 200);
+                });
+                weightInputs[key] = input;
+                container.appendChild(row);
+            });
         }
 
-        .stats-badge-icon {
-            font-size: 1.2rem;
+        function applySegmentStyles() {
+            restyleSegments();
+            if (highlightLayer) {
+                highlightLayer.setStyle(SELECTED_STYLE);
+            }
         }
 
-        /* Leaflet Custom Controls */
-        .leaflet-control-zoom {
-            border: none !important;
-            box-shadow: var(--shadow-md) !important;
-            border-radius: 12px !important;
-            overflow: hidden;
-            background: var(--bg-glass-dark) !important;
-            backdrop-filter: blur(20px) !important;
+        function updateScores() {
+            const enabled = document.getElementById('score-toggle').checked;
+            document.getElementById('score-weights').style.display = enabled ? 'block' : 'none';
+            if (!enabled) {
+                segmentScores = null;
+                applySegmentStyles();
+                return;
+            }
+
+            const weights = SCORE_METRICS.map(key => weightInputs[key].value).join(',');
+            fetch(SCENARIO_API + '/score?weights=' + weights)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Score request failed: HTTP ' + response.status);
+                    }
+                    return response.arrayBuffer();
+                })
+                .then(buffer => {
+                    const scores = new Float32Array(buffer);
+                    let lo = Infinity, hi = -Infinity;
+                    for (let i = 0; i < scores.length; i++) {
+                        if (scores[i] < lo) lo = scores[i];
+                        if (scores[i] > hi) hi = scores[i];
+                    }
+                    segmentScores = scores;
+                    scoreRange = [lo, hi];
+                    applySegmentStyles();
+                })
+                .catch(err => console.error(err));
         }
 
-        .leaflet-control-zoom a {
-            width: 40px !important;
-            height: 40px !important;
-            line-height: 40px !important;
-            font-size: 20px !important;
-            font-weight: 700 !important;
-            color: #2563eb !important;
-            background: transparent !important;
-            border: none !important;
-            transition: all 0.2s ease !important;
+        buildWeightControls();
+        document.getElementById('score-toggle').addEventListener('change', updateScores);
+
+        // Attribute filters, evaluated server-side against precomputed column indexes
+        const filterInputs = {};
+        let filterTimer = null;
+        let filterRequest = null;
+
+        function scheduleFilter() {
+            clearTimeout(filterTimer);
+            filterTimer = setTimeout(updateFilter, 100);
         }
 
-        .leaflet-control-zoom a:hover {
-            background: rgba(37, 99, 235, 0.1) !important;
-            color: #7c3aed !important;
+        function buildFilterControls() {
+            const types = document.getElementById('filter-types');
+            STREET_TYPES.forEach(label => {
+                const item = document.createElement('label');
+                item.innerHTML = '<input type="checkbox" checked> <span></span>';
+                item.querySelector('span').innerText = label;
+                item.querySelector('input').addEventListener('change', scheduleFilter);
+                item.querySelector('input').dataset.label = label;
+                types.appendChild(item);
+            });
+
+            // One percentile bound per metric: at least (>=) or at most (<=)
+            const metrics = document.getElementById('filter-metrics');
+            SCORE_METRICS.forEach(key => {
+                const row = document.createElement('label');
+                row.className = 'filter-row';
+                row.innerHTML = '<span></span><select><option value="min">&ge;</option><option value="max">&le;</option></select>' +
+                    '<input type="range" min="0" max="100" step="5" value="0"><output>p0</output>';
+                row.querySelector('span').innerText = METRIC_LABELS[key] || key;
+                const select = row.querySelector('select');
+                const input = row.querySelector('input');
+                select.addEventListener('change', () => {
+                    input.value = select.value === 'min' ? 0 : 100;
+                    row.querySelector('output').innerText = 'p' + input.value;
+                    scheduleFilter();
+                });
+                input.addEventListener('input', () => {
+                    row.querySelector('output').innerText = 'p' + input.value;
+                    scheduleFilter();
+                });
+                filterInputs[key] = { select, input };
+                metrics.appendChild(row);
+            });
         }
 
-        /* Responsive Design */
-        @media (max-width: 768px) {
-            #sidebar {
-                width: calc(100% - 48px);
-                left: 24px;
-                right: 24px;
-                max-height: 50vh;
+        function filterQuery() {
+            const params = [];
+            const checked = Array.from(document.querySelectorAll('#filter-types input'))
+                .filter(box => box.checked).map(box => box.dataset.label);
+            if (checked.length < STREET_TYPES.length) {
+                params.push('TYP_VOIE=' + encodeURIComponent(checked.join(',')));
             }
+            SCORE_METRICS.forEach(key => {
+                const { select, input } = filterInputs[key];
+                if (select.value === 'min' && input.value > 0) {
+                    params.push(encodeURIComponent(key) + '=p' + input.value + ':');
+                } else if (select.value === 'max' && input.value < 100) {
+                    params.push(encodeURIComponent(key) + '=:p' + input.value);
+                }
+            });
+            return params.join('&');
+        }
 
-            #header-bar {
-                left: 24px;
-                right: 24px;
-                transform: none;
-                border-radius: 20px;
+        function updateFilter() {
+            const enabled = document.getElementById('filter-toggle').checked;
+            document.getElementById('filter-controls').style.display = enabled ? 'block' : 'none';
+            const summary = document.getElementById('filter-summary');
+            const query = enabled ? filterQuery() : '';
+            if (filterRequest) {
+                filterRequest.abort();
+                filterRequest = null;
+            }
+            if (!query) {
+                segmentFilter = null;
+                summary.innerText = '';
+                applySegmentStyles();
+                return;
             }
 
-            .metric-grid {
-                grid-template-columns: 1fr;
+            filterRequest = new AbortController();
+            fetch(API + '/query?' + query, { signal: filterRequest.signal })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Filter request failed: HTTP ' + response.status);
+                    }
+                    summary.innerText = Number(response.headers.get('X-Match-Count')).toLocaleString() + ' of ' +
+                        Number(response.headers.get('X-Segment-Count')).toLocaleString() + ' segments match';
+                    return response.arrayBuffer();
+                })
+                .then(buffer => {
+                    segmentFilter = new Uint8Array(buffer);
+                    applySegmentStyles();
+                })
+                .catch(err => {
+                    if (err.name !== 'AbortError') {
+                        console.error(err);
+                    }
+                });
+        }
+
+        buildFilterControls();
+        document.getElementById('filter-toggle').addEventListener('change', updateFilter);
+
+        // Summary of the streets in view, answered from grid aggregates built at load
+        let statsRequest = null;
+
+        function updateStats() {
+            const enabled = document.getElementById('stats-toggle').checked;
+            document.getElementById('stats-view').style.display = enabled ? 'block' : 'none';
+            if (statsRequest) {
+                statsRequest.abort();
+                statsRequest = null;
+            }
+            if (!enabled) {
+                return;
             }
+
+            const bounds = map.getBounds();
+            const bbox = [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()].join(',');
+            statsRequest = new AbortController();
+            fetch(SCENARIO_API + '/stats?by=type&histograms=0&bbox=' + bbox, { signal: statsRequest.signal })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Stats request failed: HTTP ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(renderStats)
+                .catch(err => {
+                    if (err.name !== 'AbortError') {
+                        console.error(err);
+                    }
+                });
         }
-    </style>
-</head>
-<body>
 
-    <div id="loader">
-        <div class="loader-content">
-            <div class="spinner"></div>
-            <div id="loader-text">Loading Urban Data</div>
-            <div class="loader-subtitle">Preparing street analytics...</div>
-        </div>
-    </div>
+        function renderStats(data) {
+            const total = data.total;
+            const types = data.groups.slice().sort((a, b) => b.length_m - a.length_m).slice(0, 3)
+                .map(group => (group.key || 'Other') + ' ' + Math.round(100 * group.length_m / total.length_m) + '%');
+            document.getElementById('stats-summary').innerText = total.segments.toLocaleString() + ' segments, ' +
+                (total.length_m / 1000).toFixed(1) + ' km' + (types.length ? ' (' + types.join(', ') + ')' : '');
 
-    <div id="header-bar">
-        <div class="header-icon">🗺️</div>
-        <div class="header-content">
-            <h1>Urban Walkability Analytics</h1>
-            <p>Interactive Street Segment Analysis Dashboard</p>
-        </div>
-    </div>
+            const table = document.getElementById('stats-table');
+            table.innerHTML = '<tr><th></th><th>Mean</th><th>Median</th></tr>';
+            SCORE_METRICS.forEach(key => {
+                const metric = total.metrics[key];
+                const row = table.insertRow();
+                row.insertCell().innerText = METRIC_LABELS[key] || key;
+                row.insertCell().innerText = metric ? metric.mean.toFixed(2) : '-';
+                row.insertCell().innerText = metric ? metric.quantiles.p50.toFixed(2) : '-';
+            });
+        }
 
-    <div id="sidebar">
-        <div id="sidebar-header">
-            <h2>Segment Details</h2>
-            <p>Click any street to explore metrics</p>
-        </div>
-        <div id="sidebar-content">
-            <div id="details-container" style="display: none;">
-                <div class="stats-badge">
-                    <span class="stats-badge-icon">📊</span>
-                    <span>Selected Segment Analysis</span>
-                </div>
-                
-                <div class="metric-grid">
-                    <div class="metric-card">
-                        <div class="metric-label">Street ID</div>
-                        <div class="metric-value" id="val-id">-</div>
-                    </div>
-                    <div class="metric-card">
-                        <div class="metric-label">Length</div>
-                        <div class="metric-value" id="val-len">-</div>
-                    </div>
-                    <div class="metric-card">
-                        <div class="metric-label">Type</div>
-                        <div class="metric-value" id="val-type">-</div>
-                    </div>
-                    <div class="metric-card">
-                        <div class="metric-label">Overall Score</div>
-                        <div class="metric-value" id="val-avg">-</div>
-                    </div>
-                </div>
-                <div id="chart-div"></div>
-            </div>
+        document.getElementById('stats-toggle').addEventListener('change', updateStats);
+        map.on('moveend', () => {
+            if (document.getElementById('stats-toggle').checked) {
+                updateStats();
+            }
+        });
 
-            <div id="empty-state" class="empty-state">
-                <span class="empty-icon">🎯</span>
-                <p>Select any street segment on the map<br>to view detailed walkability metrics</p>
-            </div>
-        </div>
-    </div>
+        // Walkshed: streets reachable on foot within N minutes along the network
+        let walkshedOrigin = null;
+        let walkshedLatLng = null;
 
-    <div id="map"></div>
+        function loadWalkshed(latlng) {
+            walkshedLatLng = latlng;
+            const minutes = document.getElementById('walkshed-minutes').value;
+            const summary = document.getElementById('walkshed-summary');
+            summary.innerText = 'Computing walkshed...';
 
-    <script>
-        // Init Map
-        const map = L.map('map', {
-            zoomControl: false
-        }).setView({{ center }}, 13);
-        
-        L.control.zoom({ position: 'bottomright' }).addTo(map);
+            fetch(API + '/isochrone?lat=' + latlng.lat + '&lon=' + latlng.lng + '&minutes=' + minutes)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Walkshed request failed: HTTP ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    walkshed = new Set(data.segments);
+                    if (walkshedOrigin) {
+                        map.removeLayer(walkshedOrigin);
+                    }
+                    walkshedOrigin = L.circleMarker(data.origin, {
+                        radius: 7, color: 'white', weight: 2, fillColor: '#0d9488', fillOpacity: 1
+                    }).addTo(map);
+                    summary.innerText = data.segments.length + ' street segments, ' +
+                        (data.reachable_length_m / 1000).toFixed(1) + ' km walkable in ' + data.minutes + ' min';
+                    document.getElementById('walkshed-clear').style.display = 'inline-block';
+                    applySegmentStyles();
+                })
+                .catch(err => {
+                    summary.innerText = '';
+                    console.error(err);
+                });
+        }
 
-        // Enhanced base map
-        L.tileLayer('https://{s}.basemaps.cartocdn.com/rastertiles/voyager/{z}/{x}/{y}{r}.png', {
-            attribution: '&copy; OpenStreetMap &copy; CARTO',
-            subdomains: 'abcd',
-            maxZoom: 20
-        }).addTo(map);
+        function clearWalkshed() {
+            walkshed = null;
+            walkshedLatLng = null;
+            if (walkshedOrigin) {
+                map.removeLayer(walkshedOrigin);
+                walkshedOrigin = null;
+            }
+            document.getElementById('walkshed-summary').innerText = '';
+            document.getElementById('walkshed-clear').style.display = 'none';
+            applySegmentStyles();
+        }
 
-        let highlightLayer = null;
+        map.on('contextmenu', e => loadWalkshed(e.latlng));
+        document.getElementById('walkshed-clear').addEventListener('click', clearWalkshed);
+        document.getElementById('walkshed-minutes').addEventListener('input', e => {
+            document.getElementById('walkshed-minutes-value').innerText = e.target.value;
+        });
+        document.getElementById('walkshed-minutes').addEventListener('change', () => {
+            if (walkshedLatLng) {
+                loadWalkshed(walkshedLatLng);
+            }
+        });
 
-        // Fetch Data
-        fetch('/api/data')
-            .then(response => response.json())
-            .then(data => {
-                // Hide loader with fade
-                const loader = document.getElementById('loader');
-                loader.style.transition = 'opacity 0.5s ease';
-                loader.style.opacity = '0';
-                setTimeout(() => loader.style.display = 'none', 500);
-
-                const myRenderer = L.canvas({ padding: 0.5 });
-
-                const geoJsonLayer = L.geoJSON(data, {
-                    renderer: myRenderer,
-                    style: function(feature) {
-                        return {
-                            color: '#3b82f6',
-                            weight: 3,
-                            opacity: 0.7,
-                            lineCap: 'round',
-                            lineJoin: 'round'
-                        };
-                    },
-                    onEachFeature: function(feature, layer) {
-                        layer.on('click', function(e) {
-                            L.DomEvent.stopPropagation(e);
-                            selectSegment(feature.properties, layer);
-                        });
+        // Streets with a walkability profile like the selected one's, from /api/similar
+        const SIMILAR_K = 10;
+        const SIMILAR_STYLE = { radius: 6, color: '#ec4899', weight: 2, fillColor: 'white', fillOpacity: 1 };
+        const similarMarkers = L.layerGroup().addTo(map);
+        let similarId = null;
+        let similarRequest = 0;
 
-                        layer.on('mouseover', function() {
-                            if (highlightLayer !== layer) {
-                                layer.setStyle({ 
-                                    opacity: 1, 
-                                    weight: 5, 
-                                    color: '#8b5cf6' 
-                                });
-                            }
-                        });
+        function loadSimilar(id) {
+            similarId = id;
+            const request = ++similarRequest;
+            const radius = document.getElementById('similar-radius').value;
+            const summary = document.getElementById('similar-summary');
+            const table = document.getElementById('similar-table');
+            similarMarkers.clearLayers();
+            table.innerHTML = '';
+            summary.innerText = 'Searching...';
 
-                        layer.on('mouseout', function() {
-                            if (highlightLayer !== layer) {
-                                geoJsonLayer.resetStyle(layer);
-                            }
+            fetch(API + '/similar/' + id + '?k=' + SIMILAR_K + (radius ? '&radius=' + radius : ''))
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Similar streets request failed: HTTP ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    // Ignore answers to a selection or radius that has changed since
+                    if (request !== similarRequest) {
+                        return;
+                    }
+                    summary.innerText = data.segments.length > 0 ? '' : 'No other streets within ' + radius + ' m';
+                    if (data.segments.length === 0) {
+                        return;
+                    }
+                    const header = table.createTHead().insertRow();
+                    ['Street', 'Difference', 'Away'].forEach(label => {
+                        const th = document.createElement('th');
+                        th.innerText = label;
+                        header.appendChild(th);
+                    });
+                    const body = table.createTBody();
+                    data.segments.forEach((segment, rank) => {
+                        const label = (rank + 1) + '. Street ' + segment.ID_TRC;
+                        const marker = L.circleMarker(segment.point, SIMILAR_STYLE)
+                            .bindTooltip(label)
+                            .addTo(similarMarkers);
+                        const row = body.insertRow();
+                        row.className = 'similar-row';
+                        row.insertCell().innerText = (rank + 1) + '. ' + segment.ID_TRC;
+                        row.insertCell().innerText = segment.distance.toFixed(2);
+                        row.insertCell().innerText = segment.distance_m < 1000
+                            ? Math.round(segment.distance_m) + ' m'
+                            : (segment.distance_m / 1000).toFixed(1) + ' km';
+                        row.addEventListener('click', () => {
+                            map.flyTo(segment.point, Math.max(map.getZoom(), 16));
+                            marker.openTooltip();
                         });
+                    });
+                })
+                .catch(err => {
+                    if (request === similarRequest) {
+                        summary.innerText = '';
                     }
-                }).addTo(map);
+                    console.error(err);
+                });
+        }
 
-                if (data.features.length > 0) {
-                    map.fitBounds(geoJsonLayer.getBounds());
-                }
-            })
-            .catch(err => {
-                document.getElementById('loader-text').innerText = "Error loading data";
-                console.error(err);
-            });
+        function clearSimilar() {
+            similarId = null;
+            similarRequest++;
+            similarMarkers.clearLayers();
+            document.getElementById('similar-table').innerHTML = '';
+            document.getElementById('similar-summary').innerText = '';
+        }
 
-        map.on('click', function() {
-            resetSelection();
+        document.getElementById('similar-radius').addEventListener('change', () => {
+            if (similarId !== null) {
+                loadSimilar(similarId);
+            }
         });
 
         function resetSelection() {
             document.getElementById('details-container').style.display = 'none';
             document.getElementById('empty-state').style.display = 'block';
             if (highlightLayer) {
-                highlightLayer.setStyle({
-                    color: '#3b82f6',
-                    weight: 3,
-                    opacity: 0.7
-                });
+                highlightLayer.reset();
                 highlightLayer = null;
             }
+            clearSimilar();
+        }
+
+        // Segment attributes are fetched on demand and kept for repeat clicks
+        const segmentDetails = new Map();
+
+        function fetchSegment(id) {
+            if (!segmentDetails.has(id)) {
+                segmentDetails.set(id, fetch(SCENARIO_API + '/segment/' + id).then(response => {
+                    if (!response.ok) {
+                        segmentDetails.delete(id);
+                        throw new Error('Segment ' + id + ': HTTP ' + response.status);
+                    }
+                    return response.json();
+                }));
+            }
+            return segmentDetails.get(id);
         }
 
-        function selectSegment(props, layer) {
+        function selectSegment(id, layer) {
             if (highlightLayer) {
-                highlightLayer.setStyle({ color: '#3b82f6', weight: 3, opacity: 0.7 });
+                highlightLayer.reset();
             }
             highlightLayer = layer;
-            layer.setStyle({ 
-                color: '#ec4899', 
-                weight: 6, 
-                opacity: 1.0 
-            });
+            layer.setStyle(SELECTED_STYLE);
             layer.bringToFront();
+            loadSimilar(id);
 
+            fetchSegment(id)
+                .then(props => {
+                    // Ignore answers for a segment that is no longer selected
+                    if (highlightLayer === layer) {
+                        showSegmentDetails(props);
+                    }
+                })
+                .catch(err => console.error(err));
+        }
+
+        function showSegmentDetails(props) {
             document.getElementById('empty-state').style.display = 'none';
             document.getElementById('details-container').style.display = 'block';
 
@@ -718,31 +5600,733 @@ HTML_TEMPLATE = """
             
             Plotly.newPlot('chart-div', data, layout, config);
         }
+
+        // Render benchmark, to compare data sources on the same network: open any source
+        // with &benchmark=1, e.g. /?source=webgl&benchmark=1. The camera path is relative to
+        // the fitted view and the hover probes are seeded, so runs repeat exactly
+        const BENCHMARK_PROBES = 200;
+
+        function runRenderBenchmark(loadMs) {
+            const frames = [];
+            let recording = true, last = performance.now();
+            function tick(now) {
+                frames.push(now - last);
+                last = now;
+                if (recording) {
+                    requestAnimationFrame(tick);
+                }
+            }
+
+            // Each step resolves once the view has settled, or after 3s if it could not move
+            const size = map.getSize();
+            const steps = [
+                () => map.panBy([size.x / 3, 0], { duration: 0.5 }),
+                () => map.panBy([0, size.y / 3], { duration: 0.5 }),
+                () => map.panBy([-size.x / 3, 0], { duration: 0.5 }),
+                () => map.panBy([0, -size.y / 3], { duration: 0.5 }),
+                () => map.zoomIn(1),
+                () => map.zoomIn(1),
+                () => map.panBy([size.x / 2, size.y / 2], { duration: 0.5 }),
+                () => map.panBy([-size.x / 2, -size.y / 2], { duration: 0.5 }),
+                () => map.zoomOut(1),
+                () => map.zoomOut(1)
+            ];
+            const settle = step => new Promise(resolve => {
+                const timer = setTimeout(resolve, 3000);
+                map.once('moveend', () => {
+                    clearTimeout(timer);
+                    setTimeout(resolve, 250);
+                });
+                step();
+            });
+
+            // Synthetic mousemoves at seeded points over the map, 50ms apart so Leaflet's
+            // canvas hover throttle (32ms) never drops one: [handler ms, ms to the next frame]
+            let seed = 1;
+            const random = () => {
+                seed = (Math.imul(seed, 1664525) + 1013904223) >>> 0;
+                return seed / 4294967296;
+            };
+            const rect = map.getContainer().getBoundingClientRect();
+            function probe(remaining, times) {
+                if (remaining === 0) {
+                    return Promise.resolve(times);
+                }
+                const x = rect.left + random() * rect.width, y = rect.top + random() * rect.height;
+                const target = document.elementFromPoint(x, y);
+                // Points under the sidebar do not reach the map
+                if (!target || !map.getContainer().contains(target)) {
+                    return probe(remaining, times);
+                }
+                const started = performance.now();
+                target.dispatchEvent(new MouseEvent('mousemove', { clientX: x, clientY: y, bubbles: true }));
+                const handled = performance.now();
+                return new Promise(resolve => requestAnimationFrame(() => {
+                    times.push([handled - started, performance.now() - started]);
+                    setTimeout(() => resolve(probe(remaining - 1, times)), 50);
+                }));
+            }
+
+            const round = value => Math.round(value * 100) / 100;
+            function summarize(values) {
+                const sorted = values.slice().sort((a, b) => a - b);
+                const at = q => round(sorted[Math.min(sorted.length - 1, Math.round(q * (sorted.length - 1)))]);
+                return { p50_ms: at(0.5), p95_ms: at(0.95), p99_ms: at(0.99), max_ms: at(1) };
+            }
+
+            const cameraStarted = performance.now();
+            requestAnimationFrame(tick);
+            steps.reduce((chain, step) => chain.then(() => settle(step)), Promise.resolve())
+                .then(() => {
+                    recording = false;
+                    const cameraMs = performance.now() - cameraStarted;
+                    return Promise.all([probe(BENCHMARK_PROBES, []), fetch(API + '/version').then(r => r.json()),
+                                        cameraMs]);
+                })
+                .then(([probes, version, cameraMs]) => {
+                    const result = {
+                        source: DATA_SOURCE,
+                        segments: version.segments,
+                        viewport: [size.x, size.y],
+                        device_pixel_ratio: window.devicePixelRatio || 1,
+                        load_ms: round(loadMs),
+                        camera: {
+                            fps: round(frames.length / cameraMs * 1000),
+                            frames: summarize(frames),
+                            frames_over_50ms: frames.filter(t => t > 50).length
+                        },
+                        hover: {
+                            handler: summarize(probes.map(p => p[0])),
+                            to_next_frame: summarize(probes.map(p => p[1]))
+                        }
+                    };
+                    window.renderBenchmark = result;
+                    console.log('render benchmark', JSON.stringify(result));
+                    const output = document.createElement('pre');
+                    output.id = 'benchmark-results';
+                    output.style.cssText = 'position: fixed; top: 12px; right: 12px; z-index: 2000; margin: 0; ' +
+                        'padding: 12px; background: white; border-radius: 8px; font-size: 11px; max-height: 80vh; overflow: auto';
+                    output.textContent = JSON.stringify(result, null, 2);
+                    document.body.appendChild(output);
+                });
+        }
+
+        if (SCENARIO) {
+            fetch(SCENARIO_API)
+                .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                .then(scenario => {
+                    document.getElementById('header-subtitle').innerText = 'What-if scenario: ' +
+                        (scenario.name || scenario.id) + ' (' + scenario.segments + ' segments edited' +
+                        (scenario.stale ? ', made on older data' : '') + ')';
+                })
+                .catch(status => console.error('Scenario ' + SCENARIO + ': HTTP ' + status));
+        }
+
+        // The server swaps in new data when the input files change; offer a reload
+        setInterval(() => {
+            fetch(API + '/version')
+                .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                .then(data => {
+                    if (data.version !== DATA_VERSION) {
+                        document.getElementById('update-banner').style.display = 'flex';
+                    }
+                })
+                .catch(() => {});
+        }, 30000);
     </script>
 </body>
 </html>
 """
 
+DATA_SOURCES = ('tiles', 'geojson', 'stream', 'binary', 'webgl', 'viewport')
+
+@app.before_request
+def start_request_timer():
+    if _metrics_enabled:
+        request.environ['uwa.request_started'] = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    if not _metrics_enabled:
+        return response
+    # Every attribute read through the request proxy costs a context lookup; resolve it once
+    req = request._get_current_object()
+    started = req.environ.pop('uwa.request_started', None)
+    if started is not None:
+        # Label by route pattern, not path, so IDs and coordinates do not each make a series
+        route = req.url_rule.rule if req.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe((req.method, route, str(response.status_code)),
+                                time.perf_counter() - started)
+        size = response.headers.get('Content-Length')
+        if size is not None:
+            RESPONSE_BYTES.observe((req.method, route), int(size))
+    return response
+
+@app.url_value_preprocessor
+def pop_dataset(endpoint, values):
+    # The /api/<dataset>/ routes share their views with the default dataset's
+    if values and 'dataset' in values:
+        g.dataset = values.pop('dataset')
+
+@app.before_request
+def require_data():
+    dataset = g.get('dataset')
+    if dataset is not None and (_registry is None or dataset != _registry.default):
+        return require_dataset(dataset)
+    # Until a load succeeds, only the page, the health checks, /metrics and /api/datasets answer
+    if (_snapshot is not None or request.endpoint == 'get_datasets'
+            or not request.path.startswith(('/api/', '/tiles/'))):
+        return None
+    status = load_status()
+    if status['status'] == 'error':
+        return jsonify({"error": f"Data failed to load: {status['error']}"}), 503
+    response = jsonify({"error": "Data is loading", "stage": status.get('stage')})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(LOAD_RETRY_AFTER)
+    return response
+
+def require_dataset(dataset):
+    """Serve the request from a registry dataset, waiting a while for it to load"""
+    if _registry is None or dataset not in _registry.datasets:
+        return jsonify({"error": f"Unknown dataset {dataset}"}), 404
+    try:
+        snapshot = _registry.get(dataset)
+    except Exception as e:
+        return jsonify({"error": f"Dataset {dataset} failed to load: {type(e).__name__}: {e}"}), 503
+    if snapshot is None:
+        response = jsonify({"error": "Data is loading", "dataset": dataset,
+                            "stage": _registry.status(dataset).get('stage')})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(LOAD_RETRY_AFTER)
+        return response
+    g.snapshot = snapshot
+    return None
+
+@app.route('/healthz')
+def get_health():
+    # Liveness: the process is up and answering, whether or not the data has loaded
+    response = jsonify({"status": "ok"})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/readyz')
+def get_readiness():
+    # ?dataset= reports on a registry dataset instead, and starts loading it
+    dataset = request.args.get('dataset')
+    if dataset is not None and (_registry is None or dataset not in _registry.datasets):
+        return jsonify({"error": f"Unknown dataset {dataset}"}), 404
+    status = load_status() if dataset is None else _registry.status(dataset, start=True)
+    response = jsonify(status)
+    response.status_code = 200 if status['status'] == 'ready' else 503
+    response.headers['Cache-Control'] = 'no-store'
+    if status['status'] == 'loading':
+        response.headers['Retry-After'] = str(LOAD_RETRY_AFTER)
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    if not _metrics_enabled:
+        return jsonify({"error": "Metrics are off; start the app with --metrics"}), 404
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE, center=center_coords)
+    data_source = request.args.get('source', DATA_SOURCES[0])
+    if data_source not in DATA_SOURCES:
+        data_source = DATA_SOURCES[0]
+    # ?dataset= shows a registry dataset; until it has loaded, the page waits for it
+    dataset = request.args.get('dataset')
+    if dataset is None or (_registry is not None and dataset == _registry.default):
+        dataset, snapshot = None, current_snapshot()
+    elif _registry is None or dataset not in _registry.datasets:
+        return jsonify({"error": f"Unknown dataset {dataset}"}), 404
+    else:
+        try:
+            snapshot = _registry.get(dataset, wait=0) or Snapshot.empty()
+        except Exception:
+            snapshot = Snapshot.empty()
+    scenario = request.args.get('scenario')
+    if scenario is not None and not SCENARIO_ID_PATTERN.fullmatch(scenario):
+        return jsonify({"error": f"Unknown scenario {scenario}"}), 404
+    return render_template_string(HTML_TEMPLATE, center=snapshot.center, data_source=data_source,
+                                  data_version=snapshot.version, dataset=dataset, scenario=scenario,
+                                  api_base='/api' if dataset is None else f"/api/{dataset}",
+                                  benchmark=request.args.get('benchmark') == '1',
+                                  tile_min_zoom=TILE_MIN_ZOOM, tile_max_zoom=TILE_MAX_ZOOM,
+                                  lod_zooms=LOD_ZOOMS,
+                                  score_metrics=SCORE_METRICS,
+                                  street_types=snapshot.store.categories.get('TYP_VOIE', [])
+                                  if snapshot.store is not None else [])
+
+@app.route('/api/datasets')
+def get_datasets():
+    # The datasets of the registry, whether each is loaded, and the memory they take
+    if _registry is None:
+        return jsonify({"error": "No datasets configured; start the app with --datasets"}), 404
+    response = jsonify(_registry.report())
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/version')
+@app.route('/api/<dataset>/version')
+def get_version():
+    # Clients poll this to notice that new data has been swapped in
+    snapshot = current_snapshot()
+    response = jsonify({
+        "version": snapshot.version,
+        "loaded_at": formatdate(snapshot.loaded_at, usegmt=True),
+        "segments": len(snapshot.store) if snapshot.store is not None else 0,
+    })
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/data')
+@app.route('/api/<dataset>/data')
 def get_data():
-    if geojson_response_cache:
-        return jsonify(geojson_response_cache)
+    snapshot = current_snapshot()
+    zoom = request.args.get('zoom', type=float)
+    if zoom is not None and snapshot.levels:
+        level = snapshot.detail_level(zoom)
+        payload, offsets = level.payload, level.offsets
+    else:
+        payload, offsets = snapshot.geojson, snapshot.feature_offsets
+    if payload is None or offsets is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    if request.args.get('format') == 'seq' or request.accept_mimetypes.best_match(
+            ['application/json', GEOJSON_SEQ_MIMETYPE]) == GEOJSON_SEQ_MIMETYPE:
+        return send_feature_sequence(payload, offsets)
+    return send_payload(payload)
+
+@app.route('/api/data.bin')
+@app.route('/api/<dataset>/data.bin')
+def get_data_binary():
+    snapshot = current_snapshot()
+    if snapshot.binary is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    # Quantized, delta-encoded typed arrays; see encode_segments_binary()
+    return send_payload(snapshot.binary)
+
+@app.route('/api/data/levels')
+@app.route('/api/<dataset>/data/levels')
+def get_data_levels():
+    # Vertex counts and payload sizes of every level of detail
+    return jsonify({"levels": [level.report() for level in current_snapshot().levels]})
+
+@app.route('/api/segments')
+@app.route('/api/<dataset>/segments')
+def get_segments_in_bbox():
+    snapshot = current_snapshot()
+    if snapshot.index is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    try:
+        minlon, minlat, maxlon, maxlat = (float(v) for v in request.args['bbox'].split(','))
+    except (KeyError, ValueError):
+        return jsonify({"error": "bbox must be minLon,minLat,maxLon,maxLat"}), 400
+    limit = max(0, min(request.args.get('limit', MAX_VIEWPORT_SEGMENTS, type=int),
+                       MAX_VIEWPORT_SEGMENTS))
+
+    indices = np.sort(snapshot.index.query_bbox(minlon, minlat, maxlon, maxlat))
+    zoom = request.args.get('zoom', type=float)
+    if zoom is not None and snapshot.levels:
+        level = snapshot.detail_level(zoom)
+        payload, offsets = level.payload, level.offsets
+    else:
+        payload, offsets = snapshot.geojson, snapshot.feature_offsets
+    body = feature_subset(payload.variants['identity'], offsets,
+                          indices[:limit], truncated=bool(len(indices) > limit))
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/nearest')
+@app.route('/api/<dataset>/nearest')
+def get_nearest():
+    snapshot = current_snapshot()
+    if snapshot.index is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    if not np.isfinite([lat, lon]).all():
+        return jsonify({"error": "lat and lon must be finite numbers"}), 400
+    k = max(1, min(request.args.get('k', 1, type=int), MAX_NEAREST))
+
+    indices, distances = snapshot.index.nearest(lon, lat, k)
+    return jsonify({"segments": [
+        {"i": i, "ID_TRC": int(snapshot.store.ids[i]), "distance_m": round(d, 2)}
+        for i, d in zip(indices.tolist(), distances.tolist())]})
+
+@app.route('/api/score')
+@app.route('/api/<dataset>/score')
+def get_score():
+    snapshot = current_snapshot()
+    if snapshot.scores is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    return send_scores(snapshot.scores, len(snapshot.store))
+
+def send_scores(scores, count):
+    """/api/score of a ScoreEngine, or of a scenario's"""
+    try:
+        weights = scores.parse_weights(request.args.get('weights', ''))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid weights: {e}"}), 400
+
+    # Little-endian Float32, one value per segment index
+    response = send_payload(scores.payload(weights))
+    response.headers['X-Segment-Count'] = str(count)
+    response.headers['X-Score-Weights'] = ','.join(map(str, weights))
+    return response
+
+@app.route('/api/query')
+@app.route('/api/<dataset>/query')
+def get_query():
+    snapshot = current_snapshot()
+    if snapshot.queries is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    fmt = request.args.get('format', QUERY_FORMATS[0])
+    if fmt not in QUERY_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(QUERY_FORMATS)}"}), 400
+    try:
+        predicates = snapshot.queries.parse({name: ','.join(request.args.getlist(name))
+                                             for name in request.args if name != 'format'})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+
+    # Repeated predicate sets, e.g. a slider moved back, are answered from the cache
+    payload, count = snapshot.queries.payload(predicates, fmt)
+    response = send_payload(payload)
+    response.headers['X-Match-Count'] = str(count)
+    response.headers['X-Segment-Count'] = str(snapshot.queries.count)
+    return response
+
+@app.route('/api/stats')
+@app.route('/api/<dataset>/stats')
+def get_stats():
+    snapshot = current_snapshot()
+    if snapshot.stats is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    return send_stats(snapshot.stats)
+
+def send_stats(stats):
+    """/api/stats of a StatsEngine, or of a scenario's"""
+    by = request.args.get('by') or None
+    if by is not None and by not in STATS_GROUPINGS:
+        return jsonify({"error": f"by must be one of {', '.join(STATS_GROUPINGS)}"}), 400
+    metrics = tuple(m for m in request.args.get('metrics', '').split(',') if m) or None
+    unknown = set(metrics or ()) - set(SCORE_METRICS)
+    if unknown:
+        return jsonify({"error": f"Unknown metrics: {', '.join(sorted(unknown))}"}), 400
+    bbox = None
+    if 'bbox' in request.args:
+        try:
+            bbox = tuple(float(v) for v in request.args['bbox'].split(','))
+            if len(bbox) != 4 or not np.isfinite(bbox).all():
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "bbox must be minLon,minLat,maxLon,maxLat"}), 400
+    histograms = request.args.get('histograms', '1') not in ('0', 'false')
+
+    # The bbox is snapped to grid cells, so nearby views share a cached answer
+    cells = stats.cells(bbox)
+    return send_payload(stats.payload(cells, by, metrics, histograms))
+
+@app.route('/api/isochrone')
+@app.route('/api/<dataset>/isochrone')
+def get_isochrone():
+    snapshot = current_snapshot()
+    if snapshot.isochrones is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    if not np.isfinite([lat, lon]).all():
+        return jsonify({"error": "lat and lon must be finite numbers"}), 400
+    minutes = request.args.get('minutes', DEFAULT_WALK_MINUTES, type=float)
+    slope_penalty = request.args.get('slope_penalty', WALK_SLOPE_PENALTY, type=float)
+    if not 0 < minutes <= MAX_WALK_MINUTES:
+        return jsonify({"error": f"minutes must be in (0, {MAX_WALK_MINUTES}]"}), 400
+    if not 0 <= slope_penalty <= MAX_SLOPE_PENALTY:
+        return jsonify({"error": f"slope_penalty must be in [0, {MAX_SLOPE_PENALTY}]"}), 400
+
+    # Nearby clicks share an origin cell, and with it a cached walkshed
+    cell = snapshot.isochrones.origin_cell(lon, lat)
+    return send_payload(snapshot.isochrones.payload(cell, round(minutes, 1), round(slope_penalty, 2)))
+
+@app.route('/api/similar/<int:id_trc>')
+@app.route('/api/<dataset>/similar/<int:id_trc>')
+def get_similar(id_trc):
+    snapshot = current_snapshot()
+    if snapshot.similar is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    index = int(snapshot.store.lookup(id_trc))
+    if index < 0:
+        return jsonify({"error": f"Unknown segment {id_trc}"}), 404
+    k = max(1, min(request.args.get('k', DEFAULT_SIMILAR, type=int), MAX_SIMILAR))
+    radius = request.args.get('radius', type=float)
+    if radius is not None and not 0 < radius <= MAX_SIMILAR_RADIUS:
+        return jsonify({"error": f"radius must be in (0, {MAX_SIMILAR_RADIUS:g}] metres"}), 400
+    return send_payload(snapshot.similar.payload(index, k, radius))
+
+@app.route('/api/segment/<int:id_trc>')
+@app.route('/api/<dataset>/segment/<int:id_trc>')
+def get_segment(id_trc):
+    store = current_snapshot().store
+    if store is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    index = int(store.lookup(id_trc))
+    if index < 0:
+        return jsonify({"error": f"Unknown segment {id_trc}"}), 404
+    return jsonify(store.record(index))
+
+@app.route('/api/segment', methods=['GET', 'POST'])
+@app.route('/api/<dataset>/segment', methods=['GET', 'POST'])
+def get_segments_batch():
+    store = current_snapshot().store
+    if store is None:
+        return jsonify({"error": "Data not loaded"}), 500
+    if request.method == 'POST':
+        ids = (request.get_json(silent=True) or {}).get('ids', [])
     else:
+        ids = request.args.get('ids', '').split(',')
+    try:
+        ids = [int(i) for i in ids if str(i).strip()]
+    except ValueError:
+        return jsonify({"error": "ids must be integers"}), 400
+    if len(ids) > MAX_BATCH_SEGMENTS:
+        return jsonify({"error": f"At most {MAX_BATCH_SEGMENTS} ids per request"}), 400
+
+    indices = store.lookup(ids).tolist()
+    return jsonify({
+        "segments": [store.record(i) for i in indices if i >= 0],
+        "missing": [id_trc for id_trc, i in zip(ids, indices) if i < 0],
+    })
+
+@app.route('/api/scenarios', methods=['GET', 'POST'])
+@app.route('/api/<dataset>/scenarios', methods=['GET', 'POST'])
+def get_scenarios():
+    snapshot = current_snapshot()
+    if snapshot.store is None:
         return jsonify({"error": "Data not loaded"}), 500
+    store = scenario_store()
+    if request.method == 'GET':
+        return jsonify({"scenarios": store.list(snapshot.version)})
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object with a list of edits"}), 400
+    name = body.get('name', '')
+    if not isinstance(name, str) or len(name) > MAX_SCENARIO_NAME:
+        return jsonify({"error": f"name must be a string of at most {MAX_SCENARIO_NAME} characters"}), 400
+    try:
+        values = Scenario.resolve(snapshot, body.get('edits'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid edits: {e}"}), 400
+    if not values:
+        return jsonify({"error": "The edits change no values"}), 400
+
+    # Only the resolved values are needed to apply it; the edits are kept to show how it was made
+    scenario_id, created = store.create(name, snapshot.version, body['edits'], values)
+    scenario = store.apply(snapshot, scenario_id)
+    response = send_payload(scenario.summary(snapshot.scores.parse_weights('')))
+    if created:
+        response.status_code = 201
+    response.headers['Location'] = f"{request.path}/{scenario_id}"
+    return response
+
+def load_scenario(scenario_id):
+    """(scenario, None) for a saved scenario applied to the request's snapshot, else (None, error)"""
+    snapshot = current_snapshot()
+    if snapshot.store is None:
+        return None, (jsonify({"error": "Data not loaded"}), 500)
+    scenario = scenario_store().apply(snapshot, scenario_id)
+    if scenario is None:
+        return None, (jsonify({"error": f"Unknown scenario {scenario_id}"}), 404)
+    return scenario, None
+
+@app.route('/api/scenarios/<scenario_id>', methods=['GET', 'DELETE'])
+@app.route('/api/<dataset>/scenarios/<scenario_id>', methods=['GET', 'DELETE'])
+def get_scenario(scenario_id):
+    if request.method == 'DELETE':
+        if not scenario_store().delete(scenario_id):
+            return jsonify({"error": f"Unknown scenario {scenario_id}"}), 404
+        return Response(status=204)
+    scenario, error = load_scenario(scenario_id)
+    if error:
+        return error
+    try:
+        weights = scenario.scores.parse_weights(request.args.get('weights', ''))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid weights: {e}"}), 400
+    return send_payload(scenario.summary(weights))
+
+@app.route('/api/scenarios/<scenario_id>/diff')
+@app.route('/api/<dataset>/scenarios/<scenario_id>/diff')
+def get_scenario_diff(scenario_id):
+    # The saved diff as it is: the edits and the values they resolved to, by ID_TRC
+    diff = scenario_store().get(scenario_id)
+    if diff is None:
+        return jsonify({"error": f"Unknown scenario {scenario_id}"}), 404
+    return jsonify(diff)
 
-def open_browser():
+@app.route('/api/scenarios/<scenario_id>/score')
+@app.route('/api/<dataset>/scenarios/<scenario_id>/score')
+def get_scenario_score(scenario_id):
+    scenario, error = load_scenario(scenario_id)
+    if error:
+        return error
+    return send_scores(scenario.scores, len(scenario.snapshot.store))
+
+@app.route('/api/scenarios/<scenario_id>/stats')
+@app.route('/api/<dataset>/scenarios/<scenario_id>/stats')
+def get_scenario_stats(scenario_id):
+    scenario, error = load_scenario(scenario_id)
+    if error:
+        return error
+    return send_stats(scenario.stats)
+
+@app.route('/api/scenarios/<scenario_id>/segment/<int:id_trc>')
+@app.route('/api/<dataset>/scenarios/<scenario_id>/segment/<int:id_trc>')
+def get_scenario_segment(scenario_id, id_trc):
+    scenario, error = load_scenario(scenario_id)
+    if error:
+        return error
+    index = int(scenario.snapshot.store.lookup(id_trc))
+    if index < 0:
+        return jsonify({"error": f"Unknown segment {id_trc}"}), 404
+    return jsonify(scenario.record(index))
+
+@app.route('/api/scenarios/<scenario_id>/catchments', methods=['POST'])
+@app.route('/api/<dataset>/scenarios/<scenario_id>/catchments', methods=['POST'])
+def get_scenario_catchments(scenario_id):
+    scenario, error = load_scenario(scenario_id)
+    if error:
+        return error
+    if scenario.snapshot.isochrones is None:
+        return jsonify({"error": "No street network loaded"}), 500
+    body = request.get_json(silent=True) or {}
+    try:
+        points = [(float(lat), float(lon)) for lat, lon in body.get('points', [])]
+        minutes = float(body.get('minutes', DEFAULT_WALK_MINUTES))
+        slope_penalty = float(body.get('slope_penalty', WALK_SLOPE_PENALTY))
+    except (TypeError, ValueError):
+        return jsonify({"error": "points must be [lat, lon] pairs, minutes and slope_penalty numbers"}), 400
+    if not 0 < len(points) <= MAX_SCENARIO_POINTS:
+        return jsonify({"error": f"Between 1 and {MAX_SCENARIO_POINTS} points per request"}), 400
+    if not np.isfinite(points).all():
+        return jsonify({"error": "points must be [lat, lon] pairs of finite numbers"}), 400
+    if not 0 < minutes <= MAX_WALK_MINUTES:
+        return jsonify({"error": f"minutes must be in (0, {MAX_WALK_MINUTES}]"}), 400
+    if not 0 <= slope_penalty <= MAX_SLOPE_PENALTY:
+        return jsonify({"error": f"slope_penalty must be in [0, {MAX_SLOPE_PENALTY}]"}), 400
+    return jsonify({"scenario": scenario_id, "minutes": minutes, "slope_penalty": slope_penalty,
+                    "points": scenario.catchments(points, minutes, slope_penalty)})
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+@app.route('/api/<dataset>/tiles/<int:z>/<int:x>/<int:y>.mvt')
+def get_tile(z, x, y):
+    tile = current_snapshot().tiles.get((z, x, y))
+    if tile is None:
+        # Empty tiles are never built or stored; answer without a body
+        return Response(status=204, mimetype=TILE_MIMETYPE, headers={'Cache-Control': 'max-age=300'})
+    return send_payload(tile)
+
+def open_browser(url='http://127.0.0.1:5000/'):
     """Open the browser after a short delay"""
-    import time
     time.sleep(1.5)
-    webbrowser.open('http://127.0.0.1:5000/')
+    webbrowser.open(url)
+
+
+def _input_options(defaults=True):
+    """--shapefile and --slope-csv, for the main parser and the build command
+
+    A subcommand's copy has no defaults, so that it only sets what is given
+    after the command and keeps what was given before it.
+    """
+    default = (lambda value: value) if defaults else (lambda value: argparse.SUPPRESS)
+    inputs = argparse.ArgumentParser(add_help=False)
+    inputs.add_argument('--shapefile', default=default(SHAPEFILE_PATH))
+    inputs.add_argument('--slope-csv', default=default(SLOPE_CSV_PATH))
+    return inputs
+
+
+def _serving_options(defaults=True):
+    """The serving options, for the main parser and the serve command; see _input_options()"""
+    default = (lambda value: value) if defaults else (lambda value: argparse.SUPPRESS)
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--datasets', metavar='CONFIG_JSON', default=default(None),
+                         help="serve the datasets of a config file under /api/<dataset>/, each "
+                              "loaded on first use; its default dataset replaces the other inputs")
+    options.add_argument('--no-watch', action='store_true', default=default(False),
+                         help="do not reload the data when the input files or the artifact change")
+    options.add_argument('--workers', type=int, default=default(None),
+                         help="worker processes: server processes (default 1), or the catchment "
+                              "pool size with --catchments (default: one per CPU)")
+    options.add_argument('--scenario-dir', default=default(SCENARIO_DIR),
+                         help="directory where the what-if scenarios of /api/scenarios are saved")
+    serving = options.add_argument_group("serving")
+    serving.add_argument('--host', default=default('127.0.0.1'))
+    serving.add_argument('--port', type=int, default=default(5000))
+    serving.add_argument('--no-browser', action='store_true', default=default(False),
+                         help="do not open a browser window on start")
+    serving.add_argument('--metrics', action='store_true', default=default(False),
+                         help="record request latencies and sizes, served at /metrics with the "
+                              "load stage timings")
+    serving.add_argument('--trace-memory', action='store_true', default=default(False),
+                         help="record the peak traced memory of each load stage (slows loading)")
+    return options
+
 
 if __name__ == '__main__':
-    load_and_optimize_data()
-    
+    parser = argparse.ArgumentParser(description="Urban Walkability Analytics dashboard",
+                                     parents=[_input_options(), _serving_options()])
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="directory for the preprocessed-data cache ('' disables it)")
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help="ignore any cached data and rebuild it from the input files")
+    commands = parser.add_subparsers(
+        dest='command', title="commands",
+        description="Without a command the input files are processed, or loaded from the cache, "
+                    "and served in one process.")
+    build_command = commands.add_parser(
+        'build', parents=[_input_options(defaults=False)],
+        help="process the input files into a single dataset artifact")
+    build_command.add_argument('--output', dest='build_output', default=ARTIFACT_PATH,
+                               help="artifact file to write")
+    serve_command = commands.add_parser(
+        'serve', parents=[_serving_options(defaults=False)],
+        help="serve an artifact written by build, with no processing and without geopandas")
+    serve_command.add_argument('--artifact', default=ARTIFACT_PATH)
+    batch = parser.add_argument_group("batch catchments (compute and exit instead of serving)")
+    batch.add_argument('--catchments', metavar='POIS_CSV',
+                       help="CSV of points of interest with latitude/longitude columns")
+    batch.add_argument('--output', default='catchments.parquet',
+                       help="output file; .parquet or anything else for CSV")
+    batch.add_argument('--minutes', type=float, default=DEFAULT_WALK_MINUTES)
+    batch.add_argument('--slope-penalty', type=float, default=WALK_SLOPE_PENALTY)
+    batch.add_argument('--lat-column', default='lat')
+    batch.add_argument('--lon-column', default='lon')
+    batch.add_argument('--encoding', default='utf-8',
+                       help="POI CSV encoding (the LWM catchment export is latin-1)")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_artifact(args.shapefile, args.slope_csv, args.build_output)
+        sys.exit()
+    if args.catchments:
+        run_catchments(args)
+        sys.exit()
+
+    enable_metrics(args.metrics, args.trace_memory)
+    configure_scenarios(args.scenario_dir)
+    registry = configure_datasets(args.datasets, args.cache_dir)
+    if registry is not None:
+        print(f"Serving {len(registry.datasets)} datasets, {registry.default} by default")
+    load, changes = _data_source(args.shapefile, args.slope_csv, args.cache_dir, args.rebuild_cache,
+                                 args.artifact if args.command == 'serve' else None, registry)
+
+    # Bind the port first and load in the background; /readyz tells when the data is there
     print("\n Starting optimized server...")
-    threading.Timer(1, open_browser).start()
-    app.run(debug=False, port=5000)
\ No newline at end of file
+    if not args.no_browser:
+        threading.Timer(1, open_browser, args=(f"http://{args.host}:{args.port}/",)).start()
+    serve(args.host, args.port, workers=args.workers or 1, load=load,
+          watch=None if args.no_watch else changes())
\ No newline at end of file